@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0001_initial'),
+    ]
+
+    operations = [
+        # Rows keyed by city name can't be mapped to cells; the cache refills itself
+        migrations.DeleteModel(
+            name='WeatherCache',
+        ),
+        migrations.CreateModel(
+            name='WeatherCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell', models.CharField(max_length=32, unique=True)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('temperature', models.FloatField()),
+                ('humidity', models.FloatField()),
+                ('description', models.CharField(max_length=100)),
+                ('uv_index', models.FloatField(default=0)),
+                ('cached_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -4,19 +4,18 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 
 class WeatherCache(models.Model):
-    city = models.CharField(max_length=100)
-    country = models.CharField(max_length=100)
+    """Current weather per grid cell, shared by every request that falls in the cell"""
+    cell = models.CharField(max_length=32, unique=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
     temperature = models.FloatField()
     humidity = models.FloatField()
     description = models.CharField(max_length=100)
     uv_index = models.FloatField(default=0)
     cached_at = models.DateTimeField(auto_now=True)
     
-    class Meta:
-        unique_together = ['city', 'country']
-    
     def __str__(self):
-        return f"{self.city}, {self.country} - {self.temperature}°C"
+        return f"{self.cell} - {self.temperature}°C"
 
 class UserActivity(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
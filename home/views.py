@@ -1,55 +1,86 @@
 from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils import timezone
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
+import asyncio
 import json
-from travels.models import Travel
-from translate.models import TranslationHistory
-from maps.models import SearchHistory
-from travels.services.weather_service import get_weather_data
+from travels.models import Travel, QuickDestination
+from users.cache import cached_fragment
+from users.models import UserStats
+from maps.services.nearby import NEAREST_MAX_K, nearest_places
+from travels.services.weather_service import aget_weather_data, get_weather_data
+from travels.services.advice import top_advice
 from travels.services.gemini_service import generate_travel_advice
 
-def home_view(request):
-    if request.user.is_authenticated:
-        return authenticated_home(request)
+async def home_view(request):
+    user = await request.auser()
+    if user.is_authenticated:
+        return await authenticated_home(request)
     else:
-        return render(request, 'home/home_guest.html')
+        # Templates may touch the lazy request.user, so render in a thread
+        return await sync_to_async(render)(request, 'home/home_guest.html')
 
-@login_required
-def authenticated_home(request):
+def _dashboard(user):
+    """Everything on the home page but the weather; cached until the user's data changes"""
     # Get user's active travel
-    active_travel = Travel.objects.filter(user=request.user, is_active=True).first()
+    active_travel = Travel.objects.filter(user=user, is_active=True).defer('advice_data', 'objectives').first()
     
     # Get user statistics
-    total_travels = Travel.objects.filter(user=request.user).count()
-    total_translations = TranslationHistory.objects.filter(user=request.user).count()
-    total_searches = SearchHistory.objects.filter(user=request.user).count()
-    
-    # Get weather data for current location
-    weather_data = None
-    if active_travel:
-        weather_data = get_weather_data(active_travel.city, active_travel.country)
-    
-    # Get recent travels
-    recent_travels = Travel.objects.filter(user=request.user)[:3]
+    stats = UserStats.for_user(user)
     
     # Get quick advice for active travel
     quick_advice = []
-    if active_travel and active_travel.advice_data:
-        advice_data = active_travel.advice_data
-        if isinstance(advice_data, dict):
-            quick_advice = advice_data.get('do', [])[:3]  # Show top 3 tips
+    if active_travel:
+        quick_advice = top_advice(active_travel.id, 'do', 3)  # Show top 3 tips
     
     context = {
+        'user': user,
         'active_travel': active_travel,
-        'total_travels': total_travels,
-        'total_translations': total_translations,
-        'total_searches': total_searches,
-        'weather_data': weather_data,
-        'recent_travels': recent_travels,
+        'total_travels': stats.travel_count,
+        'total_translations': stats.translation_count,
+        'total_searches': stats.search_count,
         'quick_advice': quick_advice,
     }
-    return render(request, 'home/home.html', context)
+    return {
+        'active_travel': active_travel and {
+            'id': active_travel.id,
+            'name': active_travel.name,
+            'city': active_travel.city,
+            'country': active_travel.country,
+        },
+        'welcome': render_to_string('home/_welcome.html', context),
+        'body': render_to_string('home/_dashboard.html', context),
+    }
+
+@login_required
+async def authenticated_home(request):
+    user = await request.auser()
+    active_travel = await (
+        Travel.objects.filter(user=user, is_active=True).values('city', 'country').afirst()
+    )
+    
+    # The weather call and the dashboard (cache, or queries and rendering) run side by side;
+    # days elapsed change at midnight, so the date is part of the key
+    tasks = [
+        sync_to_async(cached_fragment)(
+            user.id, f"home:{timezone.localdate()}", lambda: _dashboard(user)
+        )
+    ]
+    if active_travel:
+        tasks.append(aget_weather_data(active_travel['city'], active_travel['country']))
+    results = await asyncio.gather(*tasks)
+    dashboard = results[0]
+    weather_data = results[1] if active_travel else None
+    
+    context = {
+        'active_travel': dashboard['active_travel'],
+        'dashboard': dashboard,
+        'weather_data': weather_data,
+    }
+    return await sync_to_async(render)(request, 'home/home.html', context)
 
 @csrf_exempt
 @login_required
@@ -59,7 +90,16 @@ def get_weather_update(request):
         city = data.get('city')
         country = data.get('country')
         
-        weather_data = get_weather_data(city, country)
+        # A GPS position, when the page has one, skips geocoding
+        try:
+            lat = float(data['lat'])
+            lng = float(data['lng'])
+        except (KeyError, TypeError, ValueError):
+            lat = lng = None
+        if lat is None and not (city or '').strip() and not (country or '').strip():
+            return JsonResponse({'status': 'error', 'message': 'City or coordinates required'}, status=400)
+        
+        weather_data = get_weather_data(city, country, lat, lng)
         
         return JsonResponse({
             'status': 'success',
@@ -74,36 +114,29 @@ def get_quick_destinations(request):
     if request.method == 'POST':
         data = json.loads(request.body)
         category = data.get('category')
-        lat = data.get('lat', 0)
-        lng = data.get('lng', 0)
         
-        # Mock destinations based on category
-        destinations = {
-            'market': [
-                {'name': 'Central Market', 'distance': '0.5 km', 'rating': 4.2},
-                {'name': 'Local Bazaar', 'distance': '1.2 km', 'rating': 4.0},
-            ],
-            'hotel': [
-                {'name': 'Grand Hotel', 'distance': '0.8 km', 'rating': 4.5},
-                {'name': 'Budget Inn', 'distance': '1.5 km', 'rating': 3.8},
-            ],
-            'restaurant': [
-                {'name': 'Local Cuisine', 'distance': '0.3 km', 'rating': 4.7},
-                {'name': 'Street Food Court', 'distance': '0.7 km', 'rating': 4.3},
-            ],
-            'religious': [
-                {'name': 'Main Mosque', 'distance': '1.0 km', 'rating': 4.8},
-                {'name': 'Cathedral', 'distance': '1.8 km', 'rating': 4.6},
-            ],
-            'cultural': [
-                {'name': 'Museum of History', 'distance': '2.0 km', 'rating': 4.4},
-                {'name': 'Art Gallery', 'distance': '1.5 km', 'rating': 4.1},
-            ]
-        }
+        try:
+            lat = float(data.get('lat'))
+            lng = float(data.get('lng'))
+            limit = min(max(int(data.get('limit', 5)), 1), NEAREST_MAX_K)
+        except (TypeError, ValueError):
+            return JsonResponse({'status': 'error', 'message': 'Invalid coordinates or limit'}, status=400)
+        
+        if category not in dict(QuickDestination.CATEGORIES):
+            return JsonResponse({'status': 'success', 'destinations': []})
+        
+        # The active travel's own destinations, merged with the offline POI index
+        destinations = nearest_places(
+            category, lat, lng,
+            k=limit,
+            destinations=QuickDestination.objects.filter(
+                travel__user=request.user, travel__is_active=True
+            ),
+        )
         
         return JsonResponse({
             'status': 'success',
-            'destinations': destinations.get(category, [])
+            'destinations': destinations
         })
     
     return JsonResponse({'status': 'error'})
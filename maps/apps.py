@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class MapsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'maps'
+
+    def ready(self):
+        from .services.autocomplete import connect_autocomplete
+        from .services.clusters import connect_clusters
+        connect_autocomplete()
+        connect_clusters()
@@ -0,0 +1,57 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from maps.services.geo import haversine_many
+from maps.services.itinerary import distance_matrix, optimize_tour
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the itinerary optimizer on random stops spread over a city'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stops', default='25,50,100,200,400',
+                            help='Comma-separated stop counts to try')
+        parser.add_argument('--budget', type=float, default=0.3,
+                            help='Time budget per route in seconds')
+        parser.add_argument('--runs', type=int, default=5,
+                            help='Random instances per stop count')
+        parser.add_argument('--radius-km', type=float, default=15,
+                            help='Half-width of the square the stops are drawn from')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(value) for value in options['stops'].split(',')]
+        except ValueError:
+            raise CommandError('--stops must be a list of integers, e.g. 50,100,200')
+
+        rng = np.random.default_rng(options['seed'])
+        spread = options['radius_km'] / 111.0
+        # Around Lome; only relative distances matter
+        center_lat, center_lng = 6.1319, 1.2228
+
+        self.stdout.write(f"{'stops':>6} {'matrix ms':>10} {'solve ms':>9} {'max ms':>8} "
+                          f"{'nn km':>9} {'final km':>9} {'gain':>6} {'converged':>9}")
+        for size in sizes:
+            matrix_ms, solve_ms, initial, final, converged = [], [], [], [], 0
+            for _ in range(options['runs']):
+                lats = center_lat + rng.uniform(-spread, spread, size)
+                lngs = center_lng + rng.uniform(-spread, spread, size)
+
+                started = time.perf_counter()
+                matrix = distance_matrix(lats, lngs)
+                start_row = haversine_many(center_lat, center_lng, lats, lngs)
+                matrix_ms.append((time.perf_counter() - started) * 1000)
+
+                _, stats = optimize_tour(matrix, start_row, time_budget=options['budget'])
+                solve_ms.append(stats['seconds'] * 1000)
+                initial.append(stats['initial_m'])
+                final.append(stats['length_m'])
+                converged += stats['converged']
+
+            gain = 1 - sum(final) / sum(initial)
+            self.stdout.write(
+                f"{size:>6} {np.mean(matrix_ms):>10.1f} {np.mean(solve_ms):>9.1f} {max(solve_ms):>8.1f} "
+                f"{np.mean(initial) / 1000:>9.1f} {np.mean(final) / 1000:>9.1f} {gain:>6.1%} "
+                f"{converged:>5}/{options['runs']}"
+            )
@@ -0,0 +1,56 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from maps.services.region_pack import build_region_pack
+from travels.models import Travel
+
+
+class Command(BaseCommand):
+    help = "Build or refresh the offline map pack (tiles, POIs and destinations) for a travel's city"
+
+    def add_arguments(self, parser):
+        parser.add_argument('travel_id', type=int)
+        parser.add_argument('--center', default=None,
+                            help='"lat,lng" of the city (default: kept from the last build, '
+                                 'else the middle of the travel\'s destinations)')
+        parser.add_argument('--radius', type=int, default=None,
+                            help='Meters around the center (default: OFFLINE_PACK_RADIUS_M)')
+        parser.add_argument('--min-zoom', type=int, default=None)
+        parser.add_argument('--max-zoom', type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            travel = Travel.objects.get(id=options['travel_id'])
+        except Travel.DoesNotExist:
+            raise CommandError(f"Travel {options['travel_id']} does not exist")
+
+        center = None
+        if options['center']:
+            try:
+                lat, lng = (float(value) for value in options['center'].split(','))
+            except ValueError:
+                raise CommandError('--center must look like "6.1319,1.2228"')
+            center = (lat, lng)
+
+        started = time.monotonic()
+        try:
+            report = build_region_pack(
+                travel,
+                center=center,
+                radius_m=options['radius'],
+                min_zoom=options['min_zoom'],
+                max_zoom=options['max_zoom'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if not report['changed']:
+            self.stdout.write(f"Pack v{report['version']} for {travel} is up to date ({report['path']})")
+            return
+
+        pois = 'unchanged' if report['pois'] is None else report['pois']
+        self.stdout.write(self.style.SUCCESS(
+            f"Built pack v{report['version']} for {travel} into {report['path']} "
+            f"in {time.monotonic() - started:.1f}s: {report['tiles']} tiles "
+            f"({report['tiles_written']} written, {report['tiles_removed']} removed), "
+            f"{pois} POIs, {report['destinations']} destinations"
+        ))
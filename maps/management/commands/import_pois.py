@@ -0,0 +1,32 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from maps.services.poi_index import PoiIndex, read_pois, save_poi_index
+
+
+class Command(BaseCommand):
+    help = 'Import a POI extract (CSV, GeoJSON, .osm or .osm.pbf) into the local search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='POI extract to import')
+        parser.add_argument('--output', default=None,
+                            help='Index file to write (default: POI_INDEX_PATH)')
+
+    def handle(self, *args, **options):
+        output = options['output'] or settings.POI_INDEX_PATH
+        started = time.monotonic()
+
+        try:
+            count = save_poi_index(read_pois(options['path']), output)
+        except ValueError as e:
+            raise CommandError(str(e))
+        except ImportError:
+            raise CommandError('Reading .pbf extracts requires the "osmium" package')
+        except OSError as e:
+            raise CommandError(f"Could not read {options['path']}: {e}")
+
+        index = PoiIndex.load(output)
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {count} places ({len(index.tokens)} tokens) into {output} "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maps', '0002_savedplace_geohash'),
+        ('travels', '0002_quickdestination_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrailSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField()),
+                ('point_count', models.IntegerField(default=0)),
+                ('points', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('travel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trail_segments', to='travels.travel')),
+            ],
+            options={
+                'ordering': ['started_at'],
+                'indexes': [models.Index(fields=['travel', 'ended_at'], name='maps_trails_travel__edfd5e_idx')],
+            },
+        ),
+    ]
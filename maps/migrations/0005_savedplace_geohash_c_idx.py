@@ -0,0 +1,26 @@
+from django.db import migrations
+
+# Geohash ranges are compared in byte order; see maps.services.nearby.geohash_filter
+POSTGRESQL_INDEX = 'CREATE INDEX IF NOT EXISTS savedplace_geohash_c_idx ON maps_savedplace ((geohash COLLATE "C"))'
+POSTGRESQL_DROP = 'DROP INDEX IF EXISTS savedplace_geohash_c_idx'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(POSTGRESQL_INDEX)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(POSTGRESQL_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maps', '0004_alter_searchhistory_created_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from .services.geo import geohash_encode
 
 User = get_user_model()
 
@@ -9,7 +11,8 @@ class SearchHistory(models.Model):
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
     place_name = models.CharField(max_length=200, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: rows are inserted by the write-behind buffer, after the search
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         ordering = ['-created_at']
@@ -25,7 +28,28 @@ class SavedPlace(models.Model):
     longitude = models.FloatField()
     category = models.CharField(max_length=50, blank=True)
     notes = models.TextField(blank=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"{self.name} - {self.user.username}"
\ No newline at end of file
+        return f"{self.name} - {self.user.username}"
+    
+    def save(self, *args, **kwargs):
+        self.geohash = geohash_encode(self.latitude, self.longitude)
+        super().save(*args, **kwargs)
+
+class TrailSegment(models.Model):
+    """A stretch of a travel's recorded trail, stored as delta-encoded points"""
+    travel = models.ForeignKey('travels.Travel', on_delete=models.CASCADE, related_name='trail_segments')
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+    point_count = models.IntegerField(default=0)
+    points = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['started_at']
+        indexes = [models.Index(fields=['travel', 'ended_at'])]
+
+    def __str__(self):
+        return f"{self.travel} - {self.started_at:%Y-%m-%d %H:%M} ({self.point_count} points)"
@@ -0,0 +1,214 @@
+import threading
+import time
+from django.db import connection, transaction
+from maps.models import SearchHistory
+from safe_traveller.writebehind import flushed
+from .geo import geohash_encode
+from .poi_index import normalize_text
+
+# Popular queries are counted per geohash cell of this precision (about 40 x 20 km)
+CELL_PRECISION = 4
+GLOBAL_CELL = ''
+# Completions are kept for prefixes up to this length; longer input filters that node
+MAX_PREFIX_LENGTH = 12
+TOP_K = 8
+RECENT_PER_USER = 50
+REFRESH_SECONDS = 10
+REFRESH_BATCH = 5000
+
+
+def normalize_query(query):
+    return ' '.join(normalize_text(query).split())
+
+
+def _prefixes(norm):
+    """Prefixes of the query and of every word suffix, so 'mar' finds 'grand marche'"""
+    starts = [0] + [i + 1 for i, c in enumerate(norm) if c == ' ']
+    prefixes = set()
+    for start in starts:
+        tail = norm[start:start + MAX_PREFIX_LENGTH]
+        prefixes.update(tail[:length] for length in range(1, len(tail) + 1))
+    return prefixes
+
+
+def _matches(norm, prefix):
+    return norm.startswith(prefix) or f" {prefix}" in f" {norm}"
+
+
+class AutocompleteIndex:
+    """Per-user recent queries and per-cell popular queries with top-k completions per prefix"""
+
+    def __init__(self):
+        self.recent = {}
+        self.counts = {}
+        self.display = {}
+        self.top = {}
+        self.last_id = 0
+        self.folded = set()
+        self.lock = threading.Lock()
+
+    def _remember(self, user_id, query):
+        """Update the user's recent list; returns the normalized query or None"""
+        norm = normalize_query(query)
+        if not norm:
+            return None
+        self.display[norm] = ' '.join(query.split())
+
+        recent = [entry for entry in self.recent.get(user_id, []) if entry != norm]
+        recent.insert(0, norm)
+        self.recent[user_id] = recent[:RECENT_PER_USER]
+        return norm
+
+    @staticmethod
+    def _cells(lat, lng):
+        if lat is None or lng is None:
+            return [GLOBAL_CELL]
+        return [GLOBAL_CELL, geohash_encode(float(lat), float(lng), CELL_PRECISION)]
+
+    def _bump(self, cell, norm, increment=1):
+        count = self.counts.get((cell, norm), 0) + increment
+        self.counts[(cell, norm)] = count
+        for prefix in _prefixes(norm):
+            self._offer(cell, prefix, norm, count)
+
+    def _build(self, counts):
+        """Fill an empty index: visiting queries by falling count, each node takes the first TOP_K"""
+        self.counts.update(counts)
+        for (cell, norm), count in sorted(counts.items(), key=lambda item: -item[1]):
+            for prefix in _prefixes(norm):
+                top = self.top.setdefault((cell, prefix), [])
+                if len(top) < TOP_K:
+                    top.append([count, norm])
+
+    def add(self, user_id, query, lat=None, lng=None):
+        norm = self._remember(user_id, query)
+        if norm:
+            for cell in self._cells(lat, lng):
+                self._bump(cell, norm)
+
+    def _offer(self, cell, prefix, norm, count):
+        # Counts only grow, so keeping the best TOP_K seen so far stays exact
+        top = self.top.setdefault((cell, prefix), [])
+        for entry in top:
+            if entry[1] == norm:
+                entry[0] = count
+                break
+        else:
+            if len(top) < TOP_K:
+                top.append([count, norm])
+            elif count > top[-1][0]:
+                top[-1] = [count, norm]
+            else:
+                return
+        top.sort(key=lambda entry: -entry[0])
+
+    def record(self, history):
+        """Fold a row this process just wrote, ahead of the next refresh"""
+        with self.lock:
+            if history.id > self.last_id:
+                self.folded.add(history.id)
+                self.add(history.user_id, history.query, history.latitude, history.longitude)
+
+    def refresh(self):
+        """Fold SearchHistory rows written since the last refresh"""
+        with self.lock:
+            initial = not self.counts
+            increments = {}
+            while True:
+                rows = list(
+                    SearchHistory.objects.filter(id__gt=self.last_id).order_by('id')
+                    .values_list('id', 'user_id', 'query', 'latitude', 'longitude')[:REFRESH_BATCH]
+                )
+                # Count per (cell, query) first so each touches its prefixes once
+                for row_id, user_id, query, lat, lng in rows:
+                    if row_id in self.folded:
+                        self.folded.discard(row_id)
+                        continue
+                    norm = self._remember(user_id, query)
+                    if norm:
+                        for cell in self._cells(lat, lng):
+                            increments[(cell, norm)] = increments.get((cell, norm), 0) + 1
+                if rows:
+                    self.last_id = rows[-1][0]
+                if not initial:
+                    for (cell, norm), increment in increments.items():
+                        self._bump(cell, norm, increment)
+                    increments = {}
+                if len(rows) < REFRESH_BATCH:
+                    break
+            if initial:
+                self._build(increments)
+
+    def suggest(self, user_id, text, lat=None, lng=None, limit=TOP_K):
+        """Recent queries of the user first, then popular ones near lat/lng, then anywhere"""
+        prefix = normalize_query(text)
+        if not prefix:
+            return []
+
+        suggestions = []
+        seen = set()
+        for norm in self.recent.get(user_id, []):
+            if len(suggestions) >= limit // 2:
+                break
+            if _matches(norm, prefix):
+                suggestions.append({'query': self.display[norm], 'source': 'recent'})
+                seen.add(norm)
+
+        cells = [GLOBAL_CELL]
+        if lat is not None and lng is not None:
+            cells.insert(0, geohash_encode(lat, lng, CELL_PRECISION))
+        for cell in cells:
+            for _, norm in list(self.top.get((cell, prefix[:MAX_PREFIX_LENGTH]), ())):
+                if len(suggestions) >= limit:
+                    return suggestions
+                if norm not in seen and _matches(norm, prefix):
+                    suggestions.append({'query': self.display[norm], 'source': 'popular'})
+                    seen.add(norm)
+        return suggestions
+
+
+_index = None
+_index_lock = threading.Lock()
+_refreshed_at = 0.0
+_refreshing = False
+
+
+def _refresh_in_background(index):
+    global _refreshed_at, _refreshing
+    try:
+        index.refresh()
+        _refreshed_at = time.monotonic()
+    finally:
+        _refreshing = False
+        connection.close()
+
+
+def get_autocomplete_index():
+    """Shared index; stale data is refreshed off the request path"""
+    global _index, _refreshed_at, _refreshing
+
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = AutocompleteIndex()
+                index.refresh()
+                _refreshed_at = time.monotonic()
+                _index = index
+    elif not _refreshing and time.monotonic() - _refreshed_at > REFRESH_SECONDS:
+        _refreshing = True
+        threading.Thread(target=_refresh_in_background, args=(_index,), daemon=True).start()
+    return _index
+
+
+def _record_flushed(sender, rows, **kwargs):
+    # Once committed, so refresh() can't read the rows first and count them twice
+    def record():
+        if _index is not None:
+            for history in rows:
+                _index.record(history)
+    transaction.on_commit(record)
+
+
+def connect_autocomplete():
+    """Make SearchHistory rows suggestible in this process as soon as the write-behind buffer inserts them"""
+    flushed.connect(_record_flushed, sender=SearchHistory, dispatch_uid="autocomplete_record_search")
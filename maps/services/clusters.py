@@ -0,0 +1,230 @@
+import math
+import time
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from maps.models import SavedPlace
+from .geo import MAX_LATITUDE
+
+# Levels are precomputed up to this zoom; past it the map shows single places
+MAX_CLUSTER_ZOOM = 16
+# Cells are 256 >> CELL_SHIFT pixels wide, i.e. 64 px
+CELL_SHIFT = 2
+CLUSTER_CACHE_TIMEOUT = 24 * 3600
+# Longest an add_to_clusters update may hold a user's levels
+CLUSTER_LOCK_TIMEOUT = 10
+
+# A level is a dict of parallel arrays, one entry per occupied cell, sorted by key
+LEVEL_FIELDS = ('count', 'sum_lat', 'sum_lng', 'south', 'west', 'north', 'east', 'place_id')
+
+
+def _version_key(user_id):
+    return f"clusters-version:{user_id}"
+
+
+def _version(user_id):
+    """Version in the keys of a user's cached levels"""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # From the clock, so levels cached under an evicted version never match again
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _invalidate(user_id):
+    """Orphan every cached level of the user, including ones being written right now"""
+    cache.set(_version_key(user_id), time.time_ns(), timeout=None)
+
+
+def _cache_key(user_id, zoom, version):
+    return f"clusters:{user_id}:{version}:{zoom}"
+
+
+def _cells_per_side(zoom):
+    return 2 ** (zoom + CELL_SHIFT)
+
+
+def cell_xy(lats, lngs, zoom):
+    """Web Mercator cell columns and rows of coordinate arrays at a zoom level"""
+    n = _cells_per_side(zoom)
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    x = np.floor((lngs + 180) / 360 * n).astype(np.int64)
+    y = np.floor((1 - np.arcsinh(np.tan(np.radians(lats))) / math.pi) / 2 * n).astype(np.int64)
+    return np.clip(x, 0, n - 1), np.clip(y, 0, n - 1)
+
+
+def build_levels(ids, lats, lngs):
+    """Per-zoom cell aggregates (count, centroid sums, bounds, lone place id)"""
+    ids = np.asarray(ids, dtype=np.int64)
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+
+    levels = {}
+    for zoom in range(MAX_CLUSTER_ZOOM + 1):
+        x, y = cell_xy(lats, lngs, zoom)
+        keys, inverse = np.unique(x * _cells_per_side(zoom) + y, return_inverse=True)
+        level = {
+            'keys': keys,
+            'count': np.bincount(inverse, minlength=len(keys)),
+            'sum_lat': np.bincount(inverse, weights=lats, minlength=len(keys)),
+            'sum_lng': np.bincount(inverse, weights=lngs, minlength=len(keys)),
+            'south': np.full(len(keys), np.inf),
+            'west': np.full(len(keys), np.inf),
+            'north': np.full(len(keys), -np.inf),
+            'east': np.full(len(keys), -np.inf),
+            'place_id': np.full(len(keys), -1, dtype=np.int64),
+        }
+        np.minimum.at(level['south'], inverse, lats)
+        np.minimum.at(level['west'], inverse, lngs)
+        np.maximum.at(level['north'], inverse, lats)
+        np.maximum.at(level['east'], inverse, lngs)
+        # Remember who sits alone in a cell so it can be drawn as a place
+        level['place_id'][inverse] = ids
+        level['place_id'][level['count'] > 1] = -1
+        levels[zoom] = level
+    return levels
+
+
+def _load_levels(user_id, version):
+    rows = list(SavedPlace.objects.filter(user_id=user_id).values_list('id', 'latitude', 'longitude'))
+    levels = build_levels(*zip(*rows)) if rows else build_levels([], [], [])
+    cache.set_many({_cache_key(user_id, zoom, version): level for zoom, level in levels.items()},
+                   CLUSTER_CACHE_TIMEOUT)
+    return levels
+
+
+def get_level(user_id, zoom):
+    version = _version(user_id)
+    level = cache.get(_cache_key(user_id, zoom, version))
+    if level is None:
+        level = _load_levels(user_id, version)[zoom]
+    return level
+
+
+def add_to_clusters(place):
+    """Fold a new SavedPlace into the cached levels instead of rebuilding them
+
+    One update at a time per user, under a cache.add lock. When another holds
+    it, or a level is missing (a rebuild may be reading the table from before
+    the place), the levels are invalidated instead and rebuilt on next read.
+    """
+    lock_key = f"clusters-lock:{place.user_id}"
+    if not cache.add(lock_key, 1, CLUSTER_LOCK_TIMEOUT):
+        _invalidate(place.user_id)
+        return
+    try:
+        _fold(place)
+    finally:
+        cache.delete(lock_key)
+
+
+def _fold(place):
+    version = _version(place.user_id)
+    keys = {zoom: _cache_key(place.user_id, zoom, version) for zoom in range(MAX_CLUSTER_ZOOM + 1)}
+    cached = cache.get_many(keys.values())
+    if len(cached) < len(keys):
+        _invalidate(place.user_id)
+        return
+    lat = float(place.latitude)
+    lng = float(place.longitude)
+    updated = {}
+    for zoom, key in keys.items():
+        level = cached[key]
+        x, y = cell_xy([lat], [lng], zoom)
+        cell_key = int(x[0]) * _cells_per_side(zoom) + int(y[0])
+        i = int(np.searchsorted(level['keys'], cell_key))
+        if i < len(level['keys']) and level['keys'][i] == cell_key:
+            level['count'][i] += 1
+            level['sum_lat'][i] += lat
+            level['sum_lng'][i] += lng
+            level['south'][i] = min(level['south'][i], lat)
+            level['west'][i] = min(level['west'][i], lng)
+            level['north'][i] = max(level['north'][i], lat)
+            level['east'][i] = max(level['east'][i], lng)
+            level['place_id'][i] = -1
+        else:
+            values = dict(count=1, sum_lat=lat, sum_lng=lng, south=lat, west=lng,
+                          north=lat, east=lng, place_id=place.id)
+            level['keys'] = np.insert(level['keys'], i, cell_key)
+            for field in LEVEL_FIELDS:
+                level[field] = np.insert(level[field], i, values[field])
+        updated[key] = level
+    cache.set_many(updated, CLUSTER_CACHE_TIMEOUT)
+
+
+def _place_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # Once committed, so a rebuild can't read the table from before the change
+    if created:
+        transaction.on_commit(lambda: add_to_clusters(instance))
+    else:
+        # It may have moved from one cell to another
+        transaction.on_commit(lambda: _invalidate(instance.user_id))
+
+
+def _place_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: _invalidate(instance.user_id))
+
+
+def connect_clusters():
+    """Keep a user's cached levels in step with their saved places
+
+    Writes that send no signals (queryset.update/delete, purge_deleted) leave
+    levels stale for up to CLUSTER_CACHE_TIMEOUT.
+    """
+    post_save.connect(_place_saved, sender=SavedPlace, dispatch_uid="clusters_place_saved")
+    post_delete.connect(_place_deleted, sender=SavedPlace, dispatch_uid="clusters_place_deleted")
+
+
+def clusters_in_box(user_id, zoom, south, west, north, east):
+    """Clusters and lone places of a user's saved places inside a viewport"""
+    zoom = max(0, min(int(zoom), MAX_CLUSTER_ZOOM))
+    level = get_level(user_id, zoom)
+    n = _cells_per_side(zoom)
+
+    (first_x, last_x), (first_y, last_y) = (
+        axis.tolist() for axis in cell_xy([north, south], [west, east], zoom)
+    )
+    if west > east:
+        # Viewport crosses the antimeridian
+        columns = list(range(first_x, n)) + list(range(0, last_x + 1))
+    else:
+        columns = list(range(first_x, last_x + 1))
+
+    # Within a column, the viewport's cells are one contiguous run of keys
+    columns = np.array(columns, dtype=np.int64)
+    starts = np.searchsorted(level['keys'], columns * n + first_y)
+    ends = np.searchsorted(level['keys'], columns * n + last_y + 1)
+    cells = np.concatenate([np.arange(0)] + [np.arange(start, end) for start, end in zip(starts, ends)])
+
+    count = level['count'][cells]
+    lone = cells[count == 1]
+    grouped = cells[count > 1]
+
+    lone_ids = level['place_id'][lone].tolist()
+    names = dict(SavedPlace.objects.filter(id__in=lone_ids).values_list('id', 'name')) if lone_ids else {}
+    places = [
+        {
+            'id': place_id,
+            'name': names.get(place_id, ''),
+            'latitude': float(level['sum_lat'][i]),
+            'longitude': float(level['sum_lng'][i]),
+        }
+        for i, place_id in zip(lone, lone_ids)
+    ]
+    clusters = [
+        {
+            'count': int(level['count'][i]),
+            'lat': float(level['sum_lat'][i] / level['count'][i]),
+            'lng': float(level['sum_lng'][i] / level['count'][i]),
+            'bounds': [float(level['south'][i]), float(level['west'][i]),
+                       float(level['north'][i]), float(level['east'][i])],
+        }
+        for i in grouped
+    ]
+    return clusters, places
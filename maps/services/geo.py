@@ -0,0 +1,178 @@
+import math
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+# Web Mercator stops here
+MAX_LATITUDE = 85.05112878
+
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Precision stored on models: cells of roughly 5 x 5 m
+GEOHASH_PRECISION = 9
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters between two points"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_many(lat, lng, lats, lngs):
+    """Vectorized distance in meters from one point to arrays of points"""
+    phi1 = np.radians(lat)
+    phi2 = np.radians(np.asarray(lats, dtype=np.float64))
+    dphi = phi2 - phi1
+    dlmb = np.radians(np.asarray(lngs, dtype=np.float64) - lng)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def initial_bearing(lat1, lng1, lat2, lng2):
+    """Compass bearing in degrees from the first point towards the second"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dlmb = math.radians(lng2 - lng1)
+    x = math.sin(dlmb) * math.cos(phi2)
+    y = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlmb)
+    return (math.degrees(math.atan2(x, y)) + 360) % 360
+
+
+def format_distance(meters):
+    """Format a distance the way the UI displays it"""
+    if meters < 1000:
+        return f"{meters:.0f} m"
+    return f"{meters / 1000:.1f} km"
+
+
+def format_duration(seconds):
+    """Format a travel time as '8 minutes' or '1 h 25 min'"""
+    minutes = max(1, round(seconds / 60))
+    if minutes < 60:
+        return f"{minutes} minute{'s' if minutes != 1 else ''}"
+    return f"{minutes // 60} h {minutes % 60} min"
+
+
+def geohash_encode(lat, lng, precision=GEOHASH_PRECISION):
+    """Encode a coordinate as a base32 geohash"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    value = 0
+    bits = 0
+    even = True
+    while len(chars) < precision:
+        coordinate, bounds = (lng, lng_range) if even else (lat, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        if coordinate >= mid:
+            value = value * 2 + 1
+            bounds[0] = mid
+        else:
+            value *= 2
+            bounds[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_BASE32[value])
+            value = 0
+            bits = 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """(height, width) in degrees of a geohash cell"""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180 / 2 ** lat_bits, 360 / 2 ** lng_bits
+
+
+def geohash_cover(south, west, north, east, max_cells=32):
+    """Geohash prefixes covering a bounding box, as fine as max_cells allows"""
+    if west > east:
+        # Split boxes that cross the antimeridian
+        return sorted(set(geohash_cover(south, west, north, 180, max_cells))
+                      | set(geohash_cover(south, -180, north, east, max_cells)))
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = geohash_cell_size(precision)
+        first_row = math.floor((south + 90) / height)
+        last_row = math.floor((min(north, 90 - 1e-9) + 90) / height)
+        first_col = math.floor((west + 180) / width)
+        last_col = math.floor((min(east, 180 - 1e-9) + 180) / width)
+        if (last_row - first_row + 1) * (last_col - first_col + 1) <= max_cells:
+            break
+
+    return sorted({
+        geohash_encode(-90 + (row + 0.5) * height, -180 + (col + 0.5) * width, precision)
+        for row in range(first_row, last_row + 1)
+        for col in range(first_col, last_col + 1)
+    })
+
+
+def box_around(lat, lng, radius_m):
+    """(south, west, north, east) of a box enclosing a circle"""
+    dlat = radius_m / METERS_PER_DEGREE
+    dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    return max(lat - dlat, -90), max(lng - dlng, -180), min(lat + dlat, 90), min(lng + dlng, 180)
+
+
+class GridIndex:
+    """Fixed-size lat/lng grid over point arrays for radius and nearest queries"""
+
+    def __init__(self, lats, lngs, cell_deg=0.01):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lngs = np.asarray(lngs, dtype=np.float64)
+        self.cell_deg = cell_deg
+        self.columns = int(math.ceil(360 / cell_deg)) + 1
+
+        keys = self._keys(self.lats, self.lngs)
+        self.order = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[self.order]
+
+    def _row(self, lat):
+        return np.floor((np.asarray(lat) + 90) / self.cell_deg).astype(np.int64)
+
+    def _col(self, lng):
+        return np.floor((np.asarray(lng) + 180) / self.cell_deg).astype(np.int64)
+
+    def _keys(self, lats, lngs):
+        return self._row(lats) * self.columns + self._col(lngs)
+
+    def candidates_in_box(self, south, west, north, east):
+        """Indices of points in the cells covering a bounding box"""
+        first_row, last_row = int(self._row(south)), int(self._row(north))
+        first_col, last_col = int(self._col(west)), int(self._col(east))
+        spans = []
+        for row in range(first_row, last_row + 1):
+            lo, hi = np.searchsorted(
+                self.sorted_keys,
+                [row * self.columns + first_col, row * self.columns + last_col + 1],
+            )
+            if hi > lo:
+                spans.append(self.order[lo:hi])
+        if not spans:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(spans)
+
+    def within(self, lat, lng, radius_m):
+        """Indices and distances of points within radius_m of a location"""
+        candidates = self.candidates_in_box(*box_around(lat, lng, radius_m))
+        distances = haversine_many(lat, lng, self.lats[candidates], self.lngs[candidates])
+        mask = distances <= radius_m
+        return candidates[mask], distances[mask]
+
+    def nearest(self, lat, lng, max_radius_m=5000):
+        """Index and distance of the closest point, or (None, None)"""
+        radius = self.cell_deg * METERS_PER_DEGREE
+        while True:
+            indices, distances = self.within(lat, lng, min(radius, max_radius_m))
+            if len(indices):
+                best = int(np.argmin(distances))
+                return int(indices[best]), float(distances[best])
+            if radius >= max_radius_m:
+                return None, None
+            radius *= 2
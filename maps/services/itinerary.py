@@ -0,0 +1,178 @@
+import time
+import numpy as np
+from .geo import haversine_many
+
+# Improvements smaller than this (meters) are rounding noise
+EPSILON_M = 1e-6
+# Or-opt moves chains of up to this many stops
+OR_OPT_MAX_SEGMENT = 3
+DEFAULT_TIME_BUDGET = 0.3
+
+
+def distance_matrix(lats, lngs):
+    """Pairwise haversine distances in meters, one row per point"""
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    return haversine_many(lats[:, None], lngs[:, None], lats[None, :], lngs[None, :])
+
+
+def _with_endpoints(matrix, start_row=None, round_trip=False):
+    """Add fixed first and last nodes so the solvers only ever move the stops between them
+
+    start_row holds distances from the starting point to each stop. Without one the
+    route may start anywhere, which a zero-distance first node expresses.
+    """
+    n = len(matrix)
+    if start_row is None and round_trip:
+        # A loop has no natural start; anchor it on the first stop
+        start_row = matrix[0]
+    start = np.zeros(n) if start_row is None else np.asarray(start_row, dtype=np.float64)
+    end = start if round_trip else np.zeros(n)
+
+    full = np.zeros((n + 2, n + 2))
+    full[1:-1, 1:-1] = matrix
+    full[0, 1:-1] = full[1:-1, 0] = start
+    full[-1, 1:-1] = full[1:-1, -1] = end
+    return full
+
+
+def nearest_neighbour(matrix):
+    """Greedy tour from node 0 through every inner node, ending at the last node"""
+    n = len(matrix)
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = visited[-1] = True
+    tour = [0]
+    for _ in range(n - 2):
+        row = np.where(visited, np.inf, matrix[tour[-1]])
+        nxt = int(np.argmin(row))
+        visited[nxt] = True
+        tour.append(nxt)
+    tour.append(n - 1)
+    return np.array(tour, dtype=np.int64)
+
+
+def tour_length(matrix, tour):
+    return float(matrix[tour[:-1], tour[1:]].sum())
+
+
+def two_opt_pass(matrix, tour, deadline):
+    """Reverse stretches of the tour while that shortens it; True if anything changed"""
+    improved = False
+    m = len(tour)
+    for i in range(1, m - 2):
+        if time.monotonic() > deadline:
+            break
+        a, b = tour[i - 1], tour[i]
+        j = np.arange(i + 1, m - 1)
+        c, d = tour[j], tour[j + 1]
+        delta = matrix[a, c] + matrix[b, d] - matrix[a, b] - matrix[c, d]
+        best = int(np.argmin(delta))
+        if delta[best] < -EPSILON_M:
+            k = j[best]
+            tour[i:k + 1] = tour[i:k + 1][::-1]
+            improved = True
+    return improved
+
+
+def or_opt_pass(matrix, tour, deadline):
+    """Move chains of 1-3 stops, possibly reversed, to a cheaper spot; True if anything changed"""
+    improved = False
+    for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+        i = 1
+        while i + length < len(tour):
+            if time.monotonic() > deadline:
+                return improved
+            first, last = tour[i], tour[i + length - 1]
+            before, after = tour[i - 1], tour[i + length]
+            removal_gain = matrix[before, first] + matrix[last, after] - matrix[before, after]
+
+            rest = np.concatenate([tour[:i], tour[i + length:]])
+            left, right = rest[:-1], rest[1:]
+            base = matrix[left, right]
+            forward = matrix[left, first] + matrix[last, right] - base
+            backward = matrix[left, last] + matrix[first, right] - base
+            # Putting the chain back where it was is not a move
+            forward[i - 1] = backward[i - 1] = np.inf
+
+            k_forward = int(np.argmin(forward))
+            k_backward = int(np.argmin(backward))
+            if backward[k_backward] < forward[k_forward]:
+                k, cost, reverse = k_backward, backward[k_backward], True
+            else:
+                k, cost, reverse = k_forward, forward[k_forward], False
+
+            if cost - removal_gain < -EPSILON_M:
+                segment = tour[i:i + length]
+                if reverse:
+                    segment = segment[::-1]
+                tour[:] = np.concatenate([rest[:k + 1], segment, rest[k + 1:]])
+                improved = True
+            else:
+                i += 1
+    return improved
+
+
+def optimize_tour(matrix, start_row=None, round_trip=False, time_budget=DEFAULT_TIME_BUDGET):
+    """Order stops to keep the route short: nearest neighbour, then 2-opt and Or-opt until
+    nothing improves or time_budget seconds have passed.
+
+    Returns (order, stats) where order indexes the rows of matrix.
+    """
+    started = time.monotonic()
+    deadline = started + time_budget
+    n = len(matrix)
+    if n == 0:
+        return np.empty(0, dtype=np.int64), {'initial_m': 0.0, 'length_m': 0.0, 'passes': 0,
+                                              'seconds': 0.0, 'converged': True}
+
+    full = _with_endpoints(matrix, start_row, round_trip)
+    tour = nearest_neighbour(full)
+    initial = tour_length(full, tour)
+
+    passes = 0
+    converged = False
+    while time.monotonic() < deadline:
+        passes += 1
+        changed = two_opt_pass(full, tour, deadline)
+        changed = or_opt_pass(full, tour, deadline) or changed
+        if not changed:
+            converged = True
+            break
+
+    order = tour[1:-1] - 1
+    if start_row is None and round_trip:
+        # The anchor stop stands in for the start; begin the loop there
+        anchor = int(np.flatnonzero(order == 0)[0])
+        order = np.roll(order, -anchor)
+    return order, {
+        'initial_m': initial,
+        'length_m': tour_length(full, tour),
+        'passes': passes,
+        'seconds': time.monotonic() - started,
+        'converged': converged,
+    }
+
+
+def plan_itinerary(stops, start=None, round_trip=False, time_budget=DEFAULT_TIME_BUDGET):
+    """Order stops (dicts with lat/lng) into a short route from start, with leg distances
+
+    Returns (ordered stops, legs in meters, return leg in meters or None, stats). The
+    first leg runs from start, or is 0 when there is no start.
+    """
+    if not stops:
+        return [], [], None, {'initial_m': 0.0, 'length_m': 0.0, 'passes': 0,
+                              'seconds': 0.0, 'converged': True}
+
+    lats = np.array([stop['lat'] for stop in stops], dtype=np.float64)
+    lngs = np.array([stop['lng'] for stop in stops], dtype=np.float64)
+    matrix = distance_matrix(lats, lngs)
+    start_row = None if start is None else haversine_many(start[0], start[1], lats, lngs)
+
+    order, stats = optimize_tour(matrix, start_row, round_trip, time_budget)
+
+    legs = [0.0 if start_row is None else float(start_row[order[0]])]
+    legs += [float(matrix[a, b]) for a, b in zip(order[:-1], order[1:])]
+    return_leg = None
+    if round_trip:
+        return_leg = float(matrix[order[-1], order[0]] if start_row is None else start_row[order[-1]])
+    return [stops[i] for i in order], legs, return_leg, stats
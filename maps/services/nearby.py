@@ -0,0 +1,163 @@
+import math
+import numpy as np
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Collate
+from .geo import GEOHASH_BASE32, box_around, format_distance, geohash_cover, haversine, haversine_many
+from .poi_index import get_poi_index, normalize_text
+
+# Cells per query: more cells means tighter SQL ranges but a longer WHERE clause
+MAX_COVER_CELLS = 32
+
+# Nearest-place candidates are cached per (cell, category) and refined per request
+NEAREST_CELL_DEG = 0.01
+NEAREST_MAX_K = 20
+NEAREST_CACHE_TIMEOUT = 6 * 3600
+# A POI this close to a trip destination of the same name is the same place
+DUPLICATE_DISTANCE_M = 50
+
+
+def _next_cell(prefix):
+    """The first geohash after every one starting with prefix; None past the last cell"""
+    while prefix:
+        index = GEOHASH_BASE32.index(prefix[-1])
+        if index + 1 < len(GEOHASH_BASE32):
+            return prefix[:-1] + GEOHASH_BASE32[index + 1]
+        # 'z' carries over into the character before it
+        prefix = prefix[:-1]
+    return None
+
+
+def geohash_ranges(south, west, north, east, max_cells=MAX_COVER_CELLS):
+    """Half-open [lo, hi) geohash ranges covering a bounding box, adjacent cells merged; hi None is open"""
+    ranges = []
+    for prefix in geohash_cover(south, west, north, east, max_cells):
+        # Every bound is a geohash itself, so the ranges need no character outside base32
+        if ranges and ranges[-1][1] == prefix:
+            ranges[-1][1] = _next_cell(prefix)
+        else:
+            ranges.append([prefix, _next_cell(prefix)])
+    return ranges
+
+
+def geohash_filter(queryset, south, west, north, east, max_cells=MAX_COVER_CELLS):
+    """queryset preselected to rows whose geohash falls inside a bounding box's cover"""
+    field = 'geohash'
+    if connection.vendor == 'postgresql':
+        # Base32 order is byte order; a linguistic collation may sort geohashes otherwise.
+        # Served by the (geohash COLLATE "C") indexes.
+        queryset = queryset.alias(geohash_c=Collate('geohash', 'C'))
+        field = 'geohash_c'
+    condition = Q()
+    for lo, hi in geohash_ranges(south, west, north, east, max_cells):
+        bounds = {f"{field}__gte": lo}
+        if hi is not None:
+            bounds[f"{field}__lt"] = hi
+        condition |= Q(**bounds)
+    return queryset.filter(condition)
+
+
+def _coordinates(rows):
+    lats = np.fromiter((row['latitude'] for row in rows), dtype=np.float64, count=len(rows))
+    lngs = np.fromiter((row['longitude'] for row in rows), dtype=np.float64, count=len(rows))
+    return lats, lngs
+
+
+def in_box(queryset, south, west, north, east, fields, limit=None):
+    """Rows of a geohash-indexed queryset inside a bounding box, as dicts"""
+    rows = list(geohash_filter(queryset, south, west, north, east)
+                .values(*fields, 'latitude', 'longitude'))
+    if not rows:
+        return []
+
+    lats, lngs = _coordinates(rows)
+    if west <= east:
+        mask = (lngs >= west) & (lngs <= east)
+    else:
+        mask = (lngs >= west) | (lngs <= east)
+    mask &= (lats >= south) & (lats <= north)
+    return [rows[i] for i in np.flatnonzero(mask)[:limit]]
+
+
+def near(queryset, lat, lng, radius_m, fields, limit=None):
+    """Rows of a geohash-indexed queryset within radius_m, closest first"""
+    rows = list(geohash_filter(queryset, *box_around(lat, lng, radius_m))
+                .values(*fields, 'latitude', 'longitude'))
+    if not rows:
+        return []
+
+    lats, lngs = _coordinates(rows)
+    distances = haversine_many(lat, lng, lats, lngs)
+    hits = np.flatnonzero(distances <= radius_m)
+    hits = hits[np.argsort(distances[hits], kind='stable')][:limit]
+
+    results = []
+    for i in hits:
+        row = rows[i]
+        row['distance_m'] = round(float(distances[i]), 1)
+        results.append(row)
+    return results
+
+
+def _poi_candidates(index, category, lat, lng):
+    """Cached POIs of a category that can be among the nearest for any point in lat/lng's cell"""
+    row = math.floor((lat + 90) / NEAREST_CELL_DEG)
+    col = math.floor((lng + 180) / NEAREST_CELL_DEG)
+    key = f"poi-nearest:{index.version}:{category}:{row}:{col}"
+    candidates = cache.get(key)
+    if candidates is None:
+        center_lat = (row + 0.5) * NEAREST_CELL_DEG - 90
+        center_lng = (col + 0.5) * NEAREST_CELL_DEG - 180
+        half_diagonal = haversine(center_lat, center_lng,
+                                  center_lat + NEAREST_CELL_DEG / 2, center_lng + NEAREST_CELL_DEG / 2)
+        # Room for the over-fetch in nearest_places: k POIs plus up to k duplicates
+        candidates = index.nearest_candidates(center_lat, center_lng, category, 2 * NEAREST_MAX_K,
+                                              half_diagonal)
+        cache.set(key, candidates, NEAREST_CACHE_TIMEOUT)
+    return candidates
+
+
+def nearest_places(category, lat, lng, k=5, destinations=None):
+    """The k places of a category closest to lat/lng, from trip destinations and the POI index"""
+    k = min(k, NEAREST_MAX_K)
+    places = []
+
+    if destinations is not None:
+        rows = list(destinations.filter(category=category)
+                    .values('id', 'name', 'address', 'latitude', 'longitude', 'visited'))
+        if rows:
+            lats, lngs = _coordinates(rows)
+            distances = haversine_many(lat, lng, lats, lngs)
+            for i in np.argsort(distances, kind='stable')[:k]:
+                row = rows[i]
+                places.append({
+                    'id': row['id'],
+                    'name': row['name'],
+                    'address': row['address'],
+                    'lat': row['latitude'],
+                    'lng': row['longitude'],
+                    'category': category,
+                    'visited': row['visited'],
+                    'distance_m': round(float(distances[i])),
+                    'distance': format_distance(distances[i]),
+                    'source': 'travel',
+                })
+
+    index = get_poi_index()
+    if index is not None:
+        candidates = _poi_candidates(index, category, lat, lng)
+        # Over-fetch so dropping duplicates of trip destinations still leaves k
+        ids, distances = index.nearest(lat, lng, category, k + len(places), candidates)
+        known = [(normalize_text(place['name']), place['lat'], place['lng']) for place in places]
+        for i, distance in zip(ids, distances):
+            place = index.place(int(i), distance)
+            name = normalize_text(place['name'])
+            if any(name == known_name and haversine(place['lat'], place['lng'], known_lat, known_lng)
+                   <= DUPLICATE_DISTANCE_M for known_name, known_lat, known_lng in known):
+                continue
+            place['source'] = 'poi'
+            places.append(place)
+
+    places.sort(key=lambda place: place['distance_m'])
+    return places[:k]
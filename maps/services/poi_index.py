@@ -0,0 +1,389 @@
+import bisect
+import csv
+import json
+import os
+import re
+import unicodedata
+import numpy as np
+from django.conf import settings
+from .geo import GridIndex, format_distance, haversine_many
+
+# Index 0 is "uncategorised"; the rest mirror QuickDestination.CATEGORIES
+CATEGORIES = ['', 'market', 'hotel', 'restaurant', 'religious', 'cultural', 'hospital', 'transport']
+
+OSM_CATEGORIES = {
+    'amenity': {
+        'marketplace': 'market',
+        'restaurant': 'restaurant', 'cafe': 'restaurant', 'fast_food': 'restaurant',
+        'food_court': 'restaurant', 'bar': 'restaurant',
+        'place_of_worship': 'religious',
+        'theatre': 'cultural', 'arts_centre': 'cultural', 'library': 'cultural',
+        'hospital': 'hospital', 'clinic': 'hospital', 'doctors': 'hospital', 'pharmacy': 'hospital',
+        'bus_station': 'transport', 'taxi': 'transport', 'ferry_terminal': 'transport',
+    },
+    'shop': {
+        'supermarket': 'market', 'convenience': 'market', 'mall': 'market', 'greengrocer': 'market',
+    },
+    'tourism': {
+        'hotel': 'hotel', 'hostel': 'hotel', 'guest_house': 'hotel', 'motel': 'hotel', 'apartment': 'hotel',
+        'museum': 'cultural', 'gallery': 'cultural', 'attraction': 'cultural', 'viewpoint': 'cultural',
+    },
+    'historic': {'*': 'cultural'},
+    'railway': {'station': 'transport', 'halt': 'transport'},
+    'public_transport': {'station': 'transport'},
+    'aeroway': {'aerodrome': 'transport', 'terminal': 'transport'},
+}
+
+# Weight of a prefix match relative to a whole-token match
+PREFIX_WEIGHT = 0.6
+MIN_PREFIX_LENGTH = 2
+# Text scores are sums of 1 and PREFIX_WEIGHT, so unequal ones differ by at least 0.2;
+# proximity stays below that and only orders POIs with equal text scores
+DISTANCE_WEIGHT = 0.15
+DISTANCE_SCALE_M = 2000
+# Radius below which the grid is cheaper than measuring every text hit
+GRID_RADIUS_M = 5000
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def normalize_text(text):
+    """Casefold and strip accents so 'Café' and 'cafe' compare equal"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(normalize_text(text))
+
+
+def classify_osm_tags(tags):
+    """Map OSM tags to (category, kind), or None if the feature isn't a POI"""
+    for key, values in OSM_CATEGORIES.items():
+        value = tags.get(key)
+        if not value:
+            continue
+        category = values.get(value) or values.get('*')
+        if category:
+            return category, value
+    for key in ('amenity', 'shop', 'tourism', 'leisure'):
+        if tags.get(key):
+            return '', tags[key]
+    return None
+
+
+def _pack_strings(values):
+    """Store strings as one UTF-8 blob plus an offsets array"""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(blob, offsets):
+    data = blob.tobytes()
+    return [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+
+def build_poi_arrays(pois):
+    """Build the array-backed index from an iterable of POI dicts
+
+    Each POI needs name, lat and lng; category, kind and address are optional.
+    """
+    rows = [
+        poi for poi in pois
+        if poi.get('name') and poi.get('lat') is not None and poi.get('lng') is not None
+    ]
+    lats = np.array([float(poi['lat']) for poi in rows], dtype=np.float64)
+    lngs = np.array([float(poi['lng']) for poi in rows], dtype=np.float64)
+
+    # Store POIs in grid order so spatial neighbours are contiguous on disk
+    order = GridIndex(lats, lngs).order if rows else np.empty(0, dtype=np.int64)
+    rows = [rows[i] for i in order]
+
+    postings = {}
+    for poi_id, poi in enumerate(rows):
+        category = poi.get('category') or ''
+        for token in set(tokenize(f"{poi['name']} {poi.get('kind', '')} {category}")):
+            postings.setdefault(token, []).append(poi_id)
+
+    tokens = sorted(postings)
+    token_offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+    np.cumsum([len(postings[token]) for token in tokens], out=token_offsets[1:])
+    posting_ids = np.fromiter(
+        (poi_id for token in tokens for poi_id in postings[token]),
+        dtype=np.int32, count=int(token_offsets[-1]),
+    )
+
+    names, name_offsets = _pack_strings([poi['name'] for poi in rows])
+    addresses, address_offsets = _pack_strings([poi.get('address') or '' for poi in rows])
+    kinds, kind_offsets = _pack_strings([poi.get('kind') or '' for poi in rows])
+    token_blob, token_blob_offsets = _pack_strings(tokens)
+
+    return {
+        'lat': lats[order].astype(np.float32),
+        'lng': lngs[order].astype(np.float32),
+        'category': np.array(
+            [CATEGORIES.index(poi.get('category') or '') for poi in rows], dtype=np.uint8
+        ),
+        'names': names, 'name_offsets': name_offsets,
+        'addresses': addresses, 'address_offsets': address_offsets,
+        'kinds': kinds, 'kind_offsets': kind_offsets,
+        'tokens': token_blob, 'token_offsets_blob': token_blob_offsets,
+        'posting_offsets': token_offsets, 'postings': posting_ids,
+    }
+
+
+def save_poi_index(pois, path=None):
+    path = path or settings.POI_INDEX_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    arrays = build_poi_arrays(pois)
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+    return len(arrays['lat'])
+
+
+class PoiIndex:
+    """In-memory POI search over the arrays written by save_poi_index"""
+
+    def __init__(self, arrays, version=0):
+        self.version = version
+        self.lat = arrays['lat']
+        self.lng = arrays['lng']
+        self.category = arrays['category']
+        self._names = (arrays['names'].tobytes(), arrays['name_offsets'])
+        self._addresses = (arrays['addresses'].tobytes(), arrays['address_offsets'])
+        self._kinds = (arrays['kinds'].tobytes(), arrays['kind_offsets'])
+        self.tokens = _unpack_strings(arrays['tokens'], arrays['token_offsets_blob'])
+        self.posting_offsets = arrays['posting_offsets']
+        self.postings = arrays['postings']
+        self.grid = GridIndex(self.lat, self.lng)
+        self._category_ids = {}
+
+    @classmethod
+    def load(cls, path, version=0):
+        with np.load(path) as data:
+            return cls({key: data[key] for key in data.files}, version=version)
+
+    def __len__(self):
+        return len(self.lat)
+
+    @staticmethod
+    def _string(packed, i):
+        blob, offsets = packed
+        return blob[offsets[i]:offsets[i + 1]].decode('utf-8')
+
+    def _token_postings(self, start, end):
+        return self.postings[self.posting_offsets[start]:self.posting_offsets[end]]
+
+    def text_scores(self, query):
+        """(POI ids, scores) of the POIs matching any term: 1 per exact token hit, PREFIX_WEIGHT per prefix hit
+
+        Built from the posting lists alone, so a query costs what its terms match.
+        """
+        ids = []
+        scores = []
+        for term in set(tokenize(query)):
+            start = bisect.bisect_left(self.tokens, term)
+            exact = np.empty(0, dtype=self.postings.dtype)
+            if start < len(self.tokens) and self.tokens[start] == term:
+                exact = np.unique(self._token_postings(start, start + 1))
+            prefixed = exact
+            if len(term) >= MIN_PREFIX_LENGTH:
+                end = bisect.bisect_left(self.tokens, term + '\uffff', lo=start)
+                prefixed = np.unique(self._token_postings(start, end))
+            ids.append(prefixed)
+            scores.append(np.where(np.isin(prefixed, exact, assume_unique=True), 1.0, PREFIX_WEIGHT))
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        matched, inverse = np.unique(np.concatenate(ids), return_inverse=True)
+        return matched, np.bincount(inverse, weights=np.concatenate(scores))
+
+    def category_ids(self, category):
+        """Indices of the POIs in a category, computed once per category"""
+        ids = self._category_ids.get(category)
+        if ids is None:
+            ids = np.flatnonzero(self.category == CATEGORIES.index(category))
+            self._category_ids[category] = ids
+        return ids
+
+    def nearest(self, lat, lng, category, k, candidates=None):
+        """Indices and distances of the k POIs of a category closest to lat/lng"""
+        ids = self.category_ids(category) if candidates is None else candidates
+        distances = haversine_many(lat, lng, self.lat[ids], self.lng[ids])
+        if len(ids) > k:
+            top = np.argpartition(distances, k)[:k]
+        else:
+            top = np.arange(len(ids))
+        top = top[np.argsort(distances[top], kind='stable')]
+        return ids[top], distances[top]
+
+    def nearest_candidates(self, lat, lng, category, k, slack_m):
+        """POIs of a category that can be among the k nearest of any point within slack_m of lat/lng"""
+        ids = self.category_ids(category)
+        if len(ids) <= k:
+            return ids
+        distances = haversine_many(lat, lng, self.lat[ids], self.lng[ids])
+        kth = np.partition(distances, k - 1)[k - 1]
+        # Moving slack_m away can bring a POI at most slack_m closer (and the kth one slack_m further)
+        return ids[distances <= kth + 2 * slack_m]
+
+    def place(self, i, distance=None):
+        result = {
+            'name': self._string(self._names, i),
+            'address': self._string(self._addresses, i),
+            'lat': float(self.lat[i]),
+            'lng': float(self.lng[i]),
+            'category': CATEGORIES[self.category[i]],
+            'type': self._string(self._kinds, i),
+        }
+        if distance is not None:
+            result['distance_m'] = round(float(distance))
+            result['distance'] = format_distance(distance)
+        return result
+
+    def search(self, query, lat=None, lng=None, radius_m=None, limit=10):
+        """Rank POIs matching query by text score, then by distance to lat/lng"""
+        ids, rank = self.text_scores(query)
+        if not len(ids):
+            return []
+
+        distances = None
+        if lat is not None and lng is not None:
+            if radius_m and radius_m <= GRID_RADIUS_M and len(ids) > len(self) // 20:
+                # Broad prefixes hit a large share of the index; let the grid cut them down
+                keep = np.zeros(len(self), dtype=bool)
+                keep[self.grid.within(lat, lng, radius_m)[0]] = True
+                ids, rank = ids[keep[ids]], rank[keep[ids]]
+            distances = haversine_many(lat, lng, self.lat[ids], self.lng[ids])
+            if radius_m:
+                inside = distances <= radius_m
+                ids, rank, distances = ids[inside], rank[inside], distances[inside]
+            rank += DISTANCE_WEIGHT / (1 + distances / DISTANCE_SCALE_M)
+
+        if len(ids) > limit:
+            top = np.argpartition(-rank, limit)[:limit]
+        else:
+            top = np.arange(len(ids))
+        top = top[np.argsort(-rank[top], kind='stable')]
+
+        return [
+            self.place(int(ids[i]), None if distances is None else distances[i])
+            for i in top
+        ]
+
+
+_index = None
+_index_mtime = None
+
+
+def get_poi_index():
+    """Return the loaded POI index, reloading it when the file changes"""
+    global _index, _index_mtime
+
+    path = settings.POI_INDEX_PATH
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+
+    if _index is None or mtime != _index_mtime:
+        _index = PoiIndex.load(path, version=int(mtime))
+        _index_mtime = mtime
+    return _index
+
+
+def read_csv_pois(path):
+    """Yield POIs from a CSV with name, lat/latitude, lng/lon/longitude columns"""
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            lat = row.get('lat') or row.get('latitude')
+            lng = row.get('lng') or row.get('lon') or row.get('longitude')
+            if not lat or not lng:
+                continue
+            category = (row.get('category') or '').strip().lower()
+            yield {
+                'name': (row.get('name') or '').strip(),
+                'lat': lat,
+                'lng': lng,
+                'category': category if category in CATEGORIES else '',
+                'kind': (row.get('type') or row.get('kind') or category).strip(),
+                'address': (row.get('address') or '').strip(),
+            }
+
+
+def _osm_poi(tags, lat, lng):
+    classified = classify_osm_tags(tags)
+    if not classified or not tags.get('name'):
+        return None
+    category, kind = classified
+    address = ' '.join(filter(None, [tags.get('addr:housenumber'), tags.get('addr:street')]))
+    return {
+        'name': tags['name'], 'lat': lat, 'lng': lng,
+        'category': category, 'kind': kind, 'address': address,
+    }
+
+
+def read_geojson_pois(path):
+    """Yield POIs from Point features of a GeoJSON FeatureCollection"""
+    with open(path, encoding='utf-8') as f:
+        collection = json.load(f)
+
+    for feature in collection.get('features', []):
+        geometry = feature.get('geometry') or {}
+        if geometry.get('type') != 'Point':
+            continue
+        lng, lat = geometry['coordinates'][:2]
+        properties = feature.get('properties') or {}
+        poi = _osm_poi(properties, lat, lng)
+        if poi is None:
+            category = properties.get('category') or ''
+            poi = {
+                'name': properties.get('name'), 'lat': lat, 'lng': lng,
+                'category': category if category in CATEGORIES else '',
+                'kind': properties.get('type') or category,
+                'address': properties.get('address', ''),
+            }
+        yield poi
+
+
+def read_osm_xml_pois(path):
+    """Yield POIs from tagged nodes of an .osm XML extract"""
+    import xml.etree.ElementTree as ET
+
+    for _, element in ET.iterparse(path, events=('end',)):
+        if element.tag == 'node':
+            tags = {tag.get('k'): tag.get('v') for tag in element.findall('tag')}
+            if tags:
+                poi = _osm_poi(tags, float(element.get('lat')), float(element.get('lon')))
+                if poi:
+                    yield poi
+            element.clear()
+        elif element.tag in ('way', 'relation'):
+            element.clear()
+
+
+def read_osm_pbf_pois(path):
+    """Yield POIs from tagged nodes of an .osm.pbf extract (requires pyosmium)"""
+    import osmium
+
+    for obj in osmium.FileProcessor(path, osmium.osm.NODE):
+        if obj.tags:
+            poi = _osm_poi(dict(obj.tags), obj.location.lat, obj.location.lon)
+            if poi:
+                yield poi
+
+
+def read_pois(path):
+    """Pick a reader from the file extension"""
+    lowered = path.lower()
+    if lowered.endswith('.csv'):
+        return read_csv_pois(path)
+    if lowered.endswith(('.geojson', '.json')):
+        return read_geojson_pois(path)
+    if lowered.endswith('.osm'):
+        return read_osm_xml_pois(path)
+    if lowered.endswith('.pbf'):
+        return read_osm_pbf_pois(path)
+    raise ValueError(f"Unsupported POI file: {path}")
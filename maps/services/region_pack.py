@@ -0,0 +1,298 @@
+import hashlib
+import json
+import math
+import os
+import shutil
+import sqlite3
+import tempfile
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .geo import MAX_LATITUDE, box_around
+from .poi_index import get_poi_index
+
+# MBTiles 1.3 layout plus the pack's own place tables
+PACK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS tiles (
+    zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB
+);
+CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (zoom_level, tile_column, tile_row);
+CREATE TABLE IF NOT EXISTS tile_versions (
+    zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, version TEXT,
+    PRIMARY KEY (zoom_level, tile_column, tile_row)
+);
+CREATE TABLE IF NOT EXISTS pois (
+    name TEXT, address TEXT, category TEXT, type TEXT, lat REAL, lng REAL
+);
+CREATE INDEX IF NOT EXISTS pois_location ON pois (lat, lng);
+CREATE TABLE IF NOT EXISTS destinations (
+    id INTEGER PRIMARY KEY, name TEXT, address TEXT, category TEXT, lat REAL, lng REAL, visited INTEGER
+);
+"""
+
+class TileSource:
+    """Where pack tiles come from; OFFLINE_TILE_SOURCE names the class to use"""
+
+    format = 'png'
+
+    def tile_version(self, zoom, x, y):
+        """Token that changes whenever the tile does, or None if the tile doesn't exist"""
+        raise NotImplementedError
+
+    def read_tile(self, zoom, x, y):
+        raise NotImplementedError
+
+
+class DirectoryTileSource(TileSource):
+    """Tiles exported as {OFFLINE_TILE_DIR}/{z}/{x}/{y}.png"""
+
+    def __init__(self, root=None, format='png'):
+        self.root = str(root or settings.OFFLINE_TILE_DIR)
+        self.format = format
+
+    def _path(self, zoom, x, y):
+        return os.path.join(self.root, str(zoom), str(x), f"{y}.{self.format}")
+
+    def tile_version(self, zoom, x, y):
+        try:
+            stat = os.stat(self._path(zoom, x, y))
+        except OSError:
+            return None
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def read_tile(self, zoom, x, y):
+        with open(self._path(zoom, x, y), 'rb') as f:
+            return f.read()
+
+
+def get_tile_source():
+    return import_string(settings.OFFLINE_TILE_SOURCE)()
+
+
+def tile_xy(lat, lng, zoom):
+    """XYZ tile containing a coordinate"""
+    n = 2 ** zoom
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    x = int((lng + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_in_box(south, west, north, east, min_zoom, max_zoom):
+    """Yield (zoom, x, y) XYZ tiles covering a bounding box"""
+    for zoom in range(min_zoom, max_zoom + 1):
+        first_x, first_y = tile_xy(north, west, zoom)
+        last_x, last_y = tile_xy(south, east, zoom)
+        for x in range(first_x, last_x + 1):
+            for y in range(first_y, last_y + 1):
+                yield zoom, x, y
+
+
+def region_pack_path(travel):
+    return os.path.join(str(settings.OFFLINE_PACK_DIR), f"travel-{travel.id}.mbtiles")
+
+
+def travel_region(travel, center=None, radius_m=None):
+    """(south, west, north, east) covering the area around center and the travel's destinations"""
+    radius_m = radius_m or settings.OFFLINE_PACK_RADIUS_M
+    points = list(travel.quickdestination_set.values_list('latitude', 'longitude'))
+    if center is None:
+        if points:
+            center = (sum(lat for lat, _ in points) / len(points), sum(lng for _, lng in points) / len(points))
+        elif travel.destination and travel.destination.latitude is not None:
+            # No places added yet: the geocoded city itself
+            center = (travel.destination.latitude, travel.destination.longitude)
+        else:
+            raise ValueError(f"Cannot locate {travel.city}: give a center or add destinations to the travel")
+
+    south, west, north, east = box_around(center[0], center[1], radius_m)
+    for lat, lng in points:
+        south, north = min(south, lat), max(north, lat)
+        west, east = min(west, lng), max(east, lng)
+    return south, west, north, east
+
+
+def _destination_rows(travel):
+    return list(
+        travel.quickdestination_set.order_by('id')
+        .values_list('id', 'name', 'address', 'category', 'latitude', 'longitude', 'visited')
+    )
+
+
+def content_version(travel):
+    """Digest of what a pack of the travel is built from, short of the tiles
+
+    Cheap enough to check on each download; tile updates reach packs through
+    the build_region_pack command, which compares every tile.
+    """
+    index = get_poi_index()
+    city = travel.destination
+    content = [
+        index.version if index is not None else None,
+        [city.latitude, city.longitude] if city else None,
+        _destination_rows(travel),
+    ]
+    return hashlib.sha256(json.dumps(content).encode('utf-8')).hexdigest()
+
+
+def pack_content_version(path):
+    """content_version recorded in an existing pack, or None"""
+    if not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        row = conn.execute("SELECT value FROM metadata WHERE name = 'content_version'").fetchone()
+    except sqlite3.DatabaseError:
+        return None
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+def _read_pack_state(path):
+    """Metadata and tile versions of an existing pack, or empty state"""
+    if not os.path.exists(path):
+        return {}, {}
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        metadata = dict(conn.execute('SELECT name, value FROM metadata'))
+        versions = {
+            (zoom, x, row): version
+            for zoom, x, row, version in conn.execute(
+                'SELECT zoom_level, tile_column, tile_row, version FROM tile_versions'
+            )
+        }
+    finally:
+        conn.close()
+    return metadata, versions
+
+
+def _poi_rows(index, south, west, north, east):
+    candidates = index.grid.candidates_in_box(south, west, north, east)
+    lats = index.lat[candidates]
+    lngs = index.lng[candidates]
+    inside = (lats >= south) & (lats <= north) & (lngs >= west) & (lngs <= east)
+    for i in sorted(candidates[inside].tolist()):
+        place = index.place(i)
+        yield place['name'], place['address'], place['category'], place['type'], place['lat'], place['lng']
+
+
+def build_region_pack(travel, center=None, radius_m=None, min_zoom=None, max_zoom=None, source=None):
+    """Create or refresh a travel's offline pack, rewriting only what changed"""
+    min_zoom = settings.OFFLINE_PACK_MIN_ZOOM if min_zoom is None else min_zoom
+    max_zoom = settings.OFFLINE_PACK_MAX_ZOOM if max_zoom is None else max_zoom
+    source = source or get_tile_source()
+    path = region_pack_path(travel)
+    metadata, stored_versions = _read_pack_state(path)
+
+    # Keep the area stable between refreshes unless a new center is given
+    if center is None and metadata.get('center'):
+        lng, lat, _ = metadata['center'].split(',')
+        center = (float(lat), float(lng))
+    south, west, north, east = travel_region(travel, center, radius_m)
+    if center is None:
+        center = ((south + north) / 2, (west + east) / 2)
+
+    # Plan: compare what the pack should hold with what it holds
+    wanted = {}
+    for zoom, x, y in tiles_in_box(south, west, north, east, min_zoom, max_zoom):
+        if len(wanted) >= settings.OFFLINE_PACK_MAX_TILES:
+            raise ValueError(f"Region needs more than {settings.OFFLINE_PACK_MAX_TILES} tiles; "
+                             f"reduce the radius or max zoom")
+        version = source.tile_version(zoom, x, y)
+        if version is not None:
+            # MBTiles rows count from the south (TMS)
+            wanted[(zoom, x, 2 ** zoom - 1 - y)] = (version, y)
+    changed_tiles = [key for key, (version, _) in wanted.items() if stored_versions.get(key) != version]
+    removed_tiles = [key for key in stored_versions if key not in wanted]
+
+    index = get_poi_index()
+    bounds = f"{west:.6f},{south:.6f},{east:.6f},{north:.6f}"
+    poi_source = f"{index.version if index is not None else 'none'}:{bounds}"
+
+    destinations = _destination_rows(travel)
+    destinations_digest = hashlib.sha256(json.dumps(destinations).encode('utf-8')).hexdigest()
+
+    new_metadata = {
+        'name': f"{travel.city}, {travel.country}",
+        'format': source.format,
+        'type': 'baselayer',
+        'bounds': bounds,
+        'center': f"{center[1]:.6f},{center[0]:.6f},{max_zoom}",
+        'minzoom': str(min_zoom),
+        'maxzoom': str(max_zoom),
+        'travel_id': str(travel.id),
+        'poi_source': poi_source,
+        'destinations_digest': destinations_digest,
+        'content_version': content_version(travel),
+    }
+    refresh_pois = metadata.get('poi_source') != poi_source
+    refresh_destinations = metadata.get('destinations_digest') != destinations_digest
+    changed = (
+        changed_tiles or removed_tiles or refresh_pois or refresh_destinations
+        or any(metadata.get(key) != value for key, value in new_metadata.items())
+    )
+
+    report = {
+        'path': path,
+        'version': int(metadata.get('version', 0)),
+        'changed': bool(changed),
+        'tiles': len(wanted),
+        'tiles_written': len(changed_tiles),
+        'tiles_removed': len(removed_tiles),
+        'pois': None,
+        'destinations': len(destinations),
+    }
+    if not changed:
+        return report
+
+    # Apply: work on a copy so downloads in progress keep reading a consistent file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        if os.path.exists(path):
+            shutil.copyfile(path, tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.executescript(PACK_SCHEMA)
+            with conn:
+                for zoom, x, row in removed_tiles:
+                    conn.execute('DELETE FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?',
+                                 (zoom, x, row))
+                    conn.execute('DELETE FROM tile_versions WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?',
+                                 (zoom, x, row))
+                for zoom, x, row in changed_tiles:
+                    version, y = wanted[(zoom, x, row)]
+                    conn.execute('INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)',
+                                 (zoom, x, row, source.read_tile(zoom, x, y)))
+                    conn.execute('INSERT OR REPLACE INTO tile_versions VALUES (?, ?, ?, ?)',
+                                 (zoom, x, row, version))
+
+                if refresh_pois:
+                    conn.execute('DELETE FROM pois')
+                    if index is not None:
+                        conn.executemany('INSERT INTO pois VALUES (?, ?, ?, ?, ?, ?)',
+                                         _poi_rows(index, south, west, north, east))
+                    report['pois'] = conn.execute('SELECT COUNT(*) FROM pois').fetchone()[0]
+
+                if refresh_destinations:
+                    conn.execute('DELETE FROM destinations')
+                    conn.executemany('INSERT INTO destinations VALUES (?, ?, ?, ?, ?, ?, ?)', destinations)
+
+                report['version'] += 1
+                new_metadata['version'] = str(report['version'])
+                new_metadata['built_at'] = timezone.now().isoformat()
+                conn.executemany('INSERT OR REPLACE INTO metadata VALUES (?, ?)', new_metadata.items())
+
+            if removed_tiles:
+                conn.execute('VACUUM')
+        finally:
+            conn.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return report
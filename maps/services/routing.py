@@ -0,0 +1,525 @@
+import heapq
+import math
+import os
+from array import array
+from collections import Counter
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from .geo import GridIndex, format_distance, format_duration, haversine, haversine_many, initial_bearing
+
+# Driving speeds in km/h by OSM highway class
+ROAD_SPEEDS = {
+    'motorway': 100, 'motorway_link': 60,
+    'trunk': 80, 'trunk_link': 50,
+    'primary': 60, 'primary_link': 40,
+    'secondary': 50, 'secondary_link': 35,
+    'tertiary': 40, 'tertiary_link': 30,
+    'unclassified': 30, 'road': 30,
+    'residential': 25, 'living_street': 10, 'service': 15,
+}
+# Landmarks for the ALT lower bounds, and how many of them each query uses
+LANDMARK_COUNT = 16
+ACTIVE_LANDMARKS = 4
+# Potentials of nodes that cannot reach an endpoint are capped to stay finite
+UNREACHABLE_BOUND = 1e7
+# Furthest a start or end point may be from the road network
+MAX_SNAP_DISTANCE_M = 2000
+ROUTE_CACHE_TIMEOUT = 60 * 60 * 24
+
+COMPASS = ['north', 'northeast', 'east', 'southeast', 'south', 'southwest', 'west', 'northwest']
+
+
+def _way_speed(tags):
+    speed = ROAD_SPEEDS[tags['highway']]
+    maxspeed = (tags.get('maxspeed') or '').split(' ')[0]
+    if maxspeed.isdigit():
+        speed = min(int(maxspeed), max(ROAD_SPEEDS.values()))
+    return speed / 3.6
+
+
+def _way_directions(tags):
+    """Return (forward, backward) traversal flags for a way"""
+    oneway = tags.get('oneway', '')
+    if oneway == '-1':
+        return False, True
+    if oneway in ('yes', 'true', '1') or tags.get('junction') == 'roundabout' or tags['highway'] == 'motorway':
+        return True, False
+    return True, True
+
+
+def build_road_graph(ways):
+    """Build CSR arrays from an iterable of (node_refs, coords, tags) road ways
+
+    Nodes shared between ways and way endpoints become graph nodes; the points
+    between them are kept as per-segment shape geometry.
+    """
+    ways = [way for way in ways if len(way[0]) >= 2]
+    usage = Counter()
+    for refs, _, _ in ways:
+        usage.update(refs)
+        usage[refs[0]] += 1
+        usage[refs[-1]] += 1
+
+    node_ids = {}
+    node_lat, node_lng = [], []
+    names, name_ids = [], {}
+    seg_u, seg_v, seg_length, seg_time, seg_name = [], [], [], [], []
+    shape_offsets, shape_lat, shape_lng = [0], [], []
+    edges = []
+
+    def node(ref, coord):
+        if ref not in node_ids:
+            node_ids[ref] = len(node_lat)
+            node_lat.append(coord[0])
+            node_lng.append(coord[1])
+        return node_ids[ref]
+
+    for refs, coords, tags in ways:
+        speed = _way_speed(tags)
+        forward, backward = _way_directions(tags)
+        name = tags.get('name') or tags.get('ref') or ''
+        if name not in name_ids:
+            name_ids[name] = len(names)
+            names.append(name)
+
+        start = 0
+        length = 0.0
+        for i in range(1, len(refs)):
+            length += haversine(coords[i - 1][0], coords[i - 1][1], coords[i][0], coords[i][1])
+            if usage[refs[i]] < 2 and i < len(refs) - 1:
+                continue
+
+            u = node(refs[start], coords[start])
+            v = node(refs[i], coords[i])
+            seg = len(seg_u)
+            seg_u.append(u)
+            seg_v.append(v)
+            seg_length.append(length)
+            seg_time.append(length / speed)
+            seg_name.append(name_ids[name])
+            for lat, lng in coords[start + 1:i]:
+                shape_lat.append(lat)
+                shape_lng.append(lng)
+            shape_offsets.append(len(shape_lat))
+
+            if forward:
+                edges.append((u, v, seg, 0))
+            if backward:
+                edges.append((v, u, seg, 1))
+            start = i
+            length = 0.0
+
+    node_count = len(node_lat)
+    edge_array = np.array(edges, dtype=np.int64).reshape(-1, 4)
+
+    def csr(key_column):
+        order = np.argsort(edge_array[:, key_column], kind='stable')
+        indptr = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edge_array[:, key_column], minlength=node_count), out=indptr[1:])
+        return order, indptr
+
+    out_order, out_indptr = csr(0)
+    in_order, in_indptr = csr(1)
+    name_blob = '\x00'.join(names).encode('utf-8')
+
+    arrays = {
+        'node_lat': np.array(node_lat, dtype=np.float64),
+        'node_lng': np.array(node_lng, dtype=np.float64),
+        'out_indptr': out_indptr,
+        'out_target': edge_array[out_order, 1].astype(np.int32),
+        'out_segment': edge_array[out_order, 2].astype(np.int32),
+        'out_reverse': edge_array[out_order, 3].astype(np.uint8),
+        'in_indptr': in_indptr,
+        'in_source': edge_array[in_order, 0].astype(np.int32),
+        'in_segment': edge_array[in_order, 2].astype(np.int32),
+        'in_reverse': edge_array[in_order, 3].astype(np.uint8),
+        'seg_u': np.array(seg_u, dtype=np.int32),
+        'seg_v': np.array(seg_v, dtype=np.int32),
+        'seg_length': np.array(seg_length, dtype=np.float64),
+        'seg_time': np.array(seg_time, dtype=np.float64),
+        'seg_name': np.array(seg_name, dtype=np.int32),
+        'shape_offsets': np.array(shape_offsets, dtype=np.int64),
+        'shape_lat': np.array(shape_lat, dtype=np.float64),
+        'shape_lng': np.array(shape_lng, dtype=np.float64),
+        'names': np.frombuffer(name_blob, dtype=np.uint8),
+    }
+    seg_speed = arrays['seg_length'] / np.maximum(arrays['seg_time'], 1e-9)
+    arrays['max_speed'] = np.array(seg_speed.max() if len(seg_speed) else 1.0)
+    arrays.update(build_landmarks(arrays))
+    return arrays
+
+
+def _travel_times_from(source, node_count, indptr, neighbours, segments, seg_time):
+    """Plain Dijkstra over one CSR direction, returning a time for every node"""
+    dist = [math.inf] * node_count
+    dist[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        du, u = heapq.heappop(heap)
+        if du > dist[u]:
+            continue
+        for i in range(indptr[u], indptr[u + 1]):
+            v = neighbours[i]
+            dv = du + seg_time[segments[i]]
+            if dv < dist[v]:
+                dist[v] = dv
+                heapq.heappush(heap, (dv, v))
+    return dist
+
+
+def build_landmarks(arrays, count=LANDMARK_COUNT):
+    """Pick landmarks by farthest-point selection and store times to and from each"""
+    lats, lngs = arrays['node_lat'], arrays['node_lng']
+    node_count = len(lats)
+    count = min(count, node_count)
+
+    chosen = []
+    if count:
+        spread = haversine_many(lats.mean(), lngs.mean(), lats, lngs)
+        while len(chosen) < count:
+            landmark = int(np.argmax(spread))
+            chosen.append(landmark)
+            spread = np.minimum(spread, haversine_many(lats[landmark], lngs[landmark], lats, lngs))
+
+    seg_time = arrays['seg_time'].tolist()
+    outgoing = (arrays['out_indptr'].tolist(), arrays['out_target'].tolist(), arrays['out_segment'].tolist())
+    incoming = (arrays['in_indptr'].tolist(), arrays['in_source'].tolist(), arrays['in_segment'].tolist())
+    times_from = np.empty((count, node_count), dtype=np.float32)
+    times_to = np.empty((count, node_count), dtype=np.float32)
+    for row, landmark in enumerate(chosen):
+        times_from[row] = _travel_times_from(landmark, node_count, *outgoing, seg_time)
+        times_to[row] = _travel_times_from(landmark, node_count, *incoming, seg_time)
+
+    return {
+        'landmarks': np.array(chosen, dtype=np.int32),
+        'landmark_from': times_from,
+        'landmark_to': times_to,
+    }
+
+
+def save_road_graph(ways, path=None):
+    path = path or settings.ROAD_GRAPH_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    arrays = build_road_graph(ways)
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+    return len(arrays['node_lat']), len(arrays['out_target'])
+
+
+def _compact(values, typecode):
+    """Copy a numpy array into an array.array for fast scalar access"""
+    converted = array(typecode)
+    converted.frombytes(np.ascontiguousarray(values, dtype=np.dtype(typecode)).tobytes())
+    return converted
+
+
+class RoadGraph:
+    """Road network in CSR form with bidirectional A* point-to-point queries"""
+
+    def __init__(self, arrays, version=0):
+        self.version = version
+        self.node_lat = _compact(arrays['node_lat'], 'd')
+        self.node_lng = _compact(arrays['node_lng'], 'd')
+        self.out_indptr = _compact(arrays['out_indptr'], 'q')
+        self.out_target = _compact(arrays['out_target'], 'i')
+        self.out_segment = _compact(arrays['out_segment'], 'i')
+        self.out_reverse = _compact(arrays['out_reverse'], 'B')
+        self.in_indptr = _compact(arrays['in_indptr'], 'q')
+        self.in_source = _compact(arrays['in_source'], 'i')
+        self.in_segment = _compact(arrays['in_segment'], 'i')
+        self.in_reverse = _compact(arrays['in_reverse'], 'B')
+        self.seg_u = _compact(arrays['seg_u'], 'i')
+        self.seg_v = _compact(arrays['seg_v'], 'i')
+        self.seg_length = _compact(arrays['seg_length'], 'd')
+        self.seg_time = _compact(arrays['seg_time'], 'd')
+        self.seg_name = _compact(arrays['seg_name'], 'i')
+        self.shape_offsets = _compact(arrays['shape_offsets'], 'q')
+        self.shape_lat = _compact(arrays['shape_lat'], 'd')
+        self.shape_lng = _compact(arrays['shape_lng'], 'd')
+        self.names = arrays['names'].tobytes().decode('utf-8').split('\x00')
+        self.max_speed = float(arrays['max_speed'])
+        self.landmark_from = [_compact(row, 'f') for row in arrays['landmark_from']]
+        self.landmark_to = [_compact(row, 'f') for row in arrays['landmark_to']]
+        self.grid = GridIndex(arrays['node_lat'], arrays['node_lng'])
+
+    @classmethod
+    def load(cls, path, version=0):
+        with np.load(path) as data:
+            return cls({key: data[key] for key in data.files}, version=version)
+
+    def __len__(self):
+        return len(self.node_lat)
+
+    def snap(self, lat, lng):
+        """Nearest graph node to a coordinate, or None if off the network"""
+        node, _ = self.grid.nearest(lat, lng, max_radius_m=MAX_SNAP_DISTANCE_M)
+        return node
+
+    def _active_landmarks(self, source, target):
+        """Landmarks giving the tightest lower bound on the source-target time"""
+        scored = []
+        for times_from, times_to in zip(self.landmark_from, self.landmark_to):
+            ends = (times_from[source], times_to[source], times_from[target], times_to[target])
+            if math.inf in ends:
+                continue
+            bound = max(ends[2] - ends[0], ends[1] - ends[3])
+            scored.append((bound, times_from, times_to) + ends)
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [item[1:] for item in scored[:ACTIVE_LANDMARKS]]
+
+    def shortest_path(self, source, target):
+        """Fastest path as a list of (segment, reversed) pairs, or None
+
+        Bidirectional A* over landmark (ALT) and straight-line lower bounds,
+        using the average potential p(v) = (h(v, t) - h(s, v)) / 2 so reduced
+        costs stay non-negative in both directions.
+        """
+        if source == target:
+            return []
+
+        lat, lng = self.node_lat, self.node_lng
+        speed = self.max_speed
+        landmarks = self._active_landmarks(source, target)
+        potentials = {}
+
+        def potential(v):
+            if v not in potentials:
+                to_target = haversine(lat[v], lng[v], lat[target], lng[target]) / speed
+                from_source = haversine(lat[source], lng[source], lat[v], lng[v]) / speed
+                for times_from, times_to, from_s, to_s, from_t, to_t in landmarks:
+                    from_v = times_from[v]
+                    to_v = times_to[v]
+                    to_target = max(to_target, from_t - from_v, to_v - to_t)
+                    from_source = max(from_source, from_v - from_s, to_s - to_v)
+                potentials[v] = (min(to_target, UNREACHABLE_BOUND) - min(from_source, UNREACHABLE_BOUND)) / 2
+            return potentials[v]
+
+        directions = (
+            # forward: follow outgoing edges from the source
+            ({source: 0.0}, {source: None}, [(potential(source), source)], set(), 1,
+             self.out_indptr, self.out_target, self.out_segment, self.out_reverse),
+            # backward: follow incoming edges from the target
+            ({target: 0.0}, {target: None}, [(-potential(target), target)], set(), -1,
+             self.in_indptr, self.in_source, self.in_segment, self.in_reverse),
+        )
+        seg_time = self.seg_time
+        best = math.inf
+        meeting = None
+
+        while directions[0][2] and directions[1][2]:
+            # Reduced costs share one graph, so the raw keys can be summed directly
+            if directions[0][2][0][0] + directions[1][2][0][0] >= best:
+                break
+
+            side = 0 if len(directions[0][2]) <= len(directions[1][2]) else 1
+            dist, parent, heap, settled, sign, indptr, neighbours, segments, reverses = directions[side]
+            other_dist = directions[1 - side][0]
+
+            _, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled.add(u)
+            du = dist[u]
+
+            for i in range(indptr[u], indptr[u + 1]):
+                v = neighbours[i]
+                seg = segments[i]
+                dv = du + seg_time[seg]
+                if dv < dist.get(v, math.inf):
+                    dist[v] = dv
+                    parent[v] = (u, seg, reverses[i])
+                    heapq.heappush(heap, (dv + sign * potential(v), v))
+                    if v in other_dist and dv + other_dist[v] < best:
+                        best = dv + other_dist[v]
+                        meeting = v
+
+        if meeting is None:
+            return None
+
+        path = []
+        v = meeting
+        while directions[0][1][v] is not None:
+            u, seg, reverse = directions[0][1][v]
+            path.append((seg, reverse))
+            v = u
+        path.reverse()
+
+        v = meeting
+        while directions[1][1][v] is not None:
+            w, seg, reverse = directions[1][1][v]
+            path.append((seg, reverse))
+            v = w
+        return path
+
+    def directions(self, source, target):
+        """Distance, duration, geometry and turn steps between two nodes"""
+        path = self.shortest_path(source, target)
+        if path is None:
+            return None
+
+        points = [(self.node_lat[source], self.node_lng[source])]
+        legs = []
+        total_length = 0.0
+        total_time = 0.0
+        for seg, reverse in path:
+            start, end = self.shape_offsets[seg], self.shape_offsets[seg + 1]
+            shape = list(zip(self.shape_lat[start:end], self.shape_lng[start:end]))
+            if reverse:
+                shape.reverse()
+            end_node = self.seg_u[seg] if reverse else self.seg_v[seg]
+            first = len(points) - 1
+            points.extend(shape)
+            points.append((self.node_lat[end_node], self.node_lng[end_node]))
+
+            # Consecutive segments of the same road form one step
+            name = self.names[self.seg_name[seg]]
+            if legs and legs[-1]['name'] == name:
+                legs[-1]['length'] += self.seg_length[seg]
+                legs[-1]['last'] = len(points) - 1
+            else:
+                legs.append({'name': name, 'length': self.seg_length[seg], 'first': first, 'last': len(points) - 1})
+            total_length += self.seg_length[seg]
+            total_time += self.seg_time[seg]
+
+        return {
+            'distance': format_distance(total_length),
+            'duration': format_duration(total_time),
+            'distance_m': round(total_length),
+            'duration_s': round(total_time),
+            'steps': self._steps(legs, points),
+            'geometry': [[round(lat, 6), round(lng, 6)] for lat, lng in points],
+        }
+
+    @staticmethod
+    def _steps(legs, points):
+        steps = []
+        previous_bearing = None
+        for leg in legs:
+            road = leg['name'] or 'the road'
+            a, b = points[leg['first']], points[leg['first'] + 1]
+            bearing = initial_bearing(a[0], a[1], b[0], b[1])
+            distance = format_distance(leg['length'])
+
+            if previous_bearing is None:
+                compass = COMPASS[int((bearing + 22.5) // 45) % 8]
+                steps.append(f"Head {compass} on {road} for {distance}")
+            else:
+                angle = (bearing - previous_bearing + 540) % 360 - 180
+                side = 'left' if angle < 0 else 'right'
+                if abs(angle) < 20:
+                    steps.append(f"Continue onto {road} for {distance}")
+                elif abs(angle) < 60:
+                    steps.append(f"Turn slight {side} onto {road} for {distance}")
+                elif abs(angle) < 150:
+                    steps.append(f"Turn {side} onto {road} for {distance}")
+                else:
+                    steps.append(f"Make a U-turn onto {road} for {distance}")
+
+            y, z = points[leg['last'] - 1], points[leg['last']]
+            previous_bearing = initial_bearing(y[0], y[1], z[0], z[1])
+
+        steps.append('Arrive at your destination')
+        return steps
+
+
+_graph = None
+_graph_mtime = None
+
+
+def get_road_graph():
+    """Return the loaded road graph, reloading it when the file changes"""
+    global _graph, _graph_mtime
+
+    path = settings.ROAD_GRAPH_PATH
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+
+    if _graph is None or mtime != _graph_mtime:
+        _graph = RoadGraph.load(path, version=int(mtime))
+        _graph_mtime = mtime
+    return _graph
+
+
+def get_route(start_lat, start_lng, end_lat, end_lng):
+    """Directions between two coordinates, cached by snapped endpoints
+
+    Returns None when no road graph is installed, an endpoint is off the
+    network, or the endpoints are not connected.
+    """
+    graph = get_road_graph()
+    if graph is None:
+        return None
+
+    source = graph.snap(start_lat, start_lng)
+    target = graph.snap(end_lat, end_lng)
+    if source is None or target is None:
+        return None
+
+    cache_key = f"route:{graph.version}:{source}:{target}"
+    route = cache.get(cache_key)
+    if route is None:
+        route = graph.directions(source, target)
+        if route is None:
+            return None
+        cache.set(cache_key, route, ROUTE_CACHE_TIMEOUT)
+    return route
+
+
+def read_osm_xml_roads(path):
+    """Yield (node_refs, coords, tags) for road ways in an .osm XML extract"""
+    import xml.etree.ElementTree as ET
+
+    # First pass: road ways and the nodes they reference
+    ways = []
+    needed = set()
+    for _, element in ET.iterparse(path, events=('end',)):
+        if element.tag == 'way':
+            tags = {tag.get('k'): tag.get('v') for tag in element.findall('tag')}
+            if tags.get('highway') in ROAD_SPEEDS:
+                refs = [int(nd.get('ref')) for nd in element.findall('nd')]
+                ways.append((refs, tags))
+                needed.update(refs)
+            element.clear()
+        elif element.tag in ('node', 'relation'):
+            element.clear()
+
+    # Second pass: coordinates of those nodes only
+    coords = {}
+    for _, element in ET.iterparse(path, events=('end',)):
+        if element.tag == 'node':
+            ref = int(element.get('id'))
+            if ref in needed:
+                coords[ref] = (float(element.get('lat')), float(element.get('lon')))
+            element.clear()
+        elif element.tag in ('way', 'relation'):
+            element.clear()
+
+    for refs, tags in ways:
+        refs = [ref for ref in refs if ref in coords]
+        yield refs, [coords[ref] for ref in refs], tags
+
+
+def read_osm_pbf_roads(path):
+    """Yield (node_refs, coords, tags) for road ways in an .osm.pbf extract (requires pyosmium)"""
+    import osmium
+
+    for way in osmium.FileProcessor(path, osmium.osm.WAY).with_locations():
+        tags = dict(way.tags)
+        if tags.get('highway') not in ROAD_SPEEDS:
+            continue
+        nodes = [node for node in way.nodes if node.location.valid()]
+        yield [node.ref for node in nodes], [(node.lat, node.lon) for node in nodes], tags
+
+
+def read_roads(path):
+    """Pick a reader from the file extension"""
+    lowered = path.lower()
+    if lowered.endswith('.osm'):
+        return read_osm_xml_roads(path)
+    if lowered.endswith('.pbf'):
+        return read_osm_pbf_roads(path)
+    raise ValueError(f"Unsupported road network file: {path}")
@@ -0,0 +1,192 @@
+import math
+from datetime import datetime, timezone as dt_timezone
+import numpy as np
+from django.db import transaction
+from maps.models import TrailSegment
+from travels.models import Travel
+from .geo import EARTH_RADIUS_M, haversine
+
+# Coordinates are stored as integers of 1e-5 degrees (about 1.1 m)
+COORD_SCALE = 100000
+# Fixes worse than this are noise
+MAX_ACCURACY_M = 50
+# A fix must move this far from the last kept one, unless MAX_SILENCE_S has passed
+MIN_DISTANCE_M = 5
+MAX_SILENCE_S = 300
+# Douglas-Peucker tolerance applied before storage
+STORE_TOLERANCE_M = 5
+# Start a new segment after a gap this long or once a segment holds this many points
+SEGMENT_GAP_S = 15 * 60
+MAX_SEGMENT_POINTS = 5000
+MAX_BATCH_FIXES = 3600
+
+
+def _write_varint(out, value):
+    # Zigzag so small negative deltas stay small
+    value = value * 2 if value >= 0 else -value * 2 - 1
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_points(points, previous=(0, 0, 0)):
+    """Delta + varint encode (seconds, lat, lng) points, continuing from a previous quantized point"""
+    out = bytearray()
+    prev_t, prev_lat, prev_lng = previous
+    for t, lat, lng in points:
+        qt = int(t)
+        qlat = round(lat * COORD_SCALE)
+        qlng = round(lng * COORD_SCALE)
+        _write_varint(out, qt - prev_t)
+        _write_varint(out, qlat - prev_lat)
+        _write_varint(out, qlng - prev_lng)
+        prev_t, prev_lat, prev_lng = qt, qlat, qlng
+    return bytes(out)
+
+
+def decode_points(data):
+    """Inverse of encode_points: arrays of seconds, latitudes and longitudes"""
+    values = []
+    value = shift = 0
+    for byte in bytes(data):
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append(value >> 1 if not value & 1 else -(value >> 1) - 1)
+        value = shift = 0
+
+    deltas = np.array(values, dtype=np.int64).reshape(-1, 3)
+    absolute = np.cumsum(deltas, axis=0)
+    return absolute[:, 0], absolute[:, 1] / COORD_SCALE, absolute[:, 2] / COORD_SCALE
+
+
+def filter_fixes(fixes, last=None):
+    """Time/distance filter over (seconds, lat, lng, accuracy) fixes sorted by time"""
+    kept = []
+    previous = last
+    for t, lat, lng, accuracy in fixes:
+        if accuracy is not None and accuracy > MAX_ACCURACY_M:
+            continue
+        if previous is not None:
+            if t <= previous[0]:
+                continue
+            moved = haversine(previous[1], previous[2], lat, lng)
+            if moved < MIN_DISTANCE_M and t - previous[0] < MAX_SILENCE_S:
+                continue
+        previous = (t, lat, lng)
+        kept.append(previous)
+    return kept
+
+
+def simplify(lats, lngs, tolerance_m):
+    """Indices of the points Douglas-Peucker keeps at tolerance_m meters"""
+    n = len(lats)
+    if n <= 2:
+        return np.arange(n)
+
+    # Equirectangular projection is accurate enough at trail scale
+    lat0 = math.radians(float(np.mean(lats)))
+    x = np.radians(np.asarray(lngs, dtype=np.float64)) * math.cos(lat0) * EARTH_RADIUS_M
+    y = np.radians(np.asarray(lats, dtype=np.float64)) * EARTH_RADIUS_M
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx = x[end] - x[start]
+        dy = y[end] - y[start]
+        px = x[start + 1:end] - x[start]
+        py = y[start + 1:end] - y[start]
+        length2 = dx * dx + dy * dy
+        # Distance to the segment, not the line, so out-and-back walks survive
+        along = np.clip((px * dx + py * dy) / length2, 0, 1) if length2 else 0
+        distances = np.hypot(px - along * dx, py - along * dy)
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance_m:
+            middle = start + 1 + i
+            keep[middle] = True
+            stack.append((start, middle))
+            stack.append((middle, end))
+    return np.flatnonzero(keep)
+
+
+def to_datetime(seconds):
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+
+
+def _last_segment(travel):
+    """The travel's latest segment, locked; with none yet, the travel row is locked instead"""
+    segments = TrailSegment.objects.select_for_update().filter(travel=travel).order_by('-ended_at')
+    segment = segments.first()
+    if segment is None:
+        # Nothing to lock yet: serialize on the travel so two first batches don't start two segments
+        Travel.objects.select_for_update().filter(id=travel.id).values_list('id', flat=True).first()
+        segment = segments.first()
+    return segment
+
+
+def append_fixes(travel, fixes):
+    """Filter, simplify and store a batch of (seconds, lat, lng, accuracy) fixes
+
+    Batches for the same travel are applied one at a time. Returns the number
+    of the batch's fixes kept in the trail.
+    """
+    fixes = sorted(fixes)[:MAX_BATCH_FIXES]
+    with transaction.atomic():
+        segment = _last_segment(travel)
+
+        stored = None
+        if segment is not None:
+            times, lats, lngs = decode_points(segment.points)
+            start = int(segment.started_at.timestamp())
+            stored = [(start + int(t), lat, lng) for t, lat, lng in zip(times, lats, lngs)]
+
+        fixes = filter_fixes(fixes, last=stored[-1] if stored else None)
+        if not fixes:
+            return 0
+
+        if (segment is None or fixes[0][0] - stored[-1][0] > SEGMENT_GAP_S
+                or segment.point_count >= MAX_SEGMENT_POINTS):
+            segment = TrailSegment(travel=travel, started_at=to_datetime(fixes[0][0]))
+            stored = []
+
+        # Let the last stored point go if it only survived as the end of the previous batch
+        anchor = stored[-2:]
+        combined = anchor + fixes
+        keep = simplify([p[1] for p in combined], [p[2] for p in combined], STORE_TOLERANCE_M)
+        points = stored[:len(stored) - len(anchor)] + [combined[i] for i in keep]
+
+        start = int(segment.started_at.timestamp())
+        segment.points = encode_points([(t - start, lat, lng) for t, lat, lng in points])
+        segment.point_count = len(points)
+        segment.ended_at = to_datetime(points[-1][0])
+        segment.save()
+    # Not len(points) - len(stored): dropping the anchor would take one off
+    return int(np.count_nonzero(keep >= len(anchor)))
+
+
+def trail_segments(travel, tolerance_m=None, since=None):
+    """A travel's trail as lists of (lat, lng, seconds) points per segment, simplified to tolerance_m"""
+    segments = TrailSegment.objects.filter(travel=travel).order_by('started_at')
+    if since is not None:
+        segments = segments.filter(ended_at__gte=to_datetime(since))
+
+    result = []
+    for segment in segments:
+        times, lats, lngs = decode_points(segment.points)
+        if tolerance_m and tolerance_m > STORE_TOLERANCE_M:
+            keep = simplify(lats, lngs, tolerance_m)
+            times, lats, lngs = times[keep], lats[keep], lngs[keep]
+        start = int(segment.started_at.timestamp())
+        result.append({
+            'started_at': segment.started_at.isoformat(),
+            'ended_at': segment.ended_at.isoformat(),
+            'points': [[round(float(lat), 5), round(float(lng), 5), start + int(t)]
+                       for t, lat, lng in zip(times, lats, lngs)],
+        })
+    return result
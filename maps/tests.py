@@ -0,0 +1,99 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from travels.models import Travel
+from .models import SavedPlace, SearchHistory, TrailSegment
+from .services.clusters import MAX_CLUSTER_ZOOM, clusters_in_box
+from .services.trail import append_fixes, trail_segments
+
+User = get_user_model()
+
+
+@override_settings(WRITE_BEHIND=False)
+class SearchPlacesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher', password='p')
+        self.client.force_login(self.user)
+
+    def _search(self, **data):
+        return self.client.post(reverse('search_places'), data, content_type='application/json')
+
+    def test_missing_or_blank_query_is_rejected(self):
+        for data in ({}, {'query': None}, {'query': '  '}):
+            with self.subTest(data=data):
+                self.assertEqual(self._search(**data).status_code, 400)
+        self.assertFalse(SearchHistory.objects.exists())
+
+    def test_non_string_query_is_rejected(self):
+        for query in (42, ['market'], {'name': 'market'}):
+            with self.subTest(query=query):
+                self.assertEqual(self._search(query=query).status_code, 400)
+        self.assertFalse(SearchHistory.objects.exists())
+
+    def test_query_is_recorded(self):
+        response = self._search(query='market', lat=6.13, lng=1.22)
+        self.assertEqual(response.json()['status'], 'success')
+        self.assertEqual(SearchHistory.objects.get(user=self.user).query, 'market')
+
+
+class NearbyPlacesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='walker', password='p')
+        self.client.force_login(self.user)
+        SavedPlace.objects.create(user=self.user, name='Market', latitude=6.13, longitude=1.22)
+
+    def test_limit_is_at_least_one(self):
+        for limit in (0, -5):
+            with self.subTest(limit=limit):
+                response = self.client.get(reverse('nearby_places'), {'lat': 6.13, 'lng': 1.22, 'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()['saved_places']), 1)
+
+
+class TrailTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='hiker', password='p')
+        self.travel = Travel.objects.create(
+            user=user, name='Walk', country='Togo', city='Lome', travel_type='vacation',
+            start_date=timezone.now().date(), residence='Hotel',
+        )
+
+    def test_fix_replacing_the_anchor_counts_as_kept(self):
+        # Due north in 100 m steps (about 0.0009 degrees)
+        self.assertEqual(append_fixes(self.travel, [(1000, 6.1300, 1.22, 5), (1060, 6.1309, 1.22, 5)]), 2)
+        # In line with the last two: the previous end point goes, the new fix stays
+        self.assertEqual(append_fixes(self.travel, [(1120, 6.1318, 1.22, 5)]), 1)
+        segment = TrailSegment.objects.get(travel=self.travel)
+        self.assertEqual(segment.point_count, 2)
+        self.assertEqual(trail_segments(self.travel)[0]['points'][-1], [6.1318, 1.22, 1120])
+
+
+# Levels cached by an earlier run for the same user id would be read back
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ClusterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='collector', password='p')
+
+    def _places(self):
+        clusters, places = clusters_in_box(self.user.id, MAX_CLUSTER_ZOOM, -90, -180, 90, 180)
+        return sum(cluster['count'] for cluster in clusters) + len(places)
+
+    def _save(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return SavedPlace.objects.create(user=self.user, name='Place', **fields)
+
+    def test_levels_follow_creates_edits_and_deletes(self):
+        place = self._save(latitude=6.13, longitude=1.22)
+        self._save(latitude=48.85, longitude=2.35)
+        self.assertEqual(self._places(), 2)
+
+        place.latitude, place.longitude = 40.71, -74.0
+        with self.captureOnCommitCallbacks(execute=True):
+            place.save()
+        _, places = clusters_in_box(self.user.id, MAX_CLUSTER_ZOOM, 40, -75, 41, -73)
+        self.assertEqual([p['id'] for p in places], [place.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            place.delete()
+        self.assertEqual(self._places(), 1)
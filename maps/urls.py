@@ -4,6 +4,11 @@ from . import views
 urlpatterns = [
     path('', views.map_view, name='map'),
     path('search/', views.search_places, name='search_places'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
     path('save/', views.save_place, name='save_place'),
     path('directions/', views.get_directions, name='get_directions'),
+    path('nearby/', views.nearby_places, name='nearby_places'),
+    path('clusters/', views.place_clusters, name='place_clusters'),
+    path('trail/', views.travel_trail, name='travel_trail'),
+    path('packs/<int:travel_id>/', views.download_region_pack, name='download_region_pack'),
 ]
\ No newline at end of file
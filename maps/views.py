@@ -1,19 +1,33 @@
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import JsonResponse, FileResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
 import json
+import os
+import re
 import requests
 from .models import SearchHistory, SavedPlace
+from safe_traveller.writebehind import enqueue
+from travels.models import Travel, QuickDestination
+from .services import nearby
+from .services.autocomplete import get_autocomplete_index
+from .services.clusters import MAX_CLUSTER_ZOOM, clusters_in_box
+from .services.poi_index import get_poi_index
+from .services.routing import get_route
+from .services.region_pack import build_region_pack, content_version, pack_content_version, region_pack_path
+from .services.trail import MAX_BATCH_FIXES, append_fixes, trail_segments
+
+RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)')
+PACK_CHUNK_SIZE = 64 * 1024
 
 @login_required
 def map_view(request):
     recent_searches = SearchHistory.objects.filter(user=request.user)[:5]
-    saved_places = SavedPlace.objects.filter(user=request.user)
     
+    # Saved places are fetched per viewport from map/clusters/
     context = {
         'recent_searches': recent_searches,
-        'saved_places': saved_places,
     }
     return render(request, 'maps/map.html', context)
 
@@ -25,35 +39,39 @@ def search_places(request):
         query = data.get('query')
         lat = data.get('lat')
         lng = data.get('lng')
+        try:
+            # Stored in SearchHistory.query: a non-empty string of at most 200 characters
+            if not isinstance(query, str) or not query.strip() or len(query) > 200:
+                raise ValueError(query)
+            has_location = lat is not None and lng is not None
+            if has_location:
+                lat, lng = float(lat), float(lng)
+            radius = float(data.get('radius') or settings.POI_SEARCH_RADIUS_M)
+            limit = min(max(int(data.get('limit', 10)), 1), 50)
+            if radius <= 0:
+                raise ValueError(radius)
+        except (TypeError, ValueError):
+            return JsonResponse({'status': 'error', 'message': 'Invalid query, coordinates, radius or limit'}, status=400)
         
-        # Save search history
-        SearchHistory.objects.create(
+        # Save search history, off the request path
+        enqueue(SearchHistory(
             user=request.user,
             query=query,
             latitude=lat,
             longitude=lng
-        )
+        ))
         
-        # Here you would integrate with a real places API
-        # For now, return mock data
-        places = [
-            {
-                'name': f"Restaurant near {query}",
-                'address': "123 Main Street",
-                'lat': lat + 0.001,
-                'lng': lng + 0.001,
-                'category': 'restaurant',
-                'rating': 4.5
-            },
-            {
-                'name': f"Hotel near {query}",
-                'address': "456 Hotel Avenue",
-                'lat': lat - 0.001,
-                'lng': lng - 0.001,
-                'category': 'hotel',
-                'rating': 4.2
-            }
-        ]
+        # Search the offline POI index, biased towards the user's position
+        places = []
+        index = get_poi_index()
+        if index is not None:
+            places = index.search(
+                query,
+                lat=lat if has_location else None,
+                lng=lng if has_location else None,
+                radius_m=radius,
+                limit=limit,
+            )
         
         return JsonResponse({
             'status': 'success',
@@ -62,6 +80,27 @@ def search_places(request):
     
     return JsonResponse({'status': 'error'})
 
+@login_required
+def autocomplete(request):
+    """Suggestions for the search box from the user's and everyone's past searches"""
+    try:
+        lat = float(request.GET['lat'])
+        lng = float(request.GET['lng'])
+    except (KeyError, ValueError):
+        lat = lng = None
+    
+    suggestions = get_autocomplete_index().suggest(
+        request.user.id,
+        request.GET.get('q', ''),
+        lat=lat,
+        lng=lng,
+    )
+    
+    return JsonResponse({
+        'status': 'success',
+        'suggestions': suggestions
+    })
+
 @csrf_exempt
 @login_required
 def save_place(request):
@@ -95,22 +134,203 @@ def get_directions(request):
         end_lat = data.get('end_lat')
         end_lng = data.get('end_lng')
         
-        # Mock directions response
-        # In production, integrate with Google Directions API or similar
-        directions = {
-            'distance': '2.3 km',
-            'duration': '8 minutes',
-            'steps': [
-                'Head north on Main Street',
-                'Turn right on Broadway',
-                'Continue for 1.5 km',
-                'Destination will be on your left'
-            ]
-        }
+        try:
+            start_lat, start_lng, end_lat, end_lng = (
+                float(value) for value in (start_lat, start_lng, end_lat, end_lng)
+            )
+        except (TypeError, ValueError):
+            return JsonResponse({'status': 'error', 'message': 'Invalid coordinates'})
+        
+        # Route on the offline road graph
+        directions = get_route(start_lat, start_lng, end_lat, end_lng)
+        if directions is None:
+            return JsonResponse({'status': 'error', 'message': 'No route found'})
         
         return JsonResponse({
             'status': 'success',
             'directions': directions
         })
     
-    return JsonResponse({'status': 'error'})
\ No newline at end of file
+    return JsonResponse({'status': 'error'})
+
+@login_required
+def nearby_places(request):
+    """Saved places and trip destinations inside a viewport (bbox) or around a point"""
+    try:
+        limit = min(max(int(request.GET.get('limit', 200)), 1), 500)
+        if request.GET.get('bbox'):
+            south, west, north, east = (float(value) for value in request.GET['bbox'].split(','))
+            query = lambda queryset, fields: nearby.in_box(
+                queryset, south, west, north, east, fields, limit=limit
+            )
+        else:
+            lat = float(request.GET['lat'])
+            lng = float(request.GET['lng'])
+            radius = min(float(request.GET.get('radius', 1000)), 50000)
+            query = lambda queryset, fields: nearby.near(
+                queryset, lat, lng, radius, fields, limit=limit
+            )
+    except (KeyError, TypeError, ValueError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid coordinates'})
+    
+    kinds = request.GET.get('kind', 'saved,destinations').split(',')
+    saved_places = []
+    if 'saved' in kinds:
+        saved_places = query(
+            SavedPlace.objects.filter(user=request.user),
+            ['id', 'name', 'address', 'category', 'notes'],
+        )
+    destinations = []
+    if 'destinations' in kinds:
+        destinations = query(
+            QuickDestination.objects.filter(travel__user=request.user, travel__deleted_at__isnull=True),
+            ['id', 'travel_id', 'name', 'address', 'category', 'visited'],
+        )
+    
+    return JsonResponse({
+        'status': 'success',
+        'saved_places': saved_places,
+        'destinations': destinations
+    })
+
+@login_required
+def place_clusters(request):
+    """Saved places in a viewport, grouped into clusters below MAX_CLUSTER_ZOOM"""
+    try:
+        zoom = int(float(request.GET['zoom']))
+        south, west, north, east = (float(value) for value in request.GET['bbox'].split(','))
+    except (KeyError, TypeError, ValueError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid viewport'})
+    
+    if zoom > MAX_CLUSTER_ZOOM:
+        clusters = []
+        places = nearby.in_box(
+            SavedPlace.objects.filter(user=request.user),
+            south, west, north, east, ['id', 'name'], limit=500,
+        )
+    else:
+        clusters, places = clusters_in_box(request.user.id, zoom, south, west, north, east)
+    
+    return JsonResponse({
+        'status': 'success',
+        'zoom': zoom,
+        'clusters': clusters,
+        'places': places
+    })
+
+
+def _trail_travel(request, travel_id):
+    """The given travel of the user, or their active one"""
+    travels = Travel.objects.filter(user=request.user)
+    if travel_id:
+        return travels.filter(id=int(travel_id)).first()
+    return travels.filter(is_active=True).first()
+
+@csrf_exempt
+@login_required
+def travel_trail(request):
+    """Record batches of GPS fixes (POST) or read back the simplified trail (GET)"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            fixes = [
+                (int(fix['t']) // 1000, float(fix['lat']), float(fix['lng']),
+                 None if fix.get('accuracy') is None else float(fix['accuracy']))
+                for fix in data.get('fixes', [])[:MAX_BATCH_FIXES]
+            ]
+            travel = _trail_travel(request, data.get('travel_id'))
+        except (KeyError, TypeError, ValueError):
+            return JsonResponse({'status': 'error', 'message': 'Invalid fixes'})
+        
+        if travel is None:
+            return JsonResponse({'status': 'error', 'message': 'No active travel'})
+        
+        return JsonResponse({
+            'status': 'success',
+            'received': len(fixes),
+            'stored': append_fixes(travel, fixes)
+        })
+    
+    try:
+        tolerance = float(request.GET.get('tolerance', 10))
+        since = int(request.GET['since']) if request.GET.get('since') else None
+        travel = _trail_travel(request, request.GET.get('travel'))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid parameters'})
+    
+    if travel is None:
+        return JsonResponse({'status': 'error', 'message': 'No active travel'})
+    
+    return JsonResponse({
+        'status': 'success',
+        'travel_id': travel.id,
+        'segments': trail_segments(travel, tolerance, since)
+    })
+
+def _read_file_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(PACK_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+@login_required
+def download_region_pack(request, travel_id):
+    """Offline pack for a travel's city, resumable with HTTP range requests"""
+    travel = get_object_or_404(Travel, id=travel_id, user=request.user)
+    path = region_pack_path(travel)
+    
+    # Rebuilt only when its places changed; ranged requests continue the file they started on
+    if not os.path.exists(path) or (
+        'Range' not in request.headers and pack_content_version(path) != content_version(travel)
+    ):
+        try:
+            build_region_pack(travel)
+        except ValueError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)})
+    
+    stat = os.stat(path)
+    etag = f'"pack-{travel.id}-{stat.st_mtime_ns}-{stat.st_size}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+    
+    size = stat.st_size
+    match = RANGE_RE.fullmatch(request.headers.get('Range', '').strip())
+    if match and request.headers.get('If-Range', etag) != etag:
+        # The pack changed since the client started; send it whole
+        match = None
+    
+    if match and (match.group(1) or match.group(2)):
+        if match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        else:
+            start = max(size - int(match.group(2)), 0)
+            end = size - 1
+        if start >= size or start > end:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{size}"
+            return response
+        response = StreamingHttpResponse(
+            _read_file_range(path, start, end - start + 1),
+            status=206,
+            content_type='application/vnd.sqlite3',
+        )
+        response['Content-Range'] = f"bytes {start}-{end}/{size}"
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        response = FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename=f"travel-{travel.id}.mbtiles",
+            content_type='application/vnd.sqlite3',
+        )
+    
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    return response
@@ -0,0 +1,22 @@
+import asyncio
+import weakref
+import httpx
+
+# Outbound calls from async views (OpenWeather, Gemini, ElevenLabs)
+TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=50)
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    """AsyncClient shared by everything running on the current event loop
+
+    Under uvicorn that is one pooled client per worker. Async views served
+    through WSGI run on short-lived loops and get a client each.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = httpx.AsyncClient(timeout=TIMEOUT, limits=LIMITS)
+    return client
@@ -0,0 +1,127 @@
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, connection, models, transaction
+from sync.replication import REPLICATED
+
+PURGE_BATCH_SIZE = 500
+
+# Models deleted softly: rows with deleted_at set wait for purge_deleted
+SOFT_DELETED = ('travels.Travel', 'users.CustomUser')
+
+
+def _relations(model):
+    # Hidden ones included: the through tables of many-to-many fields point here too
+    return [
+        field for field in model._meta.get_fields(include_hidden=True)
+        if (field.one_to_many or field.one_to_one) and field.auto_created and not field.concrete
+    ]
+
+
+def cascade_plan(model, lookup='pk', seen=()):
+    """What deleting a row of model touches, children first, as (model, lookup of the row's pk, field to null)
+
+    The field is None for rows to delete. Follows CASCADE, SET_NULL and
+    DO_NOTHING relations (the sync log points at users that way).
+    """
+    steps = []
+    for relation in _relations(model):
+        child = relation.related_model
+        child_lookup = f"{relation.field.name}__{lookup}"
+        if relation.on_delete is models.SET_NULL:
+            steps.append((child, child_lookup, relation.field.name))
+        elif relation.on_delete in (models.CASCADE, models.DO_NOTHING):
+            if child not in seen:
+                steps += cascade_plan(child, child_lookup, (*seen, model))
+            steps.append((child, child_lookup, None))
+    return steps
+
+
+def _raw_delete(model, ids):
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(model._meta.db_table)} WHERE {quote(model._meta.pk.column)} "
+            f"IN ({', '.join(['%s'] * len(ids))})",
+            ids,
+        )
+
+
+def _remove_files(model, files):
+    """Delete stored files no remaining row points at; returns how many went"""
+    removed = 0
+    for field, names in files.items():
+        for name in names:
+            # Deduplicated audio is shared between messages
+            if not model._base_manager.filter(**{field.name: name}).exists():
+                field.storage.delete(name)
+                removed += 1
+    return removed
+
+
+def _purge_rows(model, lookup, pk, null_field, batch_size):
+    rows = model._base_manager.filter(**{lookup: pk}).order_by()
+    if null_field:
+        # Nulled rows stop matching, so each batch is the next one
+        while ids := list(rows.values_list('pk', flat=True)[:batch_size]):
+            model._base_manager.filter(pk__in=ids).update(**{null_field: None})
+        return 0, 0
+
+    file_fields = [field for field in model._meta.concrete_fields if isinstance(field, models.FileField)]
+    deleted = removed = 0
+    while True:
+        files = {field: set() for field in file_fields}
+        with transaction.atomic():
+            batch = list(rows.values_list('pk', *[field.attname for field in file_fields])[:batch_size])
+            if not batch:
+                break
+            for row in batch:
+                for field, name in zip(file_fields, row[1:]):
+                    if name:
+                        files[field].add(name)
+            _raw_delete(model, [row[0] for row in batch])
+        deleted += len(batch)
+        # Only once the rows are gone for good
+        removed += _remove_files(model, files)
+    return deleted, removed
+
+
+def purge(model, pk, batch_size=PURGE_BATCH_SIZE):
+    """Delete a row and everything depending on it in short batches, then their files
+
+    Unlike Model.delete(), nothing is loaded into memory and no transaction
+    spans more than one batch; no signals are sent either.
+    """
+    deleted = removed = 0
+    for child, lookup, null_field in [*cascade_plan(model), (model, 'pk', None)]:
+        rows, files = _purge_rows(child, lookup, pk, null_field, batch_size)
+        deleted += rows
+        removed += files
+    return {'rows': deleted, 'files': removed}
+
+
+def purge_deleted(batch_size=PURGE_BATCH_SIZE, limit=None):
+    """Purge soft-deleted objects, oldest first
+
+    With Supabase configured, replicated objects wait until their delete was sent.
+    Returns objects purged per model label, and the rows and files removed with them.
+    """
+    report = {'objects': {}, 'rows': 0, 'files': 0}
+    replicated = {label for label, _ in REPLICATED.values()}
+    for label in SOFT_DELETED:
+        model = apps.get_model(label)
+        pending = model._base_manager.filter(deleted_at__isnull=False).order_by('deleted_at')
+        if settings.SUPABASE_URL and label in replicated:
+            # Not before the delete reached Supabase: the purged row could no longer be sent
+            pending = pending.filter(is_synced=True)
+        report['objects'][label] = 0
+        for pk in pending.values_list('pk', flat=True)[:limit]:
+            try:
+                purged = purge(model, pk, batch_size)
+            except IntegrityError as e:
+                # A row was added under it meanwhile; the next run goes again
+                print(f"Purge error for {label} {pk}: {e}")
+                continue
+            report['objects'][label] += 1
+            report['rows'] += purged['rows']
+            report['files'] += purged['files']
+    return report
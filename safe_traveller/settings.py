@@ -43,12 +43,14 @@ INSTALLED_APPS = [
     'travels',
     'maps',
     'translate',
+    'sync',
+    'search',
 ]
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'safe_traveller.middleware.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,6 +80,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'safe_traveller.wsgi.application'
+ASGI_APPLICATION = 'safe_traveller.asgi.application'
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -120,6 +123,58 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Chat audio retention
+CHAT_AUDIO_TRANSCODE_AFTER_DAYS = int(os.getenv('CHAT_AUDIO_TRANSCODE_AFTER_DAYS', '7'))
+CHAT_AUDIO_RETENTION_DAYS = int(os.getenv('CHAT_AUDIO_RETENTION_DAYS', '90'))
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+
+# Offline map data
+MAP_DATA_DIR = Path(os.getenv('MAP_DATA_DIR', BASE_DIR / 'map_data'))
+POI_INDEX_PATH = str(MAP_DATA_DIR / 'pois.npz')
+POI_SEARCH_RADIUS_M = int(os.getenv('POI_SEARCH_RADIUS_M', '50000'))
+ROAD_GRAPH_PATH = str(MAP_DATA_DIR / 'roads.npz')
+
+# Offline region packs
+OFFLINE_PACK_DIR = MAP_DATA_DIR / 'packs'
+OFFLINE_TILE_SOURCE = os.getenv('OFFLINE_TILE_SOURCE', 'maps.services.region_pack.DirectoryTileSource')
+OFFLINE_TILE_DIR = Path(os.getenv('OFFLINE_TILE_DIR', MAP_DATA_DIR / 'tiles'))
+OFFLINE_PACK_RADIUS_M = int(os.getenv('OFFLINE_PACK_RADIUS_M', '8000'))
+OFFLINE_PACK_MIN_ZOOM = int(os.getenv('OFFLINE_PACK_MIN_ZOOM', '10'))
+OFFLINE_PACK_MAX_ZOOM = int(os.getenv('OFFLINE_PACK_MAX_ZOOM', '16'))
+OFFLINE_PACK_MAX_TILES = int(os.getenv('OFFLINE_PACK_MAX_TILES', '20000'))
+
+# Write-behind buffer for history rows: flushed at this many rows or seconds, journaled meanwhile.
+# Off by default (tests, management commands, local runs insert right away); the web service turns it on.
+WRITE_BEHIND = os.getenv('WRITE_BEHIND', 'False') == 'True'
+WRITE_BEHIND_FLUSH_SIZE = int(os.getenv('WRITE_BEHIND_FLUSH_SIZE', '200'))
+WRITE_BEHIND_FLUSH_SECONDS = float(os.getenv('WRITE_BEHIND_FLUSH_SECONDS', '2'))
+WRITE_BEHIND_JOURNAL_DIR = Path(os.getenv('WRITE_BEHIND_JOURNAL_DIR', BASE_DIR / '.write_behind'))
+
+# Sync log entries younger than this are held back from the app: ids are taken at insert and
+# seen at commit, so an older transaction may still add entries below them. Keep it above the
+# longest transaction that writes to the log.
+SYNC_SETTLE_SECONDS = float(os.getenv('SYNC_SETTLE_SECONDS', '10'))
+
+# Cache: locmem is per process, file (the default) is shared by the processes of one node,
+# redis (needs the redis package) is shared by every node
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'safe-traveller'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / '.cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'file')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.getenv('CACHE_LOCATION', CACHE_BACKENDS[CACHE_BACKEND][1]),
+        'KEY_PREFIX': os.getenv('CACHE_KEY_PREFIX', 'st'),
+    }
+}
+if CACHE_BACKEND != 'redis':
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000'))}
+# Rendered per-user page fragments
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv('FRAGMENT_CACHE_TIMEOUT', str(24 * 3600)))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CORS_ALLOW_ALL_ORIGINS = True
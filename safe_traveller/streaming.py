@@ -0,0 +1,23 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+_DONE = object()
+
+
+async def _drain(iterator):
+    # One thread for every step, so a generator holding a database cursor keeps its connection
+    step = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await step(iterator, _DONE)) is not _DONE:
+        yield chunk
+
+
+def streaming_response(request, chunks, content_type):
+    """StreamingHttpResponse over a sync generator that streams under ASGI as well
+
+    Django reads a sync iterator into memory before sending it to an ASGI server;
+    the async wrapper hands it over one chunk at a time instead.
+    """
+    if isinstance(request, ASGIRequest):
+        chunks = _drain(iter(chunks))
+    return StreamingHttpResponse(chunks, content_type=content_type)
@@ -42,6 +42,8 @@ urlpatterns = [
     path('travels/', include('travels.urls')),
     path('map/', include('maps.urls')),
     path('translate/', include('translate.urls')),
+    path('sync/', include('sync.urls')),
+    path('search/', include('search.urls')),
     path('manifest.json', pwa_manifest, name='pwa_manifest'),
     path('sw.js', SWView.as_view(), name='service-worker'),
 ]
@@ -0,0 +1,257 @@
+import atexit
+import contextlib
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import InterfaceError, OperationalError, close_old_connections, transaction
+from django.dispatch import Signal
+
+try:
+    import fcntl
+except ImportError:
+    # No file locks to tell a dead process's journal from a live one; nothing is recovered
+    fcntl = None
+
+# Sent with the rows of one model once a flush inserted them, ids set, inside its
+# transaction. bulk_create sends no post_save, so counters, the sync log and the
+# search index listen to this as well.
+flushed = Signal()
+
+# Errors meaning the database is out of reach; the rows are kept for the next flush
+UNREACHABLE = (OperationalError, InterfaceError)
+
+
+def _dump(instance):
+    return json.dumps(serializers.serialize('python', [instance])[0], cls=DjangoJSONEncoder)
+
+
+def _load(line):
+    return next(serializers.deserialize('python', [json.loads(line)])).object
+
+
+def _insert(model, rows):
+    with transaction.atomic():
+        rows = model._base_manager.bulk_create(rows)
+        flushed.send(sender=model, rows=rows)
+
+
+def _reject(instance, error):
+    """Keep a row no insert will take, and why, in rows.rejected next to the journals"""
+    # Not saved after all
+    instance.pk = None
+    journal_dir = Path(settings.WRITE_BEHIND_JOURNAL_DIR)
+    journal_dir.mkdir(parents=True, exist_ok=True)
+    line = json.dumps({'error': str(error), 'row': json.loads(_dump(instance))}, cls=DjangoJSONEncoder)
+    # Appends of one short line don't interleave between processes
+    with open(journal_dir / 'rows.rejected', 'a', encoding='utf-8') as f:
+        f.write(line + '\n')
+
+
+def insert(rows):
+    """bulk_create rows, one statement per model, skipping rows an earlier attempt inserted
+
+    A bad row fails its whole batch, so that batch goes again row by row and
+    the bad ones are set aside in rows.rejected. Raises UNREACHABLE errors.
+    """
+    by_model = {}
+    for row in rows:
+        if row.pk is None:
+            by_model.setdefault(type(row), []).append(row)
+    for model, objs in by_model.items():
+        try:
+            _insert(model, objs)
+        except UNREACHABLE:
+            raise
+        except Exception:
+            for obj in objs:
+                # Ids the rolled back batch handed out
+                obj.pk = None
+                try:
+                    _insert(model, [obj])
+                except UNREACHABLE:
+                    raise
+                except Exception as e:
+                    print(f"Write-behind rejected a {model._meta.label} row: {e}")
+                    _reject(obj, e)
+
+
+class WriteBehindBuffer:
+    """New rows queued by this process and inserted in bulk from a background thread
+
+    Every row is appended to a journal file before add() returns, so rows of a
+    process that dies before flushing are inserted by the next buffer to start.
+    Rows are inserted at least once: a crash between a commit and the removal
+    of its journal inserts that batch again.
+    """
+    def __init__(self, journal_dir, flush_size, flush_seconds):
+        self.journal_dir = Path(journal_dir)
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self.name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.rows = []
+        # Batches cut from the journal, not inserted yet: (journal file, rows)
+        self.pending = []
+        self.batches = 0
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = False
+        self.thread = None
+        self.journal = None
+        self.lock_file = None
+
+    def _path(self, suffix):
+        return self.journal_dir / f"{self.name}.{suffix}"
+
+    def start(self):
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        # Held while the process lives; recover() takes the files of buffers whose lock is free
+        self.lock_file = open(self._path('lock'), 'w')
+        if fcntl:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        self.journal = open(self._path('journal'), 'a', encoding='utf-8')
+        self.thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def add(self, instance):
+        line = _dump(instance) + '\n'
+        with self.lock:
+            # Handed to the OS before the request returns: a crashed process loses nothing
+            self.journal.write(line)
+            self.journal.flush()
+            self.rows.append(instance)
+            full = len(self.rows) >= self.flush_size
+        if full:
+            self.wake.set()
+
+    def _cut(self):
+        """Move the queued rows and their journal into a pending batch"""
+        with self.lock:
+            if not self.rows:
+                return
+            self.journal.close()
+            self.batches += 1
+            path = self._path(f"{self.batches}.batch")
+            os.replace(self._path('journal'), path)
+            self.pending.append((path, self.rows))
+            self.rows = []
+            self.journal = open(self._path('journal'), 'a', encoding='utf-8')
+
+    def flush(self):
+        """Insert everything queued so far; returns how many batches are still pending"""
+        with self.flush_lock:
+            self._cut()
+            while self.pending:
+                path, rows = self.pending[0]
+                try:
+                    insert(rows)
+                except UNREACHABLE as e:
+                    print(f"Write-behind flush error: {e}")
+                    break
+                os.remove(path)
+                self.pending.pop(0)
+            return len(self.pending)
+
+    def recover(self):
+        """Adopt the journals of buffers whose process is gone"""
+        if fcntl is None:
+            return
+        for lock_path in self.journal_dir.glob('*.lock'):
+            name = lock_path.name[:-len('.lock')]
+            if name == self.name:
+                continue
+            with open(lock_path, 'a') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # Alive
+                    continue
+                for path in sorted(self.journal_dir.glob(f"{name}.*")):
+                    if path == lock_path:
+                        continue
+                    try:
+                        with open(path, encoding='utf-8') as f:
+                            # A line cut short by the crash is skipped
+                            rows = [_load(line) for line in f if line.endswith('\n')]
+                    except FileNotFoundError:
+                        # Adopted by another process meanwhile
+                        continue
+                    with self.flush_lock:
+                        self.batches += 1
+                        adopted = self._path(f"{self.batches}.batch")
+                        os.replace(path, adopted)
+                        self.pending.append((adopted, rows))
+                # Another process recovering at the same time may have removed it
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(lock_path)
+
+    def _run(self):
+        try:
+            self.recover()
+        except (OSError, ValueError) as e:
+            print(f"Write-behind recovery error: {e}")
+        while not self.stopping:
+            self.wake.wait(self.flush_seconds)
+            self.wake.clear()
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception as e:
+                # The thread must outlive any one flush, or rows pile up in the journal until exit
+                print(f"Write-behind flush error: {e!r}")
+
+    def stop(self):
+        """Flush what is left at shutdown; the journal stays if the database can't be reached"""
+        atexit.unregister(self.stop)
+        self.stopping = True
+        self.wake.set()
+        self.thread.join(timeout=self.flush_seconds + 30)
+        if self.flush() == 0:
+            self.journal.close()
+            os.remove(self._path('journal'))
+            self.lock_file.close()
+            os.remove(self._path('lock'))
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """This process's buffer, started on first use so a forked worker gets its own"""
+    global _buffer
+    if _buffer is None or not _buffer.name.startswith(f"{os.getpid()}-"):
+        with _buffer_lock:
+            if _buffer is None or not _buffer.name.startswith(f"{os.getpid()}-"):
+                buffer = WriteBehindBuffer(
+                    settings.WRITE_BEHIND_JOURNAL_DIR,
+                    settings.WRITE_BEHIND_FLUSH_SIZE,
+                    settings.WRITE_BEHIND_FLUSH_SECONDS,
+                )
+                buffer.start()
+                _buffer = buffer
+    return _buffer
+
+
+def enqueue(instance):
+    """Save a new append-only row off the request path
+
+    The row gets its id, and flushed its receivers, within WRITE_BEHIND_FLUSH_SECONDS.
+    With WRITE_BEHIND off it is inserted right away instead.
+    """
+    if not settings.WRITE_BEHIND:
+        insert([instance])
+        return
+    get_buffer().add(instance)
+
+
+async def aenqueue(instance):
+    """enqueue for async views; with WRITE_BEHIND off the insert runs on the sync thread"""
+    await sync_to_async(enqueue)(instance)
@@ -0,0 +1,52 @@
+from django.urls import reverse
+
+def _texts(value):
+    """Every string inside a JSON value"""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _texts(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _texts(item)
+
+def _join(*parts):
+    return '\n'.join(part for part in parts if part)
+
+def travel_document(travel):
+    return {
+        'title': travel.name,
+        'body': _join(travel.city, travel.country, travel.residence, travel.objectives,
+                      *_texts(travel.advice_data)),
+        'url': reverse('travel_detail', args=[travel.id]),
+    }
+
+def advice_document(advice):
+    return {
+        'title': advice.get_advice_type_display(),
+        'body': advice.content,
+        'url': reverse('travel_detail', args=[advice.travel_id]),
+    }
+
+def translation_document(translation):
+    return {
+        'title': translation.original_text[:200],
+        'body': _join(translation.original_text, translation.translated_text, translation.context),
+        'url': reverse('translate'),
+    }
+
+def place_document(place):
+    return {
+        'title': place.name[:200],
+        'body': _join(place.address, place.category, place.notes),
+        'url': reverse('map'),
+    }
+
+# kind -> model, lookup of the owning user, and what gets indexed
+SOURCES = {
+    'travels': ('travels.Travel', 'user_id', travel_document),
+    'advice': ('travels.TravelAdvice', 'travel__user_id', advice_document),
+    'translations': ('translate.TranslationHistory', 'user_id', translation_document),
+    'places': ('maps.SavedPlace', 'user_id', place_document),
+}
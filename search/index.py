@@ -0,0 +1,147 @@
+import html
+import re
+from django.apps import apps
+from django.db import connection, transaction
+from django.db.models import F, Q
+from .documents import SOURCES
+from .models import SearchEntry
+
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+# Longer queries are cut to this many words
+MAX_TERMS = 8
+REBUILD_BATCH_SIZE = 1000
+
+FTS_TABLE = 'search_searchentry_fts'
+# Stand-ins for <mark> while the database builds snippets, so the text around them can be escaped
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+def index_object(kind, instance, user_id):
+    """Create or refresh the search entry of an object"""
+    document = SOURCES[kind][2](instance)
+    SearchEntry.objects.update_or_create(
+        kind=kind, object_id=instance.pk, defaults={'user_id': user_id, **document}
+    )
+
+def index_objects(kind, objects):
+    """index_object for (instance, user_id) pairs written in bulk, which send no signals"""
+    build = SOURCES[kind][2]
+    entries = [SearchEntry(kind=kind, object_id=instance.pk, user_id=user_id, **build(instance))
+               for instance, user_id in objects]
+    with transaction.atomic():
+        SearchEntry.objects.filter(kind=kind, object_id__in=[entry.object_id for entry in entries]).delete()
+        SearchEntry.objects.bulk_create(entries)
+
+def unindex_object(kind, object_id):
+    unindex_objects(kind, [object_id])
+
+def unindex_objects(kind, object_ids):
+    SearchEntry.objects.filter(kind=kind, object_id__in=list(object_ids)).delete()
+
+def rebuild(kinds=None, batch_size=REBUILD_BATCH_SIZE):
+    """Index every object of the given kinds from scratch; {kind: entries written}"""
+    written = {}
+    for kind in kinds or SOURCES:
+        label, owner, build = SOURCES[kind]
+        model = apps.get_model(label)
+        with transaction.atomic():
+            SearchEntry.objects.filter(kind=kind).delete()
+            objects = model.objects.annotate(owner_id=F(owner)).order_by('pk')
+            count = 0
+            batch = []
+            for instance in objects.iterator(chunk_size=batch_size):
+                batch.append(SearchEntry(kind=kind, object_id=instance.pk, user_id=instance.owner_id,
+                                         **build(instance)))
+                if len(batch) >= batch_size:
+                    SearchEntry.objects.bulk_create(batch)
+                    count += len(batch)
+                    batch = []
+            SearchEntry.objects.bulk_create(batch)
+            written[kind] = count + len(batch)
+
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            # Merge the index segments written above
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return written
+
+def query_terms(query):
+    """Words of a query, lowercased; punctuation and search operators are dropped"""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+def _highlight(snippet):
+    return html.escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+def _search_sqlite(user, terms, kinds, limit):
+    # Every word must match, as a prefix so results come while the user types
+    match = ' '.join(f'"{term}"*' for term in terms)
+    kind_filter = f"AND e.kind IN ({', '.join(['%s'] * len(kinds))})" if kinds else ''
+    sql = f"""
+        SELECT e.kind, e.object_id, e.title, e.url,
+               snippet({FTS_TABLE}, 1, %s, %s, '…', 16),
+               bm25({FTS_TABLE}, 4.0, 1.0) AS rank
+        FROM {FTS_TABLE} JOIN search_searchentry e ON e.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH %s AND e.user_id = %s {kind_filter}
+        ORDER BY rank
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [MARK_START, MARK_END, match, user.pk, *kinds, limit])
+        # bm25 is lower for better matches
+        return [(kind, object_id, title, url, snippet, -rank)
+                for kind, object_id, title, url, snippet, rank in cursor.fetchall()]
+
+def _search_postgresql(user, terms, kinds, limit):
+    tsquery = ' & '.join(f"{term}:*" for term in terms)
+    kind_filter = f"AND kind IN ({', '.join(['%s'] * len(kinds))})" if kinds else ''
+    # Headlines are the slow part; only the page of results gets one
+    sql = f"""
+        SELECT kind, object_id, title, url,
+               ts_headline('simple', body, to_tsquery('simple', %s), %s), rank
+        FROM (
+            SELECT kind, object_id, title, url, body, ts_rank_cd(document, query, 32) AS rank
+            FROM search_searchentry, to_tsquery('simple', %s) query
+            WHERE user_id = %s AND document @@ query {kind_filter}
+            ORDER BY rank DESC
+            LIMIT %s
+        ) top
+        ORDER BY rank DESC
+    """
+    options = f'StartSel={MARK_START}, StopSel={MARK_END}, MaxWords=24, MinWords=8, MaxFragments=2, FragmentDelimiter=" … "'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [tsquery, options, tsquery, user.pk, *kinds, limit])
+        return cursor.fetchall()
+
+def _search_fallback(user, terms, kinds, limit):
+    # Other databases have no index set up; plain substring matching
+    entries = SearchEntry.objects.filter(user=user)
+    if kinds:
+        entries = entries.filter(kind__in=kinds)
+    for term in terms:
+        entries = entries.filter(Q(title__icontains=term) | Q(body__icontains=term))
+    return [(entry.kind, entry.object_id, entry.title, entry.url, entry.body[:160], 0)
+            for entry in entries.order_by('-updated_at')[:limit]]
+
+def search(user, query, kinds=None, limit=SEARCH_LIMIT):
+    """A user's entries matching every word of query, best first, with highlighted snippets"""
+    terms = query_terms(query)
+    if not terms:
+        return []
+    kinds = [kind for kind in kinds or [] if kind in SOURCES]
+    searcher = {
+        'sqlite': _search_sqlite,
+        'postgresql': _search_postgresql,
+    }.get(connection.vendor, _search_fallback)
+
+    return [
+        {
+            'kind': kind,
+            'id': object_id,
+            'title': title,
+            'url': url,
+            'snippet': _highlight(snippet or ''),
+            'rank': round(float(rank), 4),
+        }
+        for kind, object_id, title, url, snippet, rank in searcher(user, terms, kinds, limit)
+    ]
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from search.documents import SOURCES
+from search.index import REBUILD_BATCH_SIZE, rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search entries from the travels, advice, translations and saved places"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', choices=list(SOURCES),
+                            help="Only rebuild this kind; may be repeated")
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        written = rebuild(options['kind'], options['batch_size'])
+        for kind, count in written.items():
+            self.stdout.write(f"{kind}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Indexed {sum(written.values())} entries"))
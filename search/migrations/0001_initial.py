@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+SQLITE_INDEX = [
+    """CREATE VIRTUAL TABLE search_searchentry_fts USING fts5(
+        title, body, content='search_searchentry', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER search_searchentry_ai AFTER INSERT ON search_searchentry BEGIN
+        INSERT INTO search_searchentry_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER search_searchentry_ad AFTER DELETE ON search_searchentry BEGIN
+        INSERT INTO search_searchentry_fts(search_searchentry_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER search_searchentry_au AFTER UPDATE OF title, body ON search_searchentry BEGIN
+        INSERT INTO search_searchentry_fts(search_searchentry_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO search_searchentry_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS search_searchentry_au",
+    "DROP TRIGGER IF EXISTS search_searchentry_ad",
+    "DROP TRIGGER IF EXISTS search_searchentry_ai",
+    "DROP TABLE IF EXISTS search_searchentry_fts",
+]
+
+# 'simple': entries are in any language, so no stemming or stop words
+POSTGRESQL_INDEX = [
+    """ALTER TABLE search_searchentry ADD COLUMN document tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')
+    ) STORED""",
+    "CREATE INDEX search_searchentry_document ON search_searchentry USING GIN (document)",
+]
+
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS search_searchentry_document",
+    "ALTER TABLE search_searchentry DROP COLUMN IF EXISTS document",
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_full_text_index(apps, schema_editor):
+    """FTS5 on SQLite, tsvector + GIN on PostgreSQL; other databases search without an index"""
+    _run(schema_editor, {'sqlite': SQLITE_INDEX, 'postgresql': POSTGRESQL_INDEX})
+
+
+def drop_full_text_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_DROP, 'postgresql': POSTGRESQL_DROP})
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('title', models.CharField(max_length=200)),
+                ('body', models.TextField(blank=True)),
+                ('url', models.CharField(blank=True, max_length=200)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'kind'], name='search_sear_user_id_d43a66_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='search_entry_object')],
+            },
+        ),
+        migrations.RunPython(create_full_text_index, drop_full_text_index),
+    ]
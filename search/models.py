@@ -0,0 +1,29 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
+
+class SearchEntry(models.Model):
+    """Searchable text of one travel, advice, translation or saved place
+
+    The full-text index itself lives outside the ORM, see migration 0001: an FTS5
+    table kept current by triggers on SQLite, a generated tsvector column with a GIN
+    index on PostgreSQL. On SQLite a schema change that rebuilds this table drops
+    the triggers, so such a migration must create them again.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    title = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+    url = models.CharField(max_length=200, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='search_entry_object'),
+        ]
+        indexes = [models.Index(fields=['user', 'kind'])]
+    
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.title}"
@@ -0,0 +1,50 @@
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+from safe_traveller.writebehind import flushed
+from travels.models import Travel
+from .documents import SOURCES
+from .index import index_object, index_objects, unindex_object
+
+
+def _owner(owner, instance):
+    if owner == 'user_id':
+        return instance.user_id
+    return Travel.objects.filter(id=instance.travel_id).values_list('user_id', flat=True).first()
+
+
+def _indexer(kind, owner):
+    def receiver(sender, instance, raw=False, **kwargs):
+        if raw:
+            return
+        user_id = _owner(owner, instance)
+        if user_id is not None:
+            index_object(kind, instance, user_id)
+    return receiver
+
+
+def _bulk_indexer(kind, owner):
+    def receiver(sender, rows, **kwargs):
+        index_objects(kind, [(instance, _owner(owner, instance)) for instance in rows])
+    return receiver
+
+
+def _unindexer(kind):
+    def receiver(sender, instance, **kwargs):
+        unindex_object(kind, instance.pk)
+    return receiver
+
+
+def connect_index():
+    """Keep search entries current as the searchable models are saved and deleted
+
+    Rows from the write-behind buffer are indexed as it flushes them. Other
+    bulk writes bypass this; rebuild_search_index catches up.
+    """
+    for kind, (label, owner, _) in SOURCES.items():
+        model = apps.get_model(label)
+        post_save.connect(_indexer(kind, owner), sender=model, weak=False,
+                          dispatch_uid=f"search_index_{kind}")
+        post_delete.connect(_unindexer(kind), sender=model, weak=False,
+                            dispatch_uid=f"search_unindex_{kind}")
+        flushed.connect(_bulk_indexer(kind, owner), sender=model, weak=False,
+                        dispatch_uid=f"search_flushed_{kind}")
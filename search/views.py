@@ -0,0 +1,21 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from .index import MAX_SEARCH_LIMIT, SEARCH_LIMIT, search
+
+@login_required
+def search_view(request):
+    """?q= across the user's travels, advice, translations and saved places; ?kind= narrows it
+
+    Snippets are HTML: escaped text with the matches in <mark>.
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'status': 'error', 'message': 'Query is required'})
+    
+    try:
+        limit = min(max(int(request.GET.get('limit', SEARCH_LIMIT)), 1), MAX_SEARCH_LIMIT)
+    except ValueError:
+        limit = SEARCH_LIMIT
+    
+    results = search(request.user, query, request.GET.getlist('kind'), limit)
+    return JsonResponse({'status': 'success', 'query': query, 'results': results})
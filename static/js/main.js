@@ -288,7 +288,8 @@ class LocationManager {
                 this.currentPosition = {
                     lat: position.coords.latitude,
                     lng: position.coords.longitude,
-                    accuracy: position.coords.accuracy
+                    accuracy: position.coords.accuracy,
+                    timestamp: position.timestamp
                 };
                 
                 // Dispatch custom event
@@ -315,6 +316,69 @@ class LocationManager {
     }
 }
 
+// Trail recording: positions are buffered and sent to the server in batches
+class TrailRecorder {
+    constructor(url = '/map/trail/') {
+        this.url = url;
+        this.fixes = [];
+        this.maxFixes = 60;
+        this.flushInterval = 30000;
+        this.timer = null;
+        this.onLocation = (event) => this.add(event.detail);
+    }
+    
+    start() {
+        window.addEventListener('locationUpdate', this.onLocation);
+        this.timer = setInterval(() => this.flush(), this.flushInterval);
+    }
+    
+    stop() {
+        window.removeEventListener('locationUpdate', this.onLocation);
+        clearInterval(this.timer);
+        this.timer = null;
+        this.flush(true);
+    }
+    
+    add(position) {
+        this.fixes.push({
+            lat: position.lat,
+            lng: position.lng,
+            accuracy: position.accuracy,
+            t: position.timestamp || Date.now()
+        });
+        if (this.fixes.length >= this.maxFixes) {
+            this.flush();
+        }
+    }
+    
+    flush(unloading = false) {
+        if (!this.fixes.length) return;
+        
+        const fixes = this.fixes;
+        this.fixes = [];
+        const body = JSON.stringify({ fixes });
+        
+        // The page may be going away; let the browser deliver the last batch
+        if (unloading && navigator.sendBeacon) {
+            navigator.sendBeacon(this.url, new Blob([body], { type: 'application/json' }));
+            return;
+        }
+        
+        fetch(this.url, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCookie('csrftoken')
+            },
+            body,
+            keepalive: true
+        }).catch(() => {
+            // Offline: keep the fixes for the next attempt
+            this.fixes = fixes.concat(this.fixes);
+        });
+    }
+}
+
 // Audio management
 class AudioManager {
     constructor() {
@@ -466,6 +530,8 @@ document.addEventListener('DOMContentLoaded', function() {
     // Start location watching if on map page
     if (window.location.pathname.includes('map')) {
         window.locationManager.startWatching();
+        window.trailRecorder = new TrailRecorder();
+        window.trailRecorder.start();
     }
     
     console.log('Safe Traveller initialized successfully');
@@ -477,6 +543,10 @@ window.addEventListener('beforeunload', function() {
         window.locationManager.stopWatching();
     }
     
+    if (window.trailRecorder) {
+        window.trailRecorder.stop();
+    }
+    
     if (window.audioManager && window.audioManager.isRecording) {
         window.audioManager.stopRecording();
     }
@@ -0,0 +1,91 @@
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import SyncChange
+
+SYNC_PAGE_SIZE = 500
+MAX_SYNC_PAGE_SIZE = 2000
+
+# What the app keeps offline: kind -> (model, fields it receives)
+SYNCED = {
+    'travels': ('travels.Travel', (
+        'id', 'name', 'country', 'city', 'travel_type', 'start_date', 'residence',
+        'objectives', 'is_active', 'advice_data', 'updated_at',
+    )),
+    'destinations': ('travels.QuickDestination', (
+        'id', 'travel_id', 'category', 'name', 'address', 'latitude', 'longitude',
+        'visited', 'created_at',
+    )),
+    'saved_places': ('maps.SavedPlace', (
+        'id', 'name', 'address', 'latitude', 'longitude', 'category', 'notes', 'created_at',
+    )),
+    'translations': ('translate.TranslationHistory', (
+        'id', 'source_language', 'target_language', 'original_text', 'translated_text',
+        'context', 'created_at',
+    )),
+}
+
+def record(user_id, kind, object_ids, deleted=False):
+    """Log that objects of a user changed, or were deleted; replaces their earlier entries"""
+    object_ids = list(object_ids)
+    if not object_ids:
+        return
+    with transaction.atomic():
+        SyncChange.objects.filter(kind=kind, object_id__in=object_ids).delete()
+        SyncChange.objects.bulk_create([
+            SyncChange(user_id=user_id, kind=kind, object_id=object_id, deleted=deleted)
+            for object_id in object_ids
+        ])
+
+def _settled_before():
+    return timezone.now() - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+
+def latest_change(user):
+    """Id of the user's newest change served so far; any change makes it grow once settled"""
+    return (
+        SyncChange.objects.filter(user=user, changed_at__lte=_settled_before())
+        .order_by('-id').values_list('id', flat=True).first() or 0
+    )
+
+def changes_since(user, cursor=0, limit=SYNC_PAGE_SIZE):
+    """The user's objects changed after a cursor, and ids of those deleted
+
+    Returns a dict with changes and deleted (both keyed by kind), the cursor to
+    send next time, and whether more changes are waiting past this page.
+
+    The page ends before the first entry younger than SYNC_SETTLE_SECONDS.
+    Until then a transaction that took a lower id may still commit it, and a
+    cursor moved past that entry would never see it.
+    """
+    entries = list(
+        SyncChange.objects.filter(user=user, id__gt=cursor).order_by('id')
+        .values_list('id', 'kind', 'object_id', 'deleted', 'changed_at')[:limit + 1]
+    )
+    settled_before = _settled_before()
+    for i, entry in enumerate(entries):
+        if entry[4] > settled_before:
+            entries = entries[:i]
+            break
+    more = len(entries) > limit
+    entries = entries[:limit]
+
+    changed_ids = {kind: [] for kind in SYNCED}
+    deleted = {kind: [] for kind in SYNCED}
+    for _, kind, object_id, is_deleted, _ in entries:
+        if kind in SYNCED:
+            (deleted if is_deleted else changed_ids)[kind].append(object_id)
+
+    changes = {}
+    for kind, ids in changed_ids.items():
+        label, fields = SYNCED[kind]
+        # An object deleted since it was logged has a later tombstone instead
+        changes[kind] = list(apps.get_model(label).objects.filter(id__in=ids).values(*fields)) if ids else []
+
+    return {
+        'cursor': entries[-1][0] if entries else cursor,
+        'more': more,
+        'changes': changes,
+        'deleted': deleted,
+    }
@@ -0,0 +1,43 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from sync.replication import REPLICATION_BATCH_SIZE, ReplicationError, replicate
+
+
+class Command(BaseCommand):
+    help = "Upsert unsynced users and travels to Supabase in batches, delete soft-deleted ones there, then mark them synced"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REPLICATION_BATCH_SIZE)
+        parser.add_argument('--once', action='store_true',
+                            help="Drain what is pending now and exit instead of polling")
+        parser.add_argument('--interval', type=float, default=10,
+                            help="Seconds to wait when nothing is pending or Supabase keeps failing")
+
+    def handle(self, *args, **options):
+        if not settings.SUPABASE_URL or not settings.SUPABASE_KEY:
+            raise CommandError('SUPABASE_URL and SUPABASE_KEY must be set')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        total = 0
+        while True:
+            try:
+                sent = replicate(batch_size)
+            except ReplicationError as e:
+                if options['once']:
+                    raise CommandError(str(e))
+                self.stderr.write(str(e))
+                time.sleep(options['interval'])
+                continue
+
+            total += sum(sent.values())
+            if any(sent.values()):
+                self.stdout.write(', '.join(f"{table}: {n}" for table, n in sent.items() if n))
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Replicated {total} rows"))
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+# kind -> (model, path to the owning user)
+EXISTING = {
+    'travels': ('travels', 'Travel', 'user_id'),
+    'destinations': ('travels', 'QuickDestination', 'travel__user_id'),
+    'saved_places': ('maps', 'SavedPlace', 'user_id'),
+    'translations': ('translate', 'TranslationHistory', 'user_id'),
+}
+
+
+def log_existing(apps, schema_editor):
+    """One change per existing object, so a first sync from cursor 0 gets everything"""
+    SyncChange = apps.get_model('sync', 'SyncChange')
+    for kind, (app_label, model_name, owner) in EXISTING.items():
+        model = apps.get_model(app_label, model_name)
+        batch = []
+        for object_id, user_id in model.objects.order_by('id').values_list('id', owner).iterator():
+            batch.append(SyncChange(user_id=user_id, kind=kind, object_id=object_id))
+            if len(batch) >= BATCH_SIZE:
+                SyncChange.objects.bulk_create(batch)
+                batch = []
+        SyncChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0001_initial'),
+        ('travels', '0005_one_active_travel'),
+        ('maps', '0003_trailsegment'),
+        ('translate', '0002_voicechatmessage_audio_digest'),
+    ]
+
+    operations = [
+        migrations.RunPython(log_existing, migrations.RunPython.noop),
+    ]
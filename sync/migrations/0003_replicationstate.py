@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0002_log_existing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplicationState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=50, unique=True)),
+                ('rows_replicated', models.BigIntegerField(default=0)),
+                ('batches', models.IntegerField(default=0)),
+                ('failures', models.IntegerField(default=0)),
+                ('upload_seconds', models.FloatField(default=0)),
+                ('last_success_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+        ),
+    ]
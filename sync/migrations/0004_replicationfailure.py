@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0003_replicationstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplicationFailure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=50)),
+                ('object_id', models.BigIntegerField()),
+                ('updated_at', models.DateTimeField()),
+                ('attempts', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('failed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('table', 'object_id'), name='replication_failure_row')],
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
+
+class SyncChange(models.Model):
+    """Latest change to a synced object; its id is the cursor clients sync from
+
+    Each object keeps one row: a new change replaces the old one with a higher id,
+    and a delete leaves a tombstone.
+    """
+    # No database constraint: tombstones are written while a user's rows are being deleted
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    kind = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id']),
+            models.Index(fields=['kind', 'object_id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} {self.object_id}{' deleted' if self.deleted else ''} ({self.id})"
+
+class ReplicationState(models.Model):
+    """Running totals of the Supabase replication of one table"""
+    table = models.CharField(max_length=50, unique=True)
+    rows_replicated = models.BigIntegerField(default=0)
+    batches = models.IntegerField(default=0)
+    failures = models.IntegerField(default=0)
+    # Time spent uploading, for throughput
+    upload_seconds = models.FloatField(default=0)
+    last_success_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    
+    def __str__(self):
+        return f"{self.table}: {self.rows_replicated} rows"
+
+class ReplicationFailure(models.Model):
+    """A row Supabase refused; skipped after MAX_ROW_FAILURES refusals until it changes again"""
+    table = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    # The version of the row that was refused
+    updated_at = models.DateTimeField()
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    failed_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['table', 'object_id'], name='replication_failure_row'),
+        ]
+    
+    def __str__(self):
+        return f"{self.table} {self.object_id}: {self.attempts} failures"
@@ -0,0 +1,219 @@
+import hashlib
+import json
+import time
+import requests
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+import operator
+from functools import reduce
+from django.db.models import Count, Exists, F, Min, OuterRef, Q
+from django.utils import timezone
+from .models import ReplicationFailure, ReplicationState
+
+REPLICATION_BATCH_SIZE = 500
+REQUEST_TIMEOUT = 30
+MAX_ATTEMPTS = 5
+# Doubled after every failed attempt
+BACKOFF_SECONDS = 1
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+# A row refused this many times is left out of batches until it is saved again
+MAX_ROW_FAILURES = 3
+
+# Supabase table -> (model, columns upserted into it); rows with is_synced=False are sent
+REPLICATED = {
+    'users': ('users.CustomUser', (
+        'id', 'username', 'email', 'first_name', 'last_name', 'nationality', 'city',
+        'mother_tongue', 'learning_language', 'religion', 'caution_level', 'theme',
+        'language_ui', 'date_joined', 'updated_at',
+    )),
+    'travels': ('travels.Travel', (
+        'id', 'user_id', 'name', 'country', 'city', 'travel_type', 'start_date', 'residence',
+        'objectives', 'is_active', 'advice_data', 'created_at', 'updated_at',
+    )),
+}
+
+class ReplicationError(Exception):
+    """retryable is False when Supabase refused the request itself, not just failed to answer"""
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+def _retry_delay(response, attempt):
+    delay = BACKOFF_SECONDS * 2 ** (attempt - 1)
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, int(retry_after))
+    return delay
+
+def _send(method, table, params, body, idempotency_key, prefer):
+    """One PostgREST request on a Supabase table, retrying transient failures"""
+    url = f"{settings.SUPABASE_URL.rstrip('/')}/rest/v1/{table}"
+    headers = {
+        'apikey': settings.SUPABASE_KEY,
+        'Authorization': f"Bearer {settings.SUPABASE_KEY}",
+        'Content-Type': 'application/json',
+        'Prefer': prefer,
+        # Same batch, same key: a retry of a request that did land is harmless
+        'Idempotency-Key': idempotency_key,
+    }
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        response = None
+        try:
+            response = requests.request(method, url, params=params, data=body,
+                                        headers=headers, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            error = f"{table}: {e}"
+        else:
+            if response.status_code < 300:
+                return
+            error = f"{table}: HTTP {response.status_code} {response.text[:200]}"
+            if response.status_code not in RETRY_STATUSES:
+                raise ReplicationError(error, retryable=False)
+        if attempt < MAX_ATTEMPTS:
+            time.sleep(_retry_delay(response, attempt))
+    raise ReplicationError(error)
+
+def upsert(table, rows, idempotency_key):
+    """Insert or update rows of a Supabase table by id"""
+    body = json.dumps(rows, cls=DjangoJSONEncoder)
+    _send('POST', table, {'on_conflict': 'id'}, body, idempotency_key,
+          'resolution=merge-duplicates,return=minimal')
+
+def delete(table, ids, idempotency_key):
+    """Delete rows of a Supabase table by id; ids already gone are fine"""
+    _send('DELETE', table, {'id': f"in.({','.join(str(pk) for pk in ids)})"}, None, idempotency_key,
+          'return=minimal')
+
+def _send_rows(table, rows, key):
+    live = [row for row in rows if not row['deleted_at']]
+    deleted_ids = [row['id'] for row in rows if row['deleted_at']]
+    if live:
+        upsert(table, [{column: value for column, value in row.items() if column != 'deleted_at'} for row in live], key)
+    if deleted_ids:
+        delete(table, deleted_ids, f"{key}-delete")
+
+def _refused(table, row, error):
+    failure, created = ReplicationFailure.objects.get_or_create(
+        table=table, object_id=row['id'],
+        defaults={'updated_at': row['updated_at'], 'attempts': 1, 'error': error},
+    )
+    if not created:
+        # A row saved since its last refusal starts counting again
+        attempts = failure.attempts + 1 if failure.updated_at == row['updated_at'] else 1
+        ReplicationFailure.objects.filter(id=failure.id).update(
+            updated_at=row['updated_at'], attempts=attempts, error=error, failed_at=timezone.now()
+        )
+
+def replicate_batch(table, batch_size=REPLICATION_BATCH_SIZE):
+    """Send up to batch_size unsynced rows of a table, oldest change first; returns how many went through
+
+    Soft-deleted rows are deleted upstream instead; purge_deleted waits for that.
+    A batch Supabase refuses goes again row by row; rows refused MAX_ROW_FAILURES
+    times are skipped until they are saved again, so they can't hold up the rest.
+    """
+    label, columns = REPLICATED[table]
+    model = apps.get_model(label)
+    quarantined = ReplicationFailure.objects.filter(
+        table=table, object_id=OuterRef('pk'), updated_at=OuterRef('updated_at'), attempts__gte=MAX_ROW_FAILURES
+    )
+    rows = list(
+        model._base_manager.filter(is_synced=False).exclude(Exists(quarantined)).order_by('updated_at', 'id')
+        .values(*columns, 'deleted_at')[:batch_size]
+    )
+    if not rows:
+        return 0
+
+    key = hashlib.sha256(json.dumps(
+        [table, [(row['id'], row['updated_at']) for row in rows]], cls=DjangoJSONEncoder
+    ).encode()).hexdigest()
+
+    state, _ = ReplicationState.objects.get_or_create(table=table)
+    started = time.monotonic()
+    sent = rows
+    errors = []
+    try:
+        _send_rows(table, rows, key)
+    except ReplicationError as e:
+        if e.retryable:
+            ReplicationState.objects.filter(id=state.id).update(failures=F('failures') + 1, last_error=str(e))
+            raise
+        sent = []
+        for row in rows:
+            try:
+                _send_rows(table, [row], f"{key}-{row['id']}")
+            except ReplicationError as row_error:
+                if row_error.retryable:
+                    ReplicationState.objects.filter(id=state.id).update(
+                        failures=F('failures') + 1, last_error=str(row_error)
+                    )
+                    raise
+                _refused(table, row, str(row_error))
+                errors.append(str(row_error))
+            else:
+                sent.append(row)
+
+    if sent:
+        # Only the versions sent; a row saved again since it was read stays unsynced
+        model._base_manager.filter(
+            reduce(operator.or_, (Q(id=row['id'], updated_at=row['updated_at']) for row in sent))
+        ).update(is_synced=True)
+        ReplicationFailure.objects.filter(table=table, object_id__in=[row['id'] for row in sent]).delete()
+    ReplicationState.objects.filter(id=state.id).update(
+        rows_replicated=F('rows_replicated') + len(sent),
+        batches=F('batches') + 1,
+        failures=F('failures') + len(errors),
+        upload_seconds=F('upload_seconds') + (time.monotonic() - started),
+        last_error=errors[-1] if errors else '',
+        **({'last_success_at': timezone.now()} if sent else {}),
+    )
+    return len(sent)
+
+def replicate(batch_size=REPLICATION_BATCH_SIZE):
+    """One batch of every replicated table; {table: rows sent}
+
+    A table Supabase can't be reached for doesn't hold up the others; the
+    errors are raised together once every table had its turn.
+    """
+    sent = {}
+    errors = []
+    for table in REPLICATED:
+        try:
+            sent[table] = replicate_batch(table, batch_size)
+        except ReplicationError as e:
+            print(f"Replication error: {e}")
+            sent[table] = 0
+            errors.append(str(e))
+    if errors and not any(sent.values()):
+        raise ReplicationError('; '.join(errors))
+    return sent
+
+def replication_status():
+    """Throughput and lag per table"""
+    states = {state.table: state for state in ReplicationState.objects.all()}
+    quarantined = dict(
+        ReplicationFailure.objects.filter(attempts__gte=MAX_ROW_FAILURES)
+        .values('table').annotate(count=Count('id')).values_list('table', 'count')
+    )
+    now = timezone.now()
+    status = {}
+    for table, (label, _) in REPLICATED.items():
+        pending = apps.get_model(label)._base_manager.filter(is_synced=False).aggregate(
+            count=Count('id'), oldest=Min('updated_at')
+        )
+        state = states.get(table) or ReplicationState(table=table)
+        status[table] = {
+            'pending': pending['count'],
+            # Age of the oldest change not yet upstream
+            'lag_seconds': (now - pending['oldest']).total_seconds() if pending['oldest'] else 0,
+            'rows_replicated': state.rows_replicated,
+            'batches': state.batches,
+            'failures': state.failures,
+            # Rows refused too often, left out until they change
+            'quarantined': quarantined.get(table, 0),
+            'rows_per_second': round(state.rows_replicated / state.upload_seconds, 1) if state.upload_seconds else None,
+            'last_success_at': state.last_success_at,
+            'last_error': state.last_error,
+        }
+    return status
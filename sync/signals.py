@@ -0,0 +1,56 @@
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from safe_traveller.writebehind import flushed
+from travels.models import QuickDestination, Travel
+from .changes import SYNCED, record
+from .models import SyncChange
+
+
+def _owner(instance):
+    if isinstance(instance, QuickDestination):
+        return Travel.objects.filter(id=instance.travel_id).values_list('user_id', flat=True).first()
+    return instance.user_id
+
+
+def _log(kind, deleted):
+    def receiver(sender, instance, raw=False, **kwargs):
+        if raw:
+            return
+        user_id = _owner(instance)
+        if user_id is not None:
+            record(user_id, kind, [instance.pk], deleted=deleted)
+    return receiver
+
+
+def _log_flushed(kind):
+    def receiver(sender, rows, **kwargs):
+        by_user = {}
+        for instance in rows:
+            by_user.setdefault(_owner(instance), []).append(instance.pk)
+        for user_id, object_ids in by_user.items():
+            if user_id is not None:
+                record(user_id, kind, object_ids)
+    return receiver
+
+
+def _forget_user(sender, instance, **kwargs):
+    # Runs after the user's objects went, tombstones included
+    SyncChange.objects.filter(user_id=instance.pk).delete()
+
+
+def connect_changes():
+    """Log saves and deletes of the synced models for the sync endpoint
+
+    queryset.update() sends no signals; code changing synced rows that way
+    calls sync.changes.record itself.
+    """
+    for kind, (label, _) in SYNCED.items():
+        model = apps.get_model(label)
+        post_save.connect(_log(kind, False), sender=model, weak=False,
+                          dispatch_uid=f"sync_change_{kind}")
+        post_delete.connect(_log(kind, True), sender=model, weak=False,
+                            dispatch_uid=f"sync_delete_{kind}")
+        flushed.connect(_log_flushed(kind), sender=model, weak=False,
+                        dispatch_uid=f"sync_flushed_{kind}")
+    post_delete.connect(_forget_user, sender=get_user_model(), dispatch_uid="sync_forget_user")
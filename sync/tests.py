@@ -0,0 +1,180 @@
+import json
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from safe_traveller.purge import purge_deleted
+from travels.models import Travel
+from travels.services.deletion import soft_delete_travel
+from .changes import changes_since, latest_change
+from .models import ReplicationFailure, ReplicationState, SyncChange
+from .replication import MAX_ATTEMPTS, MAX_ROW_FAILURES, replicate, replicate_batch
+
+User = get_user_model()
+
+
+@override_settings(SYNC_SETTLE_SECONDS=10)
+class ChangesSinceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='sync', password='p')
+
+    def _commit(self, entry_id, object_id, age):
+        """A tombstone as a transaction commits it: its id taken at insert, changed_at age seconds ago"""
+        SyncChange.objects.create(id=entry_id, user=self.user, kind='travels', object_id=object_id, deleted=True)
+        SyncChange.objects.filter(id=entry_id).update(changed_at=timezone.now() - timedelta(seconds=age))
+
+    def test_late_commit_below_the_cursor_is_not_skipped(self):
+        # Transaction A takes id 101, B takes 102; B commits first
+        self._commit(102, object_id=2, age=1)
+        page = changes_since(self.user, 0)
+        self.assertEqual(page['cursor'], 0)
+        self.assertEqual(page['deleted']['travels'], [])
+        self.assertEqual(latest_change(self.user), 0)
+
+        # A commits, then both settle
+        self._commit(101, object_id=1, age=2)
+        SyncChange.objects.update(changed_at=timezone.now() - timedelta(seconds=30))
+        page = changes_since(self.user, page['cursor'])
+        self.assertEqual(page['cursor'], 102)
+        self.assertEqual(latest_change(self.user), 102)
+        self.assertEqual(page['deleted']['travels'], [1, 2])
+
+    def test_page_stops_at_the_first_unsettled_entry(self):
+        self._commit(1, object_id=1, age=30)
+        self._commit(2, object_id=2, age=1)
+        self._commit(3, object_id=3, age=30)
+        page = changes_since(self.user, 0)
+        self.assertEqual(page['cursor'], 1)
+        self.assertEqual(page['deleted']['travels'], [1])
+        self.assertFalse(page['more'])
+
+
+class _Supabase(BaseHTTPRequestHandler):
+    """PostgREST stand-in answering with the queued statuses, then 201; rows named refused get a 409"""
+    statuses = []
+    requests = []
+    refused = None
+
+    def _answer(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        rows = json.loads(body) if body else None
+        self.requests.append((self.command, self.path, rows))
+        if self.statuses:
+            status = self.statuses.pop(0)
+        elif rows and any(row['name'] == self.refused for row in rows):
+            status = 409
+        else:
+            status = 201
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_POST = do_DELETE = _answer
+
+    def log_message(self, *args):
+        pass
+
+
+@mock.patch('sync.replication.BACKOFF_SECONDS', 0)
+class ReplicationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _Supabase)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.settings = override_settings(
+            SUPABASE_URL=f"http://127.0.0.1:{cls.server.server_port}", SUPABASE_KEY='key'
+        )
+        cls.settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        _Supabase.statuses = []
+        _Supabase.requests = []
+        _Supabase.refused = None
+        self.user = User.objects.create_user(username='replica', password='p')
+        self.travel = self._travel('Trip')
+
+    def _travel(self, name):
+        return Travel.objects.create(
+            user=self.user, name=name, country='Togo', city='Lome', travel_type='vacation',
+            start_date=timezone.now().date(), residence='Hotel',
+        )
+
+    def test_transient_failure_is_retried_once(self):
+        _Supabase.statuses = [503]
+        self.assertEqual(replicate_batch('travels'), 1)
+        self.assertEqual([request[0] for request in _Supabase.requests], ['POST', 'POST'])
+        self.assertEqual(_Supabase.requests[1][2][0]['id'], self.travel.id)
+        self.travel.refresh_from_db()
+        self.assertTrue(self.travel.is_synced)
+        self.assertEqual(ReplicationState.objects.get(table='travels').batches, 1)
+
+    def test_client_error_is_not_retried(self):
+        _Supabase.refused = 'Trip'
+        self.assertEqual(replicate_batch('travels'), 0)
+        # The batch, then the row on its own; neither again
+        self.assertEqual(len(_Supabase.requests), 2)
+        self.travel.refresh_from_db()
+        self.assertFalse(self.travel.is_synced)
+        self.assertEqual(ReplicationFailure.objects.get(table='travels', object_id=self.travel.id).attempts, 1)
+        self.assertEqual(ReplicationState.objects.get(table='travels').failures, 1)
+
+    def test_refused_row_does_not_hold_up_the_table(self):
+        _Supabase.refused = 'Poison'
+        poison = self._travel('Poison')
+        self.assertEqual(replicate_batch('travels'), 1)
+        self.travel.refresh_from_db()
+        self.assertTrue(self.travel.is_synced)
+
+        for _ in range(MAX_ROW_FAILURES - 1):
+            replicate_batch('travels')
+        _Supabase.requests = []
+        self.assertEqual(replicate_batch('travels'), 0)
+        self.assertEqual(_Supabase.requests, [])
+
+        # Saved again, it is tried again
+        _Supabase.refused = None
+        poison.save()
+        self.assertEqual(replicate_batch('travels'), 1)
+        self.assertFalse(ReplicationFailure.objects.exists())
+
+    def test_unreachable_table_does_not_stop_the_others(self):
+        # users go first and fail every attempt
+        _Supabase.statuses = [503] * MAX_ATTEMPTS
+        self.assertEqual(replicate(), {'users': 0, 'travels': 1})
+        self.travel.refresh_from_db()
+        self.assertTrue(self.travel.is_synced)
+        self.assertFalse(User.objects.get(id=self.user.id).is_synced)
+
+    def test_row_saved_during_the_upload_stays_unsynced(self):
+        def save_meanwhile(table, rows, key):
+            # Saved by another process, its clock a little behind
+            Travel.objects.filter(id=self.travel.id).update(
+                name='Edited', updated_at=self.travel.updated_at - timedelta(seconds=1)
+            )
+
+        with mock.patch('sync.replication.upsert', side_effect=save_meanwhile):
+            self.assertEqual(replicate_batch('travels'), 1)
+        self.travel.refresh_from_db()
+        self.assertFalse(self.travel.is_synced)
+
+    def test_soft_deleted_travel_is_deleted_upstream_before_purge(self):
+        replicate_batch('travels')
+        soft_delete_travel(self.travel)
+        self.assertEqual(purge_deleted()['objects']['travels.Travel'], 0)
+
+        _Supabase.requests = []
+        self.assertEqual(replicate_batch('travels'), 1)
+        self.assertEqual(_Supabase.requests, [('DELETE', f"/rest/v1/travels?id=in.%28{self.travel.id}%29", None)])
+        self.assertEqual(purge_deleted()['objects']['travels.Travel'], 1)
+        self.assertFalse(Travel.all_objects.filter(id=self.travel.id).exists())
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('', views.sync_changes, name='sync_changes'),
+    path('replication/', views.replication_metrics, name='replication_metrics'),
+]
@@ -0,0 +1,43 @@
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import etag, require_GET
+from .changes import MAX_SYNC_PAGE_SIZE, SYNC_PAGE_SIZE, changes_since, latest_change
+from .replication import replication_status
+
+def _sync_args(request):
+    """(cursor, limit) from the query string; raises ValueError if they aren't numbers"""
+    cursor = max(int(request.GET.get('cursor') or 0), 0)
+    limit = int(request.GET.get('limit') or SYNC_PAGE_SIZE)
+    return cursor, min(max(limit, 1), MAX_SYNC_PAGE_SIZE)
+
+def _sync_etag(request):
+    try:
+        cursor, limit = _sync_args(request)
+    except ValueError:
+        return None
+    return f"sync-{request.user.pk}-{latest_change(request.user)}-{cursor}-{limit}"
+
+@login_required
+@require_GET
+@gzip_page
+@cache_control(private=True, no_cache=True)
+@etag(_sync_etag)
+def sync_changes(request):
+    """What changed for the user since ?cursor=; call again with the returned cursor while more is true
+
+    Start from cursor 0 for a full download. Deleted objects come back as ids under
+    deleted. An unchanged cursor answers 304 to If-None-Match.
+    """
+    try:
+        cursor, limit = _sync_args(request)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid cursor'})
+
+    return JsonResponse({'status': 'success', **changes_since(request.user, cursor, limit)})
+
+@user_passes_test(lambda user: user.is_staff)
+def replication_metrics(request):
+    """Supabase replication throughput and lag, per table"""
+    return JsonResponse({'status': 'success', 'tables': replication_status()})
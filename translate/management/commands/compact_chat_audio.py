@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from translate.services.audio_maintenance import compact_chat_audio
+
+
+class Command(BaseCommand):
+    help = 'Purge expired chat audio, deduplicate identical uploads and transcode old clips to Opus'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transcode-after-days', type=int, default=None,
+                            help='Transcode clips older than this (default: CHAT_AUDIO_TRANSCODE_AFTER_DAYS)')
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help='Delete audio older than this (default: CHAT_AUDIO_RETENTION_DAYS)')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Transcoder processes (default: CPU count)')
+
+    def handle(self, *args, **options):
+        report = compact_chat_audio(
+            transcode_after_days=options['transcode_after_days'],
+            retention_days=options['retention_days'],
+            workers=options['workers'],
+        )
+
+        purge = report['purge']
+        dedup = report['dedup']
+        transcode = report['transcode']
+        self.stdout.write(f"Purged audio from {purge['purged']} messages ({purge['bytes']} bytes)")
+        self.stdout.write(f"Merged {dedup['merged']} duplicate uploads ({dedup['bytes']} bytes)")
+        if transcode.get('skipped'):
+            self.stdout.write(self.style.WARNING(f"Transcoding skipped: {transcode['skipped']}"))
+        else:
+            self.stdout.write(
+                f"Transcoded {transcode['transcoded']} clips, {transcode['failed']} failed ({transcode['bytes']} bytes)"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Reclaimed {report['reclaimed_bytes']} bytes"))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('translate', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voicechatmessage',
+            name='audio_digest',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:27
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('translate', '0002_voicechatmessage_audio_digest'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='translationhistory',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='voicechatmessage',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -10,7 +11,8 @@ class TranslationHistory(models.Model):
     original_text = models.TextField()
     translated_text = models.TextField()
     context = models.CharField(max_length=100, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: rows are inserted by the write-behind buffer, after the translation
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         ordering = ['-created_at']
@@ -36,8 +38,10 @@ class VoiceChatMessage(models.Model):
     ])
     text_content = models.TextField()
     audio_file = models.FileField(upload_to='chat_audio/', null=True, blank=True)
+    audio_digest = models.CharField(max_length=64, blank=True, db_index=True)
     language_detected = models.CharField(max_length=20, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add, for the same reason
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         ordering = ['timestamp']
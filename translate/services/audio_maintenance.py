@@ -0,0 +1,202 @@
+import hashlib
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Count, Q
+from django.utils import timezone
+from ..models import VoiceChatMessage
+
+COMPACT_EXTENSION = '.ogg'
+NO_AUDIO = Q(audio_file='') | Q(audio_file__isnull=True)
+
+
+def file_digest(name):
+    """Return the SHA-256 digest of a stored file"""
+    digest = hashlib.sha256()
+    with default_storage.open(name, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _delete_file(name):
+    """Delete a stored file and return the number of bytes freed"""
+    try:
+        size = default_storage.size(name)
+    except OSError:
+        return 0
+    default_storage.delete(name)
+    return size
+
+
+def _is_referenced(name):
+    return VoiceChatMessage.objects.filter(audio_file=name).exists()
+
+
+def purge_expired_audio(retention_days, batch_size=500):
+    """Drop audio older than the retention window, keeping the transcript"""
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    expired = VoiceChatMessage.objects.filter(timestamp__lt=cutoff).exclude(NO_AUDIO)
+    purged = 0
+    reclaimed = 0
+
+    while True:
+        batch = list(expired.values_list('id', 'audio_file')[:batch_size])
+        if not batch:
+            break
+
+        VoiceChatMessage.objects.filter(id__in=[pk for pk, _ in batch]).update(audio_file='')
+        purged += len(batch)
+
+        # Deduplicated files can still be shared with newer messages
+        for name in {name for _, name in batch}:
+            if not _is_referenced(name):
+                reclaimed += _delete_file(name)
+
+    return {'purged': purged, 'bytes': reclaimed}
+
+
+def deduplicate_audio(batch_size=500):
+    """Point identical uploads at a single stored file"""
+    last_id = 0
+    while True:
+        batch = list(
+            VoiceChatMessage.objects.filter(id__gt=last_id, audio_digest='')
+            .exclude(NO_AUDIO)
+            .order_by('id')[:batch_size]
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        hashed = []
+        for message in batch:
+            try:
+                message.audio_digest = file_digest(message.audio_file.name)
+            except OSError as e:
+                print(f"Audio digest error for {message.audio_file.name}: {e}")
+                continue
+            hashed.append(message)
+        VoiceChatMessage.objects.bulk_update(hashed, ['audio_digest'])
+
+    merged = 0
+    reclaimed = 0
+    duplicates = (
+        VoiceChatMessage.objects.exclude(audio_digest='').exclude(NO_AUDIO)
+        .values('audio_digest')
+        .annotate(files=Count('audio_file', distinct=True))
+        .filter(files__gt=1)
+    )
+    for row in duplicates.iterator():
+        names = list(
+            VoiceChatMessage.objects.filter(audio_digest=row['audio_digest']).exclude(NO_AUDIO)
+            .order_by('id').values_list('audio_file', flat=True).distinct()
+        )
+        # Prefer a copy that has already been compacted
+        keep = next((name for name in names if name.endswith(COMPACT_EXTENSION)), names[0])
+        redundant = [name for name in names if name != keep]
+
+        merged += VoiceChatMessage.objects.filter(audio_file__in=redundant).update(audio_file=keep)
+        for name in redundant:
+            reclaimed += _delete_file(name)
+
+    return {'merged': merged, 'bytes': reclaimed}
+
+
+def _transcode(src, dst, ffmpeg):
+    """Re-encode one clip as mono Opus (runs in a worker process)"""
+    command = [
+        ffmpeg, '-nostdin', '-loglevel', 'error', '-y', '-i', src,
+        '-vn', '-ac', '1', '-c:a', 'libopus', '-b:a', '24k', dst,
+    ]
+    try:
+        subprocess.run(command, check=True, capture_output=True, timeout=300)
+    except (OSError, subprocess.SubprocessError) as e:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return str(e)
+    return None
+
+
+def _compact_name(name, claimed):
+    stem = os.path.splitext(name)[0]
+    candidate = f"{stem}{COMPACT_EXTENSION}"
+    counter = 1
+    while candidate in claimed or default_storage.exists(candidate):
+        candidate = f"{stem}_{counter}{COMPACT_EXTENSION}"
+        counter += 1
+    claimed.add(candidate)
+    return candidate
+
+
+def transcode_audio(min_age_days, workers=None, batch_size=200):
+    """Re-encode clips older than min_age_days to Opus in a process pool"""
+    ffmpeg = settings.FFMPEG_BINARY
+    if shutil.which(ffmpeg) is None:
+        return {'transcoded': 0, 'failed': 0, 'bytes': 0, 'skipped': f'{ffmpeg} not found'}
+
+    cutoff = timezone.now() - timedelta(days=min_age_days)
+    candidates = (
+        VoiceChatMessage.objects.filter(timestamp__lt=cutoff).exclude(NO_AUDIO)
+        .exclude(audio_file__endswith=COMPACT_EXTENSION)
+        .order_by('audio_file').values_list('audio_file', flat=True).distinct()
+    )
+    transcoded = 0
+    failed = 0
+    reclaimed = 0
+    last_name = ''
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            names = list(candidates.filter(audio_file__gt=last_name)[:batch_size])
+            if not names:
+                break
+            last_name = names[-1]
+
+            claimed = set()
+            jobs = []
+            for name in names:
+                if not default_storage.exists(name):
+                    continue
+                target = _compact_name(name, claimed)
+                jobs.append((name, target, default_storage.path(name), default_storage.path(target)))
+
+            errors = pool.map(
+                _transcode,
+                [src for _, _, src, _ in jobs],
+                [dst for _, _, _, dst in jobs],
+                [ffmpeg] * len(jobs),
+            )
+            for (name, target, src, dst), error in zip(jobs, errors):
+                if error:
+                    print(f"Audio transcode error for {name}: {error}")
+                    failed += 1
+                    continue
+
+                VoiceChatMessage.objects.filter(audio_file=name).update(audio_file=target)
+                reclaimed += os.path.getsize(src) - os.path.getsize(dst)
+                default_storage.delete(name)
+                transcoded += 1
+
+    return {'transcoded': transcoded, 'failed': failed, 'bytes': reclaimed}
+
+
+def compact_chat_audio(transcode_after_days=None, retention_days=None, workers=None):
+    """Run the full retention pipeline and report reclaimed bytes"""
+    if transcode_after_days is None:
+        transcode_after_days = settings.CHAT_AUDIO_TRANSCODE_AFTER_DAYS
+    if retention_days is None:
+        retention_days = settings.CHAT_AUDIO_RETENTION_DAYS
+
+    # Purge first so expired clips are never hashed or transcoded
+    report = {
+        'purge': purge_expired_audio(retention_days),
+        'dedup': deduplicate_audio(),
+        'transcode': transcode_audio(transcode_after_days, workers=workers),
+    }
+    report['reclaimed_bytes'] = sum(step['bytes'] for step in report.values())
+    return report
@@ -2,14 +2,18 @@ import os
 import json
 import google.generativeai as genai
 from django.conf import settings
+from safe_traveller.async_http import get_client
 
 # Configure Gemini
 genai.configure(api_key=settings.GOOGLE_API_KEY)
 
-def get_translation_with_context(text, source_lang, target_lang, context="general"):
-    """Get translation with cultural context from Gemini"""
-    
-    prompt = (
+GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/{model}:generateContent"
+TRANSLATION_MODEL = 'models/gemini-2.5-flash'
+CHAT_MODEL = 'gemini-pro'
+CHAT_FALLBACK = "I'm sorry, I'm having trouble responding right now. Please try again."
+
+def _translation_prompt(text, source_lang, target_lang):
+    return (
         "You are a translation assistant specialized in African languages. "
         f"Translate the following sentence from {source_lang} to {target_lang}: "
         f"\"{text}\" "
@@ -17,49 +21,90 @@ def get_translation_with_context(text, source_lang, target_lang, context="genera
         "\"translation\", \"cultural_context\", \"response_suggestion\", \"pronunciation_tip\". "
         "Make the response helpful for a traveler."
     )
+
+def _parse_json_reply(response_text):
+    response_text = response_text.strip()
+    print(f"Raw Gemini response: {response_text}")  # Added debug log
+    if response_text.startswith('```json'):
+        response_text = response_text[7:]
+    if response_text.endswith('```'):
+        response_text = response_text[:-3]
+    return json.loads(response_text)
+
+def _translation_fallback(text):
+    return {
+        "translation": f"Translation: {text}",
+        "cultural_context": "Context not available",
+        "response_suggestion": "Thank you",
+        "pronunciation_tip": "Pronunciation guide not available"
+    }
+
+def _chat_prompt(message, context):
+    return f"""
+    You are a helpful travel assistant. A traveler is asking: "{message}"
+    Context: {context}
+    
+    Provide a helpful, friendly response focused on travel assistance. 
+    Include practical advice, cultural tips, or language help as appropriate.
+    Keep responses concise but informative.
+    """
+
+def get_translation_with_context(text, source_lang, target_lang, context="general"):
+    """Get translation with cultural context from Gemini"""
+    
+    prompt = _translation_prompt(text, source_lang, target_lang)
     
     try:
-        model = genai.GenerativeModel('models/gemini-2.5-flash')
+        model = genai.GenerativeModel(TRANSLATION_MODEL)
         response = model.generate_content(prompt)
-        
-        response_text = response.text.strip()
-        print(f"Raw Gemini response: {response_text}")  # Added debug log
-        if response_text.startswith('```json'):
-            response_text = response_text[7:]
-        if response_text.endswith('```'):
-            response_text = response_text[:-3]
-        
-        return json.loads(response_text)
+        return _parse_json_reply(response.text)
         
     except Exception as e:
         print(f"Translation error: {e}")
-        return {
-            "translation": f"Translation: {text}",
-            "cultural_context": "Context not available",
-            "response_suggestion": "Thank you",
-            "pronunciation_tip": "Pronunciation guide not available"
-        }
+        return _translation_fallback(text)
 
 def chat_with_ai(message, context="general"):
     """Chat with Gemini AI for travel assistance"""
     
-    prompt = f"""
-    You are a helpful travel assistant. A traveler is asking: "{message}"
-    Context: {context}
-    
-    Provide a helpful, friendly response focused on travel assistance. 
-    Include practical advice, cultural tips, or language help as appropriate.
-    Keep responses concise but informative.
-    """
+    prompt = _chat_prompt(message, context)
     
     try:
-        model = genai.GenerativeModel('gemini-pro')
+        model = genai.GenerativeModel(CHAT_MODEL)
         response = model.generate_content(prompt)
         return response.text.strip()
         
     except Exception as e:
         print(f"Chat error: {e}")
-        return "I'm sorry, I'm having trouble responding right now. Please try again."
+        return CHAT_FALLBACK
+
+async def agenerate_text(prompt, model):
+    """Gemini generateContent through the shared async HTTP client"""
+    name = model if model.startswith('models/') else f"models/{model}"
+    response = await get_client().post(
+        GEMINI_API_URL.format(model=name),
+        params={'key': settings.GOOGLE_API_KEY},
+        json={'contents': [{'parts': [{'text': prompt}]}]}
+    )
+    response.raise_for_status()
+    return response.json()['candidates'][0]['content']['parts'][0]['text']
+
+async def aget_translation_with_context(text, source_lang, target_lang, context="general"):
+    """get_translation_with_context for async views"""
+    try:
+        reply = await agenerate_text(_translation_prompt(text, source_lang, target_lang), TRANSLATION_MODEL)
+        return _parse_json_reply(reply)
+    except Exception as e:
+        print(f"Translation error: {e}")
+        return _translation_fallback(text)
+
+async def achat_with_ai(message, context="general"):
+    """chat_with_ai for async views"""
+    try:
+        reply = await agenerate_text(_chat_prompt(message, context), CHAT_MODEL)
+        return reply.strip()
+    except Exception as e:
+        print(f"Chat error: {e}")
+        return CHAT_FALLBACK
 
 def get_language_help(phrase, target_language):
     """Get help with learning phrases in target language"""
@@ -1,24 +1,22 @@
 import requests
 import os
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
+from safe_traveller.async_http import get_client
 
-def generate_speech(text, language='en', voice_id=None):
-    """Generate speech using ElevenLabs API"""
-    
-    if not settings.ELEVENLABS_API_KEY:
-        return None
-    
-    # Default voice IDs for different languages
-    voice_mapping = {
-        'en': 'EXAVITQu4vr4xnSDxMaL',  # Bella
-        'fr': 'XrExE9yKIg1WjnnlVkGX',  # Matilda  
-        'es': 'MF3mGyEYCl7XYWbV9V6O',  # Elli
-    }
-    
+# Default voice IDs for different languages
+VOICE_MAPPING = {
+    'en': 'EXAVITQu4vr4xnSDxMaL',  # Bella
+    'fr': 'XrExE9yKIg1WjnnlVkGX',  # Matilda  
+    'es': 'MF3mGyEYCl7XYWbV9V6O',  # Elli
+}
+
+def _speech_request(text, language, voice_id):
+    """URL, headers and body of an ElevenLabs text-to-speech call"""
     if not voice_id:
-        voice_id = voice_mapping.get(language, voice_mapping['en'])
+        voice_id = VOICE_MAPPING.get(language, VOICE_MAPPING['en'])
     
     url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
     
@@ -36,16 +34,28 @@ def generate_speech(text, language='en', voice_id=None):
             "similarity_boost": 0.5
         }
     }
+    return url, headers, data
+
+def _save_speech(text, content):
+    # Save audio file
+    audio_content = ContentFile(content)
+    filename = f"tts_{hash(text)}.mp3"
+    file_path = default_storage.save(f"audio/{filename}", audio_content)
+    return default_storage.url(file_path)
+
+def generate_speech(text, language='en', voice_id=None):
+    """Generate speech using ElevenLabs API"""
+    
+    if not settings.ELEVENLABS_API_KEY:
+        return None
+    
+    url, headers, data = _speech_request(text, language, voice_id)
     
     try:
         response = requests.post(url, json=data, headers=headers)
         
         if response.status_code == 200:
-            # Save audio file
-            audio_content = ContentFile(response.content)
-            filename = f"tts_{hash(text)}.mp3"
-            file_path = default_storage.save(f"audio/{filename}", audio_content)
-            return default_storage.url(file_path)
+            return _save_speech(text, response.content)
         else:
             print(f"TTS API error: {response.status_code}")
             return None
@@ -54,6 +64,26 @@ def generate_speech(text, language='en', voice_id=None):
         print(f"TTS error: {e}")
         return None
 
+async def agenerate_speech(text, language='en', voice_id=None):
+    """generate_speech for async views"""
+    
+    if not settings.ELEVENLABS_API_KEY:
+        return None
+    
+    url, headers, data = _speech_request(text, language, voice_id)
+    
+    try:
+        response = await get_client().post(url, json=data, headers=headers)
+        
+        if response.status_code == 200:
+            return await sync_to_async(_save_speech)(text, response.content)
+        print(f"TTS API error: {response.status_code}")
+        return None
+    
+    except Exception as e:
+        print(f"TTS error: {e}")
+        return None
+
 def get_available_voices():
     """Get list of available voices from ElevenLabs"""
     
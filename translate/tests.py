@@ -0,0 +1,43 @@
+import tempfile
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from .models import TranslationHistory, VoiceChatMessage, VoiceChatSession
+
+User = get_user_model()
+
+
+@override_settings(WRITE_BEHIND=False)
+class HistoryTests(TransactionTestCase):
+    """The async views' history rows, inserted right away with the write-behind buffer off"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='talker', password='p', mother_tongue='fr')
+
+    @mock.patch('translate.views.aget_translation_with_context', return_value={'translation': 'Bonjour'})
+    async def test_translation_is_saved(self, _translate):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(
+            reverse('translate_text'), {'text': 'Hello', 'target_lang': 'fr'}, content_type='application/json'
+        )
+        self.assertEqual(response.json()['status'], 'success')
+        history = await TranslationHistory.objects.aget(user=self.user)
+        self.assertEqual((history.original_text, history.translated_text), ('Hello', 'Bonjour'))
+
+    @mock.patch('translate.views.achat_with_ai', return_value='Salut')
+    @mock.patch('translate.views.transcribe_audio', return_value={'text': 'Hi', 'language': 'en'})
+    async def test_voice_messages_are_saved(self, _transcribe, _chat):
+        await self.async_client.aforce_login(self.user)
+        await VoiceChatSession.objects.acreate(user=self.user, session_id='voice')
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            response = await self.async_client.post(reverse('process_voice_input'), {
+                'session_id': 'voice', 'audio': SimpleUploadedFile('hi.webm', b'audio'),
+            })
+        self.assertEqual(response.json()['status'], 'success')
+        messages = [
+            (message.message_type, message.text_content)
+            async for message in VoiceChatMessage.objects.filter(session__session_id='voice').order_by('id')
+        ]
+        self.assertEqual(messages, [('user', 'Hi'), ('ai', 'Salut')])
@@ -2,11 +2,15 @@ from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
+import asyncio
 import json
 import uuid
+from safe_traveller.writebehind import aenqueue, enqueue
+from users.models import UserSettings
 from .models import TranslationHistory, VoiceChatSession, VoiceChatMessage
-from .services.gemini_service import get_translation_with_context, chat_with_ai
-from .services.tts_service import generate_speech
+from .services.gemini_service import aget_translation_with_context, achat_with_ai, chat_with_ai
+from .services.tts_service import agenerate_speech
 from .services.speech_service import transcribe_audio
 
 @login_required
@@ -18,34 +22,40 @@ def translate_view(request):
     }
     return render(request, 'translate/translate.html', context)
 
+async def _tts_enabled(user):
+    return bool(
+        await UserSettings.objects.filter(user=user).values_list('tts_enabled', flat=True).afirst()
+    )
+
 @csrf_exempt
 @login_required
-def translate_text(request):
+async def translate_text(request):
     if request.method == 'POST':
+        user = await request.auser()
         data = json.loads(request.body)
         text = data.get('text')
         source_lang = data.get('source_lang', 'auto')
-        target_lang = data.get('target_lang', request.user.mother_tongue)
+        target_lang = data.get('target_lang', user.mother_tongue)
         context = data.get('context', 'general')
         
         try:
-            # Get translation and context from Gemini
-            result = get_translation_with_context(text, source_lang, target_lang, context)
+            # Get translation and context from Gemini, and the user's TTS setting meanwhile
+            result, tts_enabled = await asyncio.gather(
+                aget_translation_with_context(text, source_lang, target_lang, context),
+                _tts_enabled(user)
+            )
+            translation = result.get('translation', '')
             
-            # Save to history
-            TranslationHistory.objects.create(
-                user=request.user,
+            # Save to history, off the request path
+            await aenqueue(TranslationHistory(
+                user=user,
                 source_language=source_lang,
                 target_language=target_lang,
                 original_text=text,
-                translated_text=result.get('translation', ''),
+                translated_text=translation,
                 context=context
-            )
-            
-            # Generate audio if TTS is enabled
-            audio_url = None
-            if hasattr(request.user, 'usersettings') and request.user.usersettings.tts_enabled:
-                audio_url = generate_speech(result.get('translation', ''), target_lang)
+            ))
+            audio_url = await agenerate_speech(translation, target_lang) if tts_enabled else None
             
             return JsonResponse({
                 'status': 'success',
@@ -82,10 +92,16 @@ def start_voice_chat(request):
     
     return JsonResponse({'status': 'error'})
 
+def _store_audio(upload):
+    """Save an uploaded recording now, while the upload is still there; returns its name"""
+    field = VoiceChatMessage._meta.get_field('audio_file')
+    return field.storage.save(field.generate_filename(None, upload.name), upload)
+
 @csrf_exempt
 @login_required
-def process_voice_input(request):
+async def process_voice_input(request):
     if request.method == 'POST':
+        user = await request.auser()
         # Handle audio file upload and processing
         audio_file = request.FILES.get('audio')
         session_id = request.POST.get('session_id')
@@ -94,37 +110,35 @@ def process_voice_input(request):
             return JsonResponse({'status': 'error', 'message': 'Missing audio or session'})
         
         try:
-            session = VoiceChatSession.objects.get(session_id=session_id, user=request.user)
+            session = await VoiceChatSession.objects.aget(session_id=session_id, user=user)
             
-            # Transcribe audio
-            transcription = transcribe_audio(audio_file)
+            # Transcribe audio (speech_recognition blocks, so in a thread)
+            transcription, tts_enabled = await asyncio.gather(
+                sync_to_async(transcribe_audio)(audio_file),
+                _tts_enabled(user)
+            )
             
-            # Save user message
-            user_message = VoiceChatMessage.objects.create(
+            # Store the recording while the AI response is generated; the row itself is written behind
+            audio_name, ai_response = await asyncio.gather(
+                sync_to_async(_store_audio)(audio_file),
+                achat_with_ai(
+                    transcription.get('text', ''), 
+                    context=f"Travel assistant for {user.mother_tongue} speaker"
+                )
+            )
+            await aenqueue(VoiceChatMessage(
                 session=session,
                 message_type='user',
                 text_content=transcription.get('text', ''),
                 language_detected=transcription.get('language', 'unknown'),
-                audio_file=audio_file
-            )
-            
-            # Get AI response
-            ai_response = chat_with_ai(
-                transcription.get('text', ''), 
-                context=f"Travel assistant for {request.user.mother_tongue} speaker"
-            )
-            
-            # Save AI message
-            ai_message = VoiceChatMessage.objects.create(
+                audio_file=audio_name
+            ))
+            await aenqueue(VoiceChatMessage(
                 session=session,
                 message_type='ai',
                 text_content=ai_response
-            )
-            
-            # Generate speech for AI response
-            audio_url = None
-            if hasattr(request.user, 'usersettings') and request.user.usersettings.tts_enabled:
-                audio_url = generate_speech(ai_response, request.user.mother_tongue)
+            ))
+            audio_url = await agenerate_speech(ai_response, user.mother_tongue) if tts_enabled else None
             
             return JsonResponse({
                 'status': 'success',
@@ -161,11 +175,11 @@ def text_chat(request):
             session = VoiceChatSession.objects.get(session_id=session_id, user=request.user)
         
         # Save user message
-        user_message = VoiceChatMessage.objects.create(
+        enqueue(VoiceChatMessage(
             session=session,
             message_type='user',
             text_content=message
-        )
+        ))
         
         # Get AI response
         ai_response = chat_with_ai(
@@ -174,11 +188,11 @@ def text_chat(request):
         )
         
         # Save AI message
-        ai_message = VoiceChatMessage.objects.create(
+        enqueue(VoiceChatMessage(
             session=session,
             message_type='ai',
             text_content=ai_response
-        )
+        ))
         
         return JsonResponse({
             'status': 'success',
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from travels.models import Destination, Travel
+from travels.services.destinations import locate
+
+
+class Command(BaseCommand):
+    help = "Link travels to their canonical Destination, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--all', action='store_true',
+                            help='Re-resolve travels that already have a destination')
+        parser.add_argument('--geocode', action='store_true',
+                            help='Also geocode the destinations, merging spellings of the same place')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        travels = Travel.objects.order_by('id').only('id', 'city', 'country', 'destination_id')
+        if not options['all']:
+            travels = travels.filter(destination__isnull=True)
+
+        # One lookup per spelling, not per travel
+        resolved = {}
+        last_id = 0
+        updated = 0
+        while True:
+            batch = list(travels.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            for travel in batch:
+                spelling = (travel.city, travel.country)
+                if spelling not in resolved:
+                    resolved[spelling] = Destination.for_name(*spelling)
+                travel.destination = resolved[spelling]
+            with transaction.atomic():
+                Travel.objects.bulk_update(batch, ['destination'])
+            updated += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"{updated} travels linked")
+
+        located = 0
+        if options['geocode']:
+            for destination in Destination.objects.filter(latitude__isnull=True).order_by('id'):
+                if locate(destination) is not None:
+                    located += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Linked {updated} travels to {len(set(d.id for d in resolved.values()))} destinations"
+            + (f", geocoded {located}" if options['geocode'] else '')
+        ))
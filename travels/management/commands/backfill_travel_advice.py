@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef
+from travels.models import Travel, TravelAdvice
+from travels.services.advice import replace_advice_rows
+
+
+class Command(BaseCommand):
+    help = "Write TravelAdvice rows from the advice_data of existing travels, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--all', action='store_true',
+                            help='Rewrite travels that already have advice rows')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        travels = (
+            Travel.objects.filter(advice_data__isnull=False)
+            .order_by('id').only('id', 'user_id', 'advice_data')
+        )
+        if not options['all']:
+            travels = travels.exclude(Exists(TravelAdvice.objects.filter(travel=OuterRef('pk'))))
+
+        last_id = 0
+        done = written = 0
+        while True:
+            batch = list(travels.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            written += replace_advice_rows(batch)
+            done += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"{done} travels, {written} tips")
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} tips for {done} travels"))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:38
+
+from django.db import migrations, models
+from maps.services.geo import geohash_encode
+
+
+def backfill_geohash(apps, schema_editor):
+    QuickDestination = apps.get_model('travels', 'QuickDestination')
+    batch = []
+    for obj in QuickDestination.objects.only('id', 'latitude', 'longitude').iterator(chunk_size=1000):
+        obj.geohash = geohash_encode(obj.latitude, obj.longitude)
+        batch.append(obj)
+        if len(batch) >= 1000:
+            QuickDestination.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    if batch:
+        QuickDestination.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travels', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quickdestination',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, max_length=12),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
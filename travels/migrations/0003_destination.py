@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travels', '0002_quickdestination_geohash'),
+    ]
+
+    # Schema only: existing travels are linked, and geocoded, by the backfill_destinations command
+    operations = [
+        migrations.CreateModel(
+            name='Destination',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=100)),
+                ('country', models.CharField(max_length=100)),
+                ('key', models.CharField(max_length=210, unique=True)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('geocoded_at', models.DateTimeField(blank=True, null=True)),
+                ('advice_data', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='travel',
+            name='destination',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='travels.destination'),
+        ),
+        migrations.CreateModel(
+            name='DestinationAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=210, unique=True)),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='travels.destination')),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def keep_latest_active(apps, schema_editor):
+    """Leave each user with only their most recently updated active travel"""
+    Travel = apps.get_model('travels', 'Travel')
+    seen = set()
+    stale = []
+    for travel_id, user_id in (
+        Travel.objects.filter(is_active=True).order_by('user_id', '-updated_at', '-id')
+        .values_list('id', 'user_id').iterator()
+    ):
+        if user_id in seen:
+            stale.append(travel_id)
+        seen.add(user_id)
+    Travel.objects.filter(id__in=stale).update(is_active=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travels', '0004_travel_user_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_latest_active, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='travel',
+            index=models.Index(fields=['user', 'is_active'], name='travel_user_active_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='travel',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('user',), name='one_active_travel_per_user'),
+        ),
+    ]
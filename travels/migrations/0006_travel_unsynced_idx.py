@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travels', '0005_one_active_travel'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='travel',
+            index=models.Index(fields=['is_synced', 'updated_at'], name='travel_unsynced_idx'),
+        ),
+    ]
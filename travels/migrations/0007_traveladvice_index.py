@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travels', '0006_travel_unsynced_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='traveladvice',
+            index=models.Index(fields=['travel', 'advice_type', 'priority'], name='advice_travel_type_prio_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+# Geohash ranges are compared in byte order; see maps.services.nearby.geohash_filter
+POSTGRESQL_INDEX = 'CREATE INDEX IF NOT EXISTS quickdestination_geohash_c_idx ON travels_quickdestination ((geohash COLLATE "C"))'
+POSTGRESQL_DROP = 'DROP INDEX IF EXISTS quickdestination_geohash_c_idx'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(POSTGRESQL_INDEX)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(POSTGRESQL_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travels', '0008_travel_deleted_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -2,9 +2,56 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 import json
+from maps.services.geo import geohash_encode
+from maps.services.poi_index import normalize_text
 
 User = get_user_model()
 
+def destination_key(city, country):
+    """Casefolded, accent-stripped 'city|country' so 'Marrakech ,MOROCCO' and 'marrakech,Morocco' match"""
+    return '|'.join(' '.join(normalize_text(part).split()) for part in (city or '', country or ''))
+
+class Destination(models.Model):
+    """A city as a place, shared by every travel going there"""
+    city = models.CharField(max_length=100)
+    country = models.CharField(max_length=100)
+    key = models.CharField(max_length=210, unique=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geocoded_at = models.DateTimeField(null=True, blank=True)
+    # Generated advice per travel type
+    advice_data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.city}, {self.country}"
+    
+    @classmethod
+    def for_name(cls, city, country):
+        """The destination a city/country spelling points to, created on first sight"""
+        key = destination_key(city, country)
+        alias = DestinationAlias.objects.select_related('destination').filter(key=key).first()
+        if alias:
+            return alias.destination
+        destination, _ = cls.objects.get_or_create(
+            key=key, defaults={'city': (city or '').strip(), 'country': (country or '').strip()}
+        )
+        DestinationAlias.objects.get_or_create(key=key, defaults={'destination': destination})
+        return destination
+
+class DestinationAlias(models.Model):
+    """Every normalized spelling of a destination, its own key included"""
+    key = models.CharField(max_length=210, unique=True)
+    destination = models.ForeignKey(Destination, on_delete=models.CASCADE, related_name='aliases')
+    
+    def __str__(self):
+        return f"{self.key} -> {self.destination}"
+
+class TravelManager(models.Manager):
+    """Travels not deleted; Travel.all_objects also has those waiting to be purged"""
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
 class Travel(models.Model):
     TRAVEL_TYPES = [
         ('business', 'Business'),
@@ -23,16 +70,58 @@ class Travel(models.Model):
     objectives = models.TextField(blank=True)
     is_active = models.BooleanField(default=False)
     advice_data = models.JSONField(null=True, blank=True)
+    destination = models.ForeignKey(Destination, on_delete=models.SET_NULL, null=True, blank=True)
     is_synced = models.BooleanField(default=False)
+    # Set by soft_delete_travel; the purge_deleted command removes the rows
+    deleted_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = TravelManager()
+    all_objects = models.Manager()
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of a user's travel list
+            models.Index(fields=['user', '-created_at', '-id'], name='travel_user_created_idx'),
+            models.Index(fields=['user', 'is_active'], name='travel_user_active_idx'),
+            # Rows waiting for replication, oldest first
+            models.Index(fields=['is_synced', 'updated_at'], name='travel_unsynced_idx'),
+            models.Index(fields=['deleted_at'], condition=models.Q(deleted_at__isnull=False),
+                         name='travel_deleted_idx'),
+        ]
+        constraints = [
+            # Changed only through travels.services.activation.activate_travel
+            models.UniqueConstraint(fields=['user'], condition=models.Q(is_active=True),
+                                    name='one_active_travel_per_user'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.city}, {self.country}"
     
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding:
+            # is_active and deleted_at are left to activate_travel and soft_delete_travel,
+            # so a stale copy can't undo a swap or bring a deleted travel back
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ('is_active', 'deleted_at')
+                and field.attname not in deferred
+            ]
+            kwargs['update_fields'] = update_fields
+        if update_fields is None or {'city', 'country'} & set(update_fields):
+            self.destination = Destination.for_name(self.city, self.country)
+            if update_fields is not None:
+                kwargs['update_fields'] = update_fields = set(update_fields) | {'destination'}
+        # Changed since the last replication
+        self.is_synced = False
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'is_synced', 'updated_at'}
+        super().save(*args, **kwargs)
+    
     def days_elapsed(self):
         return (timezone.now().date() - self.start_date).days
     
@@ -59,10 +148,15 @@ class QuickDestination(models.Model):
     latitude = models.FloatField()
     longitude = models.FloatField()
     visited = models.BooleanField(default=False)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"{self.name} ({self.category})"
+    
+    def save(self, *args, **kwargs):
+        self.geohash = geohash_encode(self.latitude, self.longitude)
+        super().save(*args, **kwargs)
 
 class TravelAdvice(models.Model):
     travel = models.ForeignKey(Travel, on_delete=models.CASCADE)
@@ -75,6 +169,9 @@ class TravelAdvice(models.Model):
     
     class Meta:
         ordering = ['priority', '-created_at']
+        indexes = [
+            models.Index(fields=['travel', 'advice_type', 'priority'], name='advice_travel_type_prio_idx'),
+        ]
     
     def __str__(self):
         return f"{self.advice_type}: {self.content[:50]}"
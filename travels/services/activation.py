@@ -0,0 +1,43 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Exists
+from django.utils import timezone
+from travels.models import Travel
+from sync.changes import record
+from users.cache import bump_user_cache_version
+
+# Swaps racing other swaps of the same user retry this many times
+SWAP_ATTEMPTS = 3
+
+def activate_travel(user, travel_id, replace=True):
+    """Make a travel the user's one active travel; False if it isn't theirs
+
+    With replace=False the travel only becomes active when no other one is. The
+    one_active_travel_per_user index keeps concurrent swaps from leaving two active
+    travels: the losing swap fails on it and retries against the winner's result.
+    """
+    for attempt in range(SWAP_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                changes = {'is_active': True, 'is_synced': False, 'updated_at': timezone.now()}
+                mine = Travel.objects.filter(user=user)
+                target = mine.filter(id=travel_id)
+                if replace:
+                    # Deactivate first: the unique index is checked row by row
+                    mine.filter(is_active=True).exclude(id=travel_id).update(**{**changes, 'is_active': False})
+                else:
+                    target = target.exclude(Exists(mine.filter(is_active=True)))
+                activated = target.update(**changes)
+                if not activated:
+                    # Not the user's travel, or another one is active and may stay
+                    transaction.set_rollback(True)
+                    return False
+                # update() sends no signals: log both flipped travels for the app's sync
+                record(user.pk, 'travels', mine.filter(updated_at=changes['updated_at']).values_list('id', flat=True))
+                bump_user_cache_version(user.pk)
+                return True
+        except IntegrityError:
+            # Another request activated a travel between our two statements
+            if not replace:
+                return False
+            if attempt == SWAP_ATTEMPTS - 1:
+                raise
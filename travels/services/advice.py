@@ -0,0 +1,65 @@
+from django.db import transaction
+from search.index import index_objects
+from travels.models import TravelAdvice
+from users.cache import bump_user_cache_version
+
+ADVICE_TYPES = [advice_type for advice_type, _ in TravelAdvice._meta.get_field('advice_type').choices]
+
+def _tips(value):
+    # 'bonus' is a single string, the others lists
+    if isinstance(value, str):
+        return [value] if value.strip() else []
+    if isinstance(value, list):
+        return [tip for tip in value if isinstance(tip, str) and tip.strip()]
+    return []
+
+def advice_rows(travel_id, advice):
+    """TravelAdvice rows for an advice dict, prioritized in the order Gemini gave them"""
+    if not isinstance(advice, dict):
+        return []
+    return [
+        TravelAdvice(travel_id=travel_id, advice_type=advice_type, content=tip, priority=priority)
+        for advice_type in ADVICE_TYPES
+        for priority, tip in enumerate(_tips(advice.get(advice_type)), start=1)
+    ]
+
+def replace_advice_rows(travels):
+    """Rewrite the TravelAdvice rows of travels from their advice_data, in bulk; returns how many"""
+    owners = {travel.id: travel.user_id for travel in travels}
+    rows = [row for travel in travels for row in advice_rows(travel.id, travel.advice_data)]
+    with transaction.atomic():
+        TravelAdvice.objects.filter(travel__in=list(owners)).delete()
+        rows = TravelAdvice.objects.bulk_create(rows)
+        # bulk_create sends no signals to the search index or the page caches
+        index_objects('advice', [(row, owners[row.travel_id]) for row in rows])
+        for user_id in set(owners.values()):
+            bump_user_cache_version(user_id)
+    return len(rows)
+
+def save_travel_advice(travel, advice):
+    """Store newly generated advice: the JSON on the travel, and one TravelAdvice row per tip"""
+    with transaction.atomic():
+        travel.advice_data = advice
+        travel.save()
+        replace_advice_rows([travel])
+
+def top_advice(travel_id, advice_type, limit):
+    """The first tips of one type, read from the (travel, advice_type, priority) index"""
+    return list(
+        TravelAdvice.objects.filter(travel_id=travel_id, advice_type=advice_type)
+        .order_by('priority').values_list('content', flat=True)[:limit]
+    )
+
+def advice_by_type(travel_id):
+    """All tips of a travel shaped like advice_data; None if it has no rows"""
+    rows = (
+        TravelAdvice.objects.filter(travel_id=travel_id)
+        .order_by('advice_type', 'priority').values_list('advice_type', 'content')
+    )
+    advice = {}
+    for advice_type, content in rows:
+        advice.setdefault(advice_type, []).append(content)
+    if not advice:
+        return None
+    advice['bonus'] = ' '.join(advice.get('bonus', []))
+    return advice
@@ -0,0 +1,39 @@
+from django.db import transaction
+from django.utils import timezone
+from search.index import unindex_object, unindex_objects
+from sync.changes import record
+from travels.models import QuickDestination, Travel, TravelAdvice
+from users.cache import bump_user_cache_version
+from users.models import UserStats
+from .activation import activate_travel
+
+def soft_delete_travel(travel):
+    """Hide a travel at once and leave its rows to purge_deleted; returns the travel made active instead, if any
+
+    Deleting the travel's destinations, advice, weather and trail can take a
+    while for a long trip, so none of that happens in the request. What the
+    delete signals would have done is done here.
+    """
+    user_id = travel.user_id
+    with transaction.atomic():
+        now = timezone.now()
+        updated = Travel.objects.filter(id=travel.id).update(
+            deleted_at=now, is_active=False, is_synced=False, updated_at=now
+        )
+        if not updated:
+            return None
+        
+        UserStats.add(user_id, 'travel_count', -1)
+        record(user_id, 'travels', [travel.id], deleted=True)
+        record(user_id, 'destinations', QuickDestination.objects.filter(travel=travel).values_list('id', flat=True),
+               deleted=True)
+        unindex_object('travels', travel.id)
+        unindex_objects('advice', TravelAdvice.objects.filter(travel=travel).values_list('id', flat=True))
+        
+        next_travel = None
+        if travel.is_active:
+            next_travel = Travel.objects.filter(user_id=user_id).first()
+            if next_travel:
+                activate_travel(travel.user, next_travel.id)
+        bump_user_cache_version(user_id)
+    return next_travel
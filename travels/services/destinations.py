@@ -0,0 +1,104 @@
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from maps.services.geo import box_around, haversine
+from travels.models import Destination, DestinationAlias, Travel
+from .gemini_service import default_travel_advice, request_travel_advice
+
+# Names OpenWeather could not place are retried after this long
+GEOCODE_RETRY_SECONDS = 24 * 3600
+# Spellings geocoded this close together are the same destination
+SAME_PLACE_M = 2000
+REQUEST_TIMEOUT = 5
+
+def _geocode(city, country):
+    """(lat, lng) from OpenWeather's geocoder, None if unknown; raises on transient failures"""
+    response = requests.get(
+        "http://api.openweathermap.org/geo/1.0/direct",
+        params={'q': f"{city},{country}", 'limit': 1, 'appid': settings.OPENWEATHER_API_KEY},
+        timeout=REQUEST_TIMEOUT
+    )
+    response.raise_for_status()
+    results = response.json()
+    return (results[0]['lat'], results[0]['lon']) if results else None
+
+def merge_destinations(source, target):
+    """Fold source into target: its aliases, travels and advice move over"""
+    with transaction.atomic():
+        # Locked in id order; advice stored by get_travel_advice meanwhile isn't lost
+        locked = Destination.objects.select_for_update().order_by('id').in_bulk([source.id, target.id])
+        if source.id not in locked or target.id not in locked:
+            # Merged by another request already
+            return target
+        source, target = locked[source.id], locked[target.id]
+        DestinationAlias.objects.filter(destination=source).update(destination=target)
+        Travel.objects.filter(destination=source).update(destination=target)
+        advice = {**source.advice_data, **target.advice_data}
+        if advice != target.advice_data:
+            target.advice_data = advice
+            target.save(update_fields=['advice_data'])
+        source.delete()
+    return target
+
+def locate(destination):
+    """(lat, lng) of a destination, geocoded once; None if it can't be placed
+
+    A spelling that lands on a known destination becomes an alias of it.
+    """
+    if destination.latitude is not None:
+        return destination.latitude, destination.longitude
+    if destination.geocoded_at and (
+        (timezone.now() - destination.geocoded_at).total_seconds() < GEOCODE_RETRY_SECONDS
+    ):
+        return None
+    
+    try:
+        location = _geocode(destination.city, destination.country)
+    except (requests.RequestException, ValueError, KeyError) as e:
+        # Transient failure: don't remember it
+        print(f"Geocoding error: {e}")
+        return None
+    
+    destination.geocoded_at = timezone.now()
+    if location is None:
+        destination.save(update_fields=['geocoded_at'])
+        return None
+    
+    lat, lng = location
+    south, west, north, east = box_around(lat, lng, SAME_PLACE_M)
+    nearby = Destination.objects.filter(
+        latitude__range=(south, north), longitude__range=(west, east)
+    ).exclude(id=destination.id).order_by('id')
+    for other in nearby:
+        if haversine(lat, lng, other.latitude, other.longitude) <= SAME_PLACE_M:
+            merge_destinations(destination, other)
+            return other.latitude, other.longitude
+    
+    destination.latitude, destination.longitude = lat, lng
+    destination.save(update_fields=['latitude', 'longitude', 'geocoded_at'])
+    return lat, lng
+
+def get_travel_advice(travel, refresh=False):
+    """Advice for a travel, generated once per destination and travel type"""
+    # Read it fresh: another travel to the same place may have just filled it in
+    destination = (
+        Destination.objects.filter(id=travel.destination_id).first()
+        or Destination.for_name(travel.city, travel.country)
+    )
+    if not refresh and travel.travel_type in destination.advice_data:
+        return destination.advice_data[travel.travel_type]
+    
+    try:
+        advice = request_travel_advice(destination.city, destination.country, travel.travel_type)
+    except Exception as e:
+        print(f"Error generating advice: {e}")
+        return default_travel_advice(destination.city, travel.travel_type)
+    
+    # Merged into the row as it is now: another travel type may have been stored meanwhile
+    with transaction.atomic():
+        locked = Destination.objects.select_for_update().filter(id=destination.id).first()
+        if locked is not None:
+            locked.advice_data[travel.travel_type] = advice
+            locked.save(update_fields=['advice_data'])
+    return advice
@@ -6,8 +6,8 @@ from django.conf import settings
 # Configure Gemini
 genai.configure(api_key=settings.GOOGLE_API_KEY)
 
-def generate_travel_advice(city, country, travel_type):
-    """Generate travel advice using Gemini AI"""
+def request_travel_advice(city, country, travel_type):
+    """Ask Gemini for travel advice; raises if there is no usable answer"""
     
     prompt = f"""
     You are a cultural travel expert. A traveler is planning a {travel_type} trip to {city}, {country}.
@@ -35,36 +35,42 @@ def generate_travel_advice(city, country, travel_type):
     - Appropriate for a {travel_type} trip
     """
     
+    model = genai.GenerativeModel('gemini-pro')
+    response = model.generate_content(prompt)
+    
+    # Clean the response text to extract JSON
+    response_text = response.text.strip()
+    if response_text.startswith('```json'):
+        response_text = response_text[7:]
+    if response_text.endswith('```'):
+        response_text = response_text[:-3]
+    
+    return json.loads(response_text)
+
+def default_travel_advice(city, travel_type):
+    """Generic advice for when Gemini is unavailable"""
+    return {
+        "do": [
+            "Research local customs and traditions",
+            "Learn basic greetings in the local language",
+            "Respect local dress codes and cultural norms"
+        ],
+        "dont": [
+            "Assume your cultural norms apply everywhere",
+            "Take photos without permission",
+            "Ignore local laws and regulations"
+        ],
+        "bonus": f"For {travel_type} trips to {city}, consider connecting with local professionals or communities."
+    }
+
+def generate_travel_advice(city, country, travel_type):
+    """Generate travel advice using Gemini AI"""
     try:
-        model = genai.GenerativeModel('gemini-pro')
-        response = model.generate_content(prompt)
-        
-        # Clean the response text to extract JSON
-        response_text = response.text.strip()
-        if response_text.startswith('```json'):
-            response_text = response_text[7:]
-        if response_text.endswith('```'):
-            response_text = response_text[:-3]
-        
-        advice_data = json.loads(response_text)
-        return advice_data
-        
+        return request_travel_advice(city, country, travel_type)
     except Exception as e:
         print(f"Error generating advice: {e}")
         # Return default advice structure
-        return {
-            "do": [
-                "Research local customs and traditions",
-                "Learn basic greetings in the local language",
-                "Respect local dress codes and cultural norms"
-            ],
-            "dont": [
-                "Assume your cultural norms apply everywhere",
-                "Take photos without permission",
-                "Ignore local laws and regulations"
-            ],
-            "bonus": f"For {travel_type} trips to {city}, consider connecting with local professionals or communities."
-        }
+        return default_travel_advice(city, travel_type)
 
 def get_translation_advice(text, source_lang, target_lang, context="general"):
     """Get translation and cultural context from Gemini"""
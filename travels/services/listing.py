@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db.models import Count, DateField, DurationField, ExpressionWrapper, F, Q, Subquery, Value
+from django.utils import timezone
+from travels.models import Travel
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# The columns a list card shows; advice_data and objectives stay in the database
+CARD_FIELDS = ('id', 'name', 'city', 'country', 'travel_type', 'start_date', 'is_active', 'created_at')
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+def encode_cursor(travel):
+    """Opaque position after a travel in (-created_at, -id) order"""
+    return f"{(travel.created_at - EPOCH) // timedelta(microseconds=1)}.{travel.id}"
+
+def decode_cursor(cursor):
+    """(created_at, id) of a cursor; raises ValueError if it isn't one"""
+    micros, travel_id = (int(part) for part in cursor.split('.'))
+    return EPOCH + timedelta(microseconds=micros), travel_id
+
+def _elapsed(start_date):
+    # Date subtraction runs in the database; the result comes back as a timedelta
+    today = Value(timezone.now().date(), output_field=DateField())
+    return ExpressionWrapper(today - start_date, output_field=DurationField())
+
+def travel_page(user, cursor=None, limit=PAGE_SIZE):
+    """One page of a user's travels, newest first, in a single query
+
+    Only the first page carries the travel count and the active travel, fetched by
+    subqueries of the same statement. Returns a dict with the travels (model
+    instances with card fields and an `elapsed` timedelta), next_cursor (None on
+    the last page), and total_travels/active_travel on the first page.
+    """
+    travels = (
+        Travel.objects.filter(user=user)
+        .only(*CARD_FIELDS)
+        .annotate(elapsed=_elapsed(F('start_date')))
+        .order_by('-created_at', '-id')
+    )
+
+    if cursor:
+        created_at, travel_id = decode_cursor(cursor)
+        # The plain bound lets the (user, created_at, id) index start at the cursor
+        travels = travels.filter(created_at__lte=created_at).filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=travel_id)
+        )
+    else:
+        mine = Travel.objects.filter(user=user)
+        active = mine.filter(is_active=True).order_by('-created_at')
+        travels = travels.annotate(
+            total_travels=Subquery(mine.order_by().values('user').annotate(n=Count('id')).values('n')),
+            active_id=Subquery(active.values('id')[:1]),
+            active_name=Subquery(active.values('name')[:1]),
+            active_city=Subquery(active.values('city')[:1]),
+            active_country=Subquery(active.values('country')[:1]),
+            active_elapsed=_elapsed(Subquery(active.values('start_date')[:1])),
+        )
+
+    rows = list(travels[:limit + 1])
+    page = {
+        'travels': rows[:limit],
+        'next_cursor': encode_cursor(rows[limit - 1]) if len(rows) > limit else None,
+    }
+
+    if not cursor:
+        first = rows[0] if rows else None
+        page['total_travels'] = first.total_travels if first else 0
+        page['active_travel'] = first and first.active_id and {
+            'id': first.active_id,
+            'name': first.active_name,
+            'city': first.active_city,
+            'country': first.active_country,
+            'days_elapsed': first.active_elapsed.days,
+        }
+    return page
+
+def travel_card(travel):
+    """JSON form of a travel from travel_page"""
+    return {
+        'id': travel.id,
+        'name': travel.name,
+        'city': travel.city,
+        'country': travel.country,
+        'travel_type': travel.travel_type,
+        'travel_type_display': travel.get_travel_type_display(),
+        'start_date': travel.start_date.isoformat(),
+        'days_elapsed': travel.elapsed.days,
+        'is_active': travel.is_active,
+    }
@@ -0,0 +1,232 @@
+import codecs
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.forms import modelform_factory
+from maps.services.geo import geohash_encode
+from search.index import index_objects
+from sync.changes import record
+from users.cache import bump_user_cache_version
+from users.models import UserStats
+from travels.forms import TravelForm
+from travels.models import Destination, QuickDestination, Travel, TravelAdvice, destination_key
+from .activation import activate_travel
+from .advice import replace_advice_rows
+
+EXPORT_CHUNK_SIZE = 500
+IMPORT_CHUNK_SIZE = 200
+# Rows past this are left unread; split bigger imports
+MAX_IMPORT_ROWS = 10000
+
+EXPORT_KINDS = ('travels', 'destinations', 'advice')
+TRAVEL_FIELDS = (
+    'id', 'name', 'country', 'city', 'travel_type', 'start_date', 'residence',
+    'objectives', 'is_active', 'created_at',
+)
+DESTINATION_FIELDS = ('id', 'travel_id', 'category', 'name', 'address', 'latitude', 'longitude', 'visited')
+ADVICE_FIELDS = ('travel_id', 'advice_type', 'priority', 'content')
+
+DestinationForm = modelform_factory(
+    QuickDestination, fields=['category', 'name', 'address', 'latitude', 'longitude', 'visited']
+)
+
+class ImportFileError(Exception):
+    """An import file that can't be read at all, as opposed to bad rows in it"""
+
+def _chunks(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """Lists of value dicts in id order, one keyset query per chunk"""
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id).order_by('id').values(*fields)[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]['id']
+
+def _user_rows(user, kind):
+    if kind == 'travels':
+        return Travel.objects.filter(user=user), TRAVEL_FIELDS
+    if kind == 'destinations':
+        return QuickDestination.objects.filter(travel__user=user, travel__deleted_at__isnull=True), DESTINATION_FIELDS
+    return TravelAdvice.objects.filter(travel__user=user, travel__deleted_at__isnull=True), ('id', *ADVICE_FIELDS)
+
+def export_ndjson(user):
+    """One JSON line per travel of the user, with its advice and destinations nested"""
+    for travels in _chunks(Travel.objects.filter(user=user), (*TRAVEL_FIELDS, 'advice_data')):
+        destinations = {}
+        for destination in (QuickDestination.objects.filter(travel_id__in=[travel['id'] for travel in travels])
+                            .order_by('id').values(*DESTINATION_FIELDS)):
+            destinations.setdefault(destination.pop('travel_id'), []).append(destination)
+        
+        lines = []
+        for travel in travels:
+            travel['advice'] = travel.pop('advice_data')
+            travel['destinations'] = destinations.get(travel['id'], [])
+            lines.append(json.dumps(travel, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+        yield ''.join(lines)
+
+class _Echo:
+    """csv.writer target that hands each row back instead of buffering it"""
+    def write(self, value):
+        return value
+
+def export_csv(user, kind):
+    """The user's travels, destinations or advice tips as CSV, a header line first"""
+    queryset, fields = _user_rows(user, kind)
+    fields = [field for field in fields if kind != 'advice' or field != 'id']
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for rows in _chunks(queryset, ('id', *fields)):
+        yield ''.join(writer.writerow([row[field] for field in fields]) for row in rows)
+
+def read_rows(lines, file_format):
+    """(line number, row dict or None, error) for each row of an NDJSON or CSV byte stream"""
+    text = codecs.iterdecode(lines, 'utf-8-sig')
+    try:
+        if file_format == 'csv':
+            reader = csv.DictReader(text)
+            for row in reader:
+                yield reader.line_num, row, None
+            return
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield number, None, 'Invalid JSON'
+                continue
+            if isinstance(row, dict):
+                yield number, row, None
+            else:
+                yield number, None, 'Expected a JSON object'
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ImportFileError(f"Unreadable file: {e}")
+
+def _errors(form):
+    return {field: list(messages) for field, messages in form.errors.items()}
+
+def _destination(row):
+    """(unsaved QuickDestination, errors) for a destination row"""
+    form = DestinationForm(data=row)
+    if form.is_valid():
+        destination = form.save(commit=False)
+        if not (-90 <= destination.latitude <= 90 and -180 <= destination.longitude <= 180):
+            form.add_error(None, 'Coordinates out of range')
+    if not form.is_valid():
+        return None, _errors(form)
+    destination.geohash = geohash_encode(destination.latitude, destination.longitude)
+    return destination, {}
+
+def _travel(row):
+    """(unsaved Travel, its unsaved destinations, errors) for a travel row"""
+    form = TravelForm(data=row)
+    errors = _errors(form) if not form.is_valid() else {}
+    advice = row.get('advice')
+    if advice is not None and not isinstance(advice, dict):
+        errors['advice'] = ['Expected an object']
+    nested = row.get('destinations') or []
+    if not isinstance(nested, list):
+        errors['destinations'] = ['Expected a list']
+        nested = []
+    
+    destinations = []
+    for index, destination_row in enumerate(nested):
+        destination, destination_errors = _destination(destination_row if isinstance(destination_row, dict) else {})
+        destinations.append(destination)
+        errors.update({f"destinations.{index}.{field}": messages for field, messages in destination_errors.items()})
+    if errors:
+        return None, [], errors
+    
+    travel = form.save(commit=False)
+    travel.advice_data = advice or None
+    return travel, destinations, {}
+
+def _write_chunk(user, travels, destinations, destinations_cache):
+    """Insert one chunk of validated rows with the side effects their signals would have had"""
+    for travel in travels:
+        travel.user = user
+        key = destination_key(travel.city, travel.country)
+        if key not in destinations_cache:
+            destinations_cache[key] = Destination.for_name(travel.city, travel.country)
+        travel.destination = destinations_cache[key]
+    
+    with transaction.atomic():
+        # Nested destinations take their travel's new id from destination.travel
+        travels = Travel.objects.bulk_create(travels)
+        destinations = QuickDestination.objects.bulk_create(destinations)
+        
+        replace_advice_rows([travel for travel in travels if travel.advice_data])
+        if travels:
+            UserStats.add(user.pk, 'travel_count', len(travels))
+        record(user.pk, 'travels', [travel.id for travel in travels])
+        record(user.pk, 'destinations', [destination.id for destination in destinations])
+        index_objects('travels', [(travel, user.pk) for travel in travels])
+        bump_user_cache_version(user.pk)
+    return travels, destinations
+
+def import_rows(user, rows, kind='travels'):
+    """Validate and insert rows from read_rows in chunks, yielding progress after each chunk
+    
+    Travel rows may nest their destinations; destination rows name an existing
+    travel_id of the user. Valid rows of a chunk are written even when others
+    in it fail; each progress dict lists the failed rows by line. The last dict
+    has status done and the totals.
+    """
+    travel_ids = set(Travel.objects.filter(user=user).values_list('id', flat=True)) if kind == 'destinations' else set()
+    destinations_cache = {}
+    processed = imported = failed = 0
+    first_travel_id = None
+    travels, destinations, errors = [], [], []
+    
+    def flush():
+        nonlocal imported, first_travel_id
+        written_travels, written_destinations = _write_chunk(user, travels, destinations, destinations_cache)
+        imported += len(written_travels) if kind == 'travels' else len(written_destinations)
+        if first_travel_id is None and written_travels:
+            first_travel_id = written_travels[0].id
+        progress = {'status': 'progress', 'processed': processed, 'imported': imported, 'errors': list(errors)}
+        travels.clear()
+        destinations.clear()
+        errors.clear()
+        return progress
+    
+    for line, row, error in rows:
+        if processed >= MAX_IMPORT_ROWS:
+            errors.append({'line': line, 'errors': {'__all__': [f'Only {MAX_IMPORT_ROWS} rows are read per import']}})
+            break
+        processed += 1
+        
+        if error:
+            row_errors = {'__all__': [error]}
+        elif kind == 'travels':
+            travel, nested, row_errors = _travel(row)
+            if travel:
+                travels.append(travel)
+                for destination in nested:
+                    destination.travel = travel
+                    destinations.append(destination)
+        else:
+            destination, row_errors = _destination(row)
+            try:
+                travel_id = int(row.get('travel_id') or 0)
+            except (TypeError, ValueError):
+                travel_id = 0
+            if travel_id not in travel_ids:
+                row_errors['travel_id'] = ['No such travel']
+            elif destination:
+                destination.travel_id = travel_id
+                destinations.append(destination)
+        if row_errors:
+            failed += 1
+            errors.append({'line': line, 'errors': row_errors})
+        
+        if len(travels) + len(destinations) >= IMPORT_CHUNK_SIZE or len(errors) >= IMPORT_CHUNK_SIZE:
+            yield flush()
+    
+    yield flush()
+    # Like travel_new: the first travel becomes active if none is
+    if first_travel_id is not None:
+        activate_travel(user, first_travel_id, replace=False)
+    yield {'status': 'done', 'processed': processed, 'imported': imported, 'failed': failed}
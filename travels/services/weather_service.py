@@ -1,57 +1,145 @@
+import math
 import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.utils import timezone
+from home.models import WeatherCache
+from travels.models import Destination
+from safe_traveller.async_http import get_client
+from .destinations import locate
 
-def get_weather_data(city, country):
-    """Get weather data from OpenWeatherMap"""
+# Weather is shared by everyone inside a cell of this many degrees (about 28 km)
+WEATHER_GRID_DEG = 0.25
+WEATHER_CACHE_SECONDS = 30 * 60
+REQUEST_TIMEOUT = 5
+
+WEATHER_URL = "http://api.openweathermap.org/data/2.5/weather"
+
+NO_KEY_WEATHER = {
+    'temperature': 25,
+    'humidity': 60,
+    'description': 'Clear sky',
+    'uv_index': 5,
+    'advice': 'Weather data not available'
+}
+
+DEFAULT_WEATHER = {
+    'temperature': 25,
+    'humidity': 60,
+    'description': 'Pleasant weather',
+    'uv_index': 5,
+    'advice': 'Perfect weather for exploring!'
+}
+
+def weather_cell(lat, lng):
+    """Grid cell id and its center for a coordinate"""
+    row = math.floor(lat / WEATHER_GRID_DEG)
+    col = math.floor((lng + 180) % 360 / WEATHER_GRID_DEG)
+    center = ((row + 0.5) * WEATHER_GRID_DEG, (col + 0.5) * WEATHER_GRID_DEG - 180)
+    return f"{WEATHER_GRID_DEG}:{row}:{col}", center
+
+def _weather_dict(cached):
+    return {
+        'temperature': cached.temperature,
+        'humidity': cached.humidity,
+        'description': cached.description,
+        'uv_index': cached.uv_index,
+        'advice': generate_weather_advice(cached.temperature, cached.humidity, cached.description)
+    }
+
+def _weather_location(city, country, lat, lng):
+    """Weather cell and its center for a coordinate or a destination, None if it can't be placed"""
+    if lat is None or lng is None:
+        if not (city or '').strip() and not (country or '').strip():
+            # Nothing to look up; for_name would file a destination under an empty key
+            return None
+        location = locate(Destination.for_name(city, country))
+        if location is None:
+            return None
+        lat, lng = location
+    return weather_cell(float(lat), float(lng))
+
+def _is_fresh(cached):
+    return cached is not None and (timezone.now() - cached.cached_at).total_seconds() < WEATHER_CACHE_SECONDS
+
+def _weather_params(center):
+    # Current weather at the cell center, so every request in the cell sees the same data
+    return {
+        'lat': center[0],
+        'lon': center[1],
+        'appid': settings.OPENWEATHER_API_KEY,
+        'units': 'metric'
+    }
+
+def _store_weather(cell, center, data):
+    cached, _ = WeatherCache.objects.update_or_create(cell=cell, defaults={
+        'latitude': center[0],
+        'longitude': center[1],
+        'temperature': data['main']['temp'],
+        'humidity': data['main']['humidity'],
+        'description': data['weather'][0]['description'].title(),
+        'uv_index': 5,  # Default value
+    })
+    return cached
+
+def get_weather_data(city=None, country=None, lat=None, lng=None):
+    """Get weather data from OpenWeatherMap for a coordinate, or for a destination's"""
     
     if not settings.OPENWEATHER_API_KEY:
-        return {
-            'temperature': 25,
-            'humidity': 60,
-            'description': 'Clear sky',
-            'uv_index': 5,
-            'advice': 'Weather data not available'
-        }
+        return dict(NO_KEY_WEATHER)
+    
+    location = _weather_location(city, country, lat, lng)
+    if location is None:
+        return dict(DEFAULT_WEATHER)
+    cell, center = location
+    
+    cached = WeatherCache.objects.filter(cell=cell).first()
+    if _is_fresh(cached):
+        return _weather_dict(cached)
     
     try:
-        # Current weather
-        url = f"http://api.openweathermap.org/data/2.5/weather"
-        params = {
-            'q': f"{city},{country}",
-            'appid': settings.OPENWEATHER_API_KEY,
-            'units': 'metric'
-        }
-        
-        response = requests.get(url, params=params)
-        data = response.json()
-        
+        response = requests.get(WEATHER_URL, params=_weather_params(center), timeout=REQUEST_TIMEOUT)
         if response.status_code == 200:
-            temp = data['main']['temp']
-            humidity = data['main']['humidity']
-            description = data['weather'][0]['description']
-            
-            # Generate weather advice
-            advice = generate_weather_advice(temp, humidity, description)
-            
-            return {
-                'temperature': temp,
-                'humidity': humidity,
-                'description': description.title(),
-                'uv_index': 5,  # Default value
-                'advice': advice
-            }
+            return _weather_dict(_store_weather(cell, center, response.json()))
     
     except Exception as e:
         print(f"Weather API error: {e}")
     
+    # Stale data beats made-up data
+    if cached:
+        return _weather_dict(cached)
+    
     # Default weather data
-    return {
-        'temperature': 25,
-        'humidity': 60,
-        'description': 'Pleasant weather',
-        'uv_index': 5,
-        'advice': 'Perfect weather for exploring!'
-    }
+    return dict(DEFAULT_WEATHER)
+
+async def aget_weather_data(city=None, country=None, lat=None, lng=None):
+    """get_weather_data for async views; waiting on OpenWeather doesn't hold a thread"""
+    
+    if not settings.OPENWEATHER_API_KEY:
+        return dict(NO_KEY_WEATHER)
+    
+    # Destination lookups, and geocoding the first time, stay synchronous
+    location = await sync_to_async(_weather_location)(city, country, lat, lng)
+    if location is None:
+        return dict(DEFAULT_WEATHER)
+    cell, center = location
+    
+    cached = await WeatherCache.objects.filter(cell=cell).afirst()
+    if _is_fresh(cached):
+        return _weather_dict(cached)
+    
+    try:
+        response = await get_client().get(WEATHER_URL, params=_weather_params(center), timeout=REQUEST_TIMEOUT)
+        if response.status_code == 200:
+            return _weather_dict(await sync_to_async(_store_weather)(cell, center, response.json()))
+    
+    except Exception as e:
+        print(f"Weather API error: {e}")
+    
+    if cached:
+        return _weather_dict(cached)
+    
+    return dict(DEFAULT_WEATHER)
 
 def generate_weather_advice(temperature, humidity, description):
     """Generate weather-based advice"""
@@ -3,10 +3,16 @@ from . import views
 
 urlpatterns = [
     path('', views.travel_list, name='travel_list'),
+    path('page/', views.travel_list_page, name='travel_list_page'),
     path('new/', views.travel_new, name='travel_new'),
+    path('export/', views.travel_export, name='travel_export'),
+    path('import/', views.travel_import, name='travel_import'),
     path('<int:travel_id>/', views.travel_detail, name='travel_detail'),
+    path('<int:travel_id>/weather/', views.travel_weather_panel, name='travel_weather_panel'),
+    path('<int:travel_id>/advice/', views.travel_advice_panel, name='travel_advice_panel'),
     path('<int:travel_id>/edit/', views.travel_edit, name='travel_edit'),
     path('<int:travel_id>/delete/', views.travel_delete, name='travel_delete'),
     path('set-active/', views.set_active_travel, name='set_active_travel'),
     path('<int:travel_id>/refresh-advice/', views.refresh_advice, name='refresh_advice'),
+    path('<int:travel_id>/itinerary/', views.travel_itinerary, name='travel_itinerary'),
 ]
\ No newline at end of file
@@ -1,25 +1,131 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.db.models import Count, Max
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import etag
 import json
 from .models import Travel, QuickDestination, TravelAdvice
 from .forms import TravelForm
-from .services.gemini_service import generate_travel_advice
+from .services.activation import activate_travel
+from .services.advice import advice_by_type, replace_advice_rows, save_travel_advice
+from .services.deletion import soft_delete_travel
+from .services.destinations import get_travel_advice
+from .services.listing import MAX_PAGE_SIZE, PAGE_SIZE, decode_cursor, travel_card, travel_page
+from .services.transfer import EXPORT_KINDS, ImportFileError, export_csv, export_ndjson, import_rows, read_rows
 from .services.weather_service import get_weather_data
+from maps.services.geo import format_distance
+from maps.services.itinerary import plan_itinerary
+from safe_traveller.streaming import streaming_response
+from users.cache import cached_fragment
+
+# Stops beyond this are left out of the optimized route
+ITINERARY_MAX_STOPS = 500
+# Seconds a browser may reuse the weather panel
+WEATHER_PANEL_MAX_AGE = 10 * 60
+
+def _page_args(request):
+    """(cursor, limit) from the query string; raises ValueError on a malformed cursor"""
+    cursor = request.GET.get('cursor') or None
+    if cursor:
+        decode_cursor(cursor)
+    try:
+        limit = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        limit = PAGE_SIZE
+    return cursor, min(max(limit, 1), MAX_PAGE_SIZE)
+
+def _travel_list(user, cursor, limit):
+    page = travel_page(user, cursor, limit)
+    context = {
+        **page,
+        'first_page': cursor is None,
+        'limit': limit,
+    }
+    return render_to_string('travels/_travel_list.html', context)
 
 @login_required
 def travel_list(request):
-    travels = Travel.objects.filter(user=request.user)
-    active_travel = travels.filter(is_active=True).first()
+    try:
+        cursor, limit = _page_args(request)
+    except ValueError:
+        return redirect('travel_list')
     
-    context = {
-        'travels': travels,
-        'active_travel': active_travel,
-        'total_travels': travels.count(),
-    }
-    return render(request, 'travels/travel_list.html', context)
+    # Days elapsed change at midnight, so the date is part of the key, along with the page
+    travel_list = cached_fragment(
+        request.user.id,
+        f"travels:{timezone.localdate()}:{cursor or ''}:{limit}",
+        lambda: _travel_list(request.user, cursor, limit)
+    )
+    return render(request, 'travels/travel_list.html', {'travel_list': travel_list})
+
+@login_required
+def travel_list_page(request):
+    """travel_list as JSON for the app: pass next_cursor back as ?cursor= for older travels"""
+    try:
+        cursor, limit = _page_args(request)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid cursor'})
+    
+    page = travel_page(request.user, cursor, limit)
+    page['travels'] = [travel_card(travel) for travel in page['travels']]
+    return JsonResponse({'status': 'success', **page})
+
+@login_required
+def travel_export(request):
+    """All of the user's travels as NDJSON, or ?format=csv&kind=travels|destinations|advice
+
+    Streamed a chunk of rows at a time, so any number of travels takes the same memory.
+    """
+    kind = request.GET.get('kind', 'travels')
+    if request.GET.get('format') == 'csv':
+        if kind not in EXPORT_KINDS:
+            return JsonResponse({'status': 'error', 'message': 'Unknown kind'})
+        response = streaming_response(request, export_csv(request.user, kind), 'text/csv; charset=utf-8')
+        filename = f"{kind}.csv"
+    else:
+        response = streaming_response(request, export_ndjson(request.user), 'application/x-ndjson')
+        filename = 'travels.ndjson'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def _import_lines(user, rows, kind):
+    try:
+        for progress in import_rows(user, rows, kind):
+            yield json.dumps(progress) + '\n'
+    except ImportFileError as e:
+        yield json.dumps({'status': 'error', 'message': str(e)}) + '\n'
+
+@csrf_exempt
+@login_required
+def travel_import(request):
+    """Bulk-create travels from an NDJSON or CSV upload, as the request body or a `file` field
+
+    ?kind=destinations imports destinations of existing travels instead. The
+    response is NDJSON: a progress line per chunk written, with the rows that
+    failed and why, then a done line with the totals.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error'})
+    
+    kind = request.GET.get('kind', 'travels')
+    if kind not in ('travels', 'destinations'):
+        return JsonResponse({'status': 'error', 'message': 'Unknown kind'})
+    
+    upload = request.FILES.get('file') if request.content_type == 'multipart/form-data' else None
+    file_format = request.GET.get('format')
+    if not file_format:
+        name = upload.name if upload else ''
+        is_csv = name.lower().endswith('.csv') or request.content_type == 'text/csv'
+        file_format = 'csv' if is_csv else 'ndjson'
+    
+    # Read line by line as the rows are validated, never whole
+    rows = read_rows(upload if upload else request, file_format)
+    return streaming_response(request, _import_lines(request.user, rows, kind), 'application/x-ndjson')
 
 @login_required
 def travel_new(request):
@@ -29,21 +135,14 @@ def travel_new(request):
             travel = form.save(commit=False)
             travel.user = request.user
             
-            # Set as active if it's the first travel or user chooses to
-            if not Travel.objects.filter(user=request.user, is_active=True).exists():
-                travel.is_active = True
-            
             travel.save()
             
+            # The first travel becomes the active one
+            travel.is_active = activate_travel(request.user, travel.id, replace=False)
+            
             # Generate AI advice in background
             try:
-                advice = generate_travel_advice(
-                    travel.city, 
-                    travel.country, 
-                    travel.travel_type
-                )
-                travel.advice_data = advice
-                travel.save()
+                save_travel_advice(travel, get_travel_advice(travel))
             except Exception as e:
                 print(f"Error generating advice: {e}")
             
@@ -56,21 +155,56 @@ def travel_new(request):
 
 @login_required
 def travel_detail(request, travel_id):
-    travel = get_object_or_404(Travel, id=travel_id, user=request.user)
+    travel = get_object_or_404(Travel.objects.defer('advice_data'), id=travel_id, user=request.user)
     destinations = QuickDestination.objects.filter(travel=travel)
     
-    # Get weather data
-    weather_data = get_weather_data(travel.city, travel.country)
-    
+    # Weather and advice are loaded by the page from the panel views below
     context = {
         'travel': travel,
         'destinations': destinations,
-        'weather_data': weather_data,
         'destinations_count': destinations.count(),
+        'tips_count': TravelAdvice.objects.filter(travel=travel, advice_type='do').count(),
         'days_elapsed': travel.days_elapsed(),
     }
     return render(request, 'travels/travel_detail.html', context)
 
+@login_required
+@cache_control(private=True, max_age=WEATHER_PANEL_MAX_AGE)
+def travel_weather_panel(request, travel_id):
+    """Weather panel of travel_detail; browsers may reuse it for a few minutes"""
+    travel = get_object_or_404(Travel, id=travel_id, user=request.user)
+    weather_data = get_weather_data(travel.city, travel.country)
+    return render(request, 'travels/_weather_panel.html', {'weather_data': weather_data})
+
+def _advice_etag(request, travel_id):
+    # replace_advice_rows rewrites the rows without saving the travel; rewritten rows get new ids
+    state = (
+        Travel.objects.filter(id=travel_id, user=request.user)
+        .annotate(advice_id=Max('traveladvice__id'), advice_count=Count('traveladvice'))
+        .values_list('updated_at', 'advice_id', 'advice_count').first()
+    )
+    if state is None:
+        return None
+    updated_at, advice_id, advice_count = state
+    return f"advice-{travel_id}-{updated_at.timestamp()}-{advice_id}-{advice_count}"
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@etag(_advice_etag)
+def travel_advice_panel(request, travel_id):
+    """Advice panel of travel_detail; revalidated against the travel's last change"""
+    travel = get_object_or_404(Travel.objects.defer('advice_data'), id=travel_id, user=request.user)
+    advice = advice_by_type(travel.id)
+    if advice is None:
+        if travel.advice_data:
+            # Advice from before it was stored as rows
+            replace_advice_rows([travel])
+        else:
+            # Generated here rather than while the page waits
+            save_travel_advice(travel, get_travel_advice(travel))
+        advice = advice_by_type(travel.id)
+    return render(request, 'travels/_advice_panel.html', {'advice': advice})
+
 @csrf_exempt
 @login_required
 def set_active_travel(request):
@@ -78,13 +212,8 @@ def set_active_travel(request):
         data = json.loads(request.body)
         travel_id = data.get('travel_id')
         
-        # Deactivate all travels
-        Travel.objects.filter(user=request.user).update(is_active=False)
-        
-        # Activate selected travel
-        travel = get_object_or_404(Travel, id=travel_id, user=request.user)
-        travel.is_active = True
-        travel.save()
+        if not activate_travel(request.user, travel_id):
+            raise Http404("No Travel matches the given query.")
         
         return JsonResponse({'status': 'success'})
     return JsonResponse({'status': 'error'})
@@ -96,13 +225,8 @@ def refresh_advice(request, travel_id):
         travel = get_object_or_404(Travel, id=travel_id, user=request.user)
         
         try:
-            advice = generate_travel_advice(
-                travel.city, 
-                travel.country, 
-                travel.travel_type
-            )
-            travel.advice_data = advice
-            travel.save()
+            advice = get_travel_advice(travel, refresh=True)
+            save_travel_advice(travel, advice)
             
             return JsonResponse({
                 'status': 'success',
@@ -116,142 +240,43 @@ def refresh_advice(request, travel_id):
     
     return JsonResponse({'status': 'error'})
 
+@csrf_exempt
 @login_required
-def travel_edit(request, travel_id):
-    travel = get_object_or_404(Travel, id=travel_id, user=request.user)
-    
-    if request.method == 'POST':
-        form = TravelForm(request.POST, instance=travel)
-        if form.is_valid():
-            updated_travel = form.save()
-            
-            # Regenerate advice if destination changed
-            if form.has_changed() and any(field in form.changed_data for field in ['city', 'country', 'travel_type']):
-                try:
-                    advice = generate_travel_advice(
-                        updated_travel.city, 
-                        updated_travel.country, 
-                        updated_travel.travel_type
-                    )
-                    updated_travel.advice_data = advice
-                    updated_travel.save()
-                except Exception as e:
-                    print(f"Error regenerating advice: {e}")
-            
-            messages.success(request, f'Travel "{updated_travel.name}" updated successfully!')
-            return redirect('travel_detail', travel_id=updated_travel.id)
-    else:
-        form = TravelForm(instance=travel)
-    
-    context = {
-        'form': form,
-        'travel': travel,
-        'is_editing': True,
-    }
-    return render(request, 'travels/travel_form.html', context)
-
-@login_required
-def travel_delete(request, travel_id):
-    travel = get_object_or_404(Travel, id=travel_id, user=request.user)
-    
+def travel_itinerary(request, travel_id):
+    """Short route through the travel's unvisited destinations"""
     if request.method == 'POST':
-        travel_name = travel.name
-        was_active = travel.is_active
-        
-        # If deleting active travel, suggest another one
-        next_travel = None
-        if was_active:
-            next_travel = Travel.objects.filter(
-                user=request.user
-            ).exclude(id=travel_id).first()
-            
-            if next_travel:
-                next_travel.is_active = True
-                next_travel.save()
-        
-        travel.delete()
-        
-        if was_active and next_travel:
-            messages.success(
-                request, 
-                f'Travel "{travel_name}" deleted. "{next_travel.name}" is now your active travel.'
-            )
-        else:
-            messages.success(request, f'Travel "{travel_name}" deleted successfully.')
+        travel = get_object_or_404(Travel, id=travel_id, user=request.user)
+        data = json.loads(request.body or '{}')
         
-        return redirect('travel_list')
-    
-    # Count related objects for confirmation
-    destinations_count = travel.quickdestination_set.count()
-    advice_count = travel.traveladvice_set.count()
-    
-    context = {
-        'travel': travel,
-        'destinations_count': destinations_count,
-        'advice_count': advice_count,
-    }
-    return render(request, 'travels/travel_delete.html', context)
-
-@login_required
-def travel_edit(request, travel_id):
-    travel = get_object_or_404(Travel, id=travel_id, user=request.user)
-    
-    if request.method == 'POST':
-        form = TravelForm(request.POST, instance=travel)
-        if form.is_valid():
-            updated_travel = form.save()
-            
-            # Regenerate AI advice if destination changed
-            if form.has_changed() and any(field in form.changed_data for field in ['city', 'country', 'travel_type']):
-                try:
-                    advice = generate_travel_advice(
-                        updated_travel.city, 
-                        updated_travel.country, 
-                        updated_travel.travel_type
-                    )
-                    updated_travel.advice_data = advice
-                    updated_travel.save()
-                except Exception as e:
-                    print(f"Error regenerating advice: {e}")
-            
-            messages.success(request, f'Travel "{updated_travel.name}" updated successfully!')
-            return redirect('travel_detail', travel_id=updated_travel.id)
-    else:
-        form = TravelForm(instance=travel)
-    
-    context = {
-        'form': form,
-        'travel': travel,
-        'is_edit': True,
-    }
-    return render(request, 'travels/travel_form.html', context)
-
-@login_required
-def travel_delete(request, travel_id):
-    travel = get_object_or_404(Travel, id=travel_id, user=request.user)
-    
-    if request.method == 'POST':
-        travel_name = travel.name
-        was_active = travel.is_active
+        start = None
+        if data.get('lat') is not None and data.get('lng') is not None:
+            try:
+                start = (float(data['lat']), float(data['lng']))
+            except (TypeError, ValueError):
+                return JsonResponse({'status': 'error', 'message': 'Invalid coordinates'})
         
-        # Delete the travel (cascade will handle related objects)
-        travel.delete()
+        stops = [
+            {'id': d.id, 'name': d.name, 'category': d.category, 'lat': d.latitude, 'lng': d.longitude}
+            for d in QuickDestination.objects.filter(travel=travel, visited=False).order_by('id')[:ITINERARY_MAX_STOPS]
+        ]
+        round_trip = bool(data.get('round_trip'))
+        ordered, legs, return_leg, stats = plan_itinerary(stops, start=start, round_trip=round_trip)
         
-        # If deleted travel was active, suggest activating another one
-        if was_active:
-            next_travel = Travel.objects.filter(user=request.user).first()
-            if next_travel:
-                next_travel.is_active = True
-                next_travel.save()
-                messages.info(request, f'"{next_travel.name}" is now your active travel.')
+        for stop, leg in zip(ordered, legs):
+            stop['leg_m'] = round(leg)
+            stop['leg'] = format_distance(leg)
+        total = sum(legs) + (return_leg or 0)
         
-        messages.success(request, f'Travel "{travel_name}" deleted successfully!')
-        return redirect('travel_list')
+        return JsonResponse({
+            'status': 'success',
+            'stops': ordered,
+            'return_m': None if return_leg is None else round(return_leg),
+            'total_m': round(total),
+            'total': format_distance(total),
+            'optimized_m': round(stats['initial_m'] - stats['length_m']),
+        })
     
-    context = {
-        'travel': travel,
-    }
-    return render(request, 'travels/travel_delete.html', context)
+    return JsonResponse({'status': 'error'})
 
 @login_required
 def travel_edit(request, travel_id):
@@ -265,13 +290,7 @@ def travel_edit(request, travel_id):
             # Regenerate advice if destination changed
             if form.has_changed() and any(field in form.changed_data for field in ['city', 'country', 'travel_type']):
                 try:
-                    advice = generate_travel_advice(
-                        updated_travel.city, 
-                        updated_travel.country, 
-                        updated_travel.travel_type
-                    )
-                    updated_travel.advice_data = advice
-                    updated_travel.save()
+                    save_travel_advice(updated_travel, get_travel_advice(updated_travel))
                 except Exception as e:
                     print(f"Error regenerating advice: {e}")
             
@@ -293,22 +312,11 @@ def travel_delete(request, travel_id):
     
     if request.method == 'POST':
         travel_name = travel.name
-        was_active = travel.is_active
-        
-        # If deleting active travel, suggest another one to activate
-        next_travel = None
-        if was_active:
-            next_travel = Travel.objects.filter(
-                user=request.user
-            ).exclude(id=travel_id).first()
         
-        # Delete the travel (cascade will handle related objects)
-        travel.delete()
+        # Hidden now; its related rows are purged in the background
+        next_travel = soft_delete_travel(travel)
         
-        # Activate next travel if the deleted one was active
-        if was_active and next_travel:
-            next_travel.is_active = True
-            next_travel.save()
+        if next_travel:
             messages.success(
                 request, 
                 f'Travel "{travel_name}" deleted. "{next_travel.name}" is now your active travel.'
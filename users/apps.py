@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class UsersConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'users'
+
+    def ready(self):
+        from .signals import connect_cache_versions, connect_counters
+        connect_counters()
+        connect_cache_versions()
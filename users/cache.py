@@ -0,0 +1,48 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _version_key(user_id):
+    return f"user-version:{user_id}"
+
+
+def user_cache_version(user_id):
+    """Version stamped into every cached fragment of a user"""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock, not 1: if the key was evicted, fragments cached
+        # under the old numbers can never match again
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(user_id):
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        # Nothing cached for this user yet
+        pass
+
+
+def bump_user_cache_version(user_id):
+    """Invalidate all of a user's cached fragments at once
+
+    Deferred to the commit of the current transaction, if any: bumped any
+    earlier, a page rendered from the rows as they were before it would be
+    cached under the new version.
+    """
+    transaction.on_commit(lambda: _bump(user_id))
+
+
+def cached_fragment(user_id, name, build, timeout=None):
+    """build() once per user version; later calls skip its queries and rendering"""
+    key = f"fragment:{name}:{user_id}:{user_cache_version(user_id)}"
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, settings.FRAGMENT_CACHE_TIMEOUT if timeout is None else timeout)
+    return value
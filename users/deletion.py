@@ -0,0 +1,13 @@
+from django.utils import timezone
+from .models import CustomUser
+
+def soft_delete_user(user):
+    """Lock an account out at once; purge_deleted removes it and everything it owns later
+
+    The username and email are freed right away so they can sign up again.
+    """
+    now = timezone.now()
+    CustomUser.objects.filter(pk=user.pk).update(
+        is_active=False, deleted_at=now, username=f"deleted-{user.pk}", email='',
+        is_synced=False, updated_at=now,
+    )
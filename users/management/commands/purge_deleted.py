@@ -0,0 +1,36 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from safe_traveller.purge import PURGE_BATCH_SIZE, purge_deleted
+
+
+class Command(BaseCommand):
+    help = "Delete soft-deleted accounts and travels with everything under them, in short batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE)
+        parser.add_argument('--once', action='store_true',
+                            help="Purge what is pending now and exit instead of polling")
+        parser.add_argument('--interval', type=float, default=60,
+                            help="Seconds to wait when nothing is pending")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        objects = rows = files = 0
+        while True:
+            # A few objects at a time, so ones deleted meanwhile don't wait for a long backlog
+            report = purge_deleted(batch_size, limit=10)
+            purged = sum(report['objects'].values())
+            objects += purged
+            rows += report['rows']
+            files += report['files']
+            if purged:
+                self.stdout.write(', '.join(f"{label}: {n}" for label, n in report['objects'].items() if n))
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Purged {objects} objects: {rows} rows, {files} files"))
@@ -0,0 +1,62 @@
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.utils import timezone
+from users.models import UserStats
+
+
+class Command(BaseCommand):
+    help = "Recount the dashboard totals in UserStats and fix rows that drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        users = get_user_model().objects.order_by('id').values_list('id', flat=True)
+        fields = list(UserStats.COUNTERS)
+        last_id = 0
+        checked = fixed = created = 0
+        while True:
+            user_ids = list(users.filter(id__gt=last_id)[:batch_size])
+            if not user_ids:
+                break
+            last_id = user_ids[-1]
+
+            # One grouped count per counted table for the whole batch
+            actual = {user_id: dict.fromkeys(fields, 0) for user_id in user_ids}
+            for field, label in UserStats.COUNTERS.items():
+                counts = (
+                    apps.get_model(label).objects.filter(user_id__in=user_ids)
+                    .values('user_id').annotate(n=Count('id')).values_list('user_id', 'n')
+                )
+                for user_id, n in counts:
+                    actual[user_id][field] = n
+
+            now = timezone.now()
+            drifted = []
+            existing = {stats.user_id: stats for stats in UserStats.objects.filter(user_id__in=user_ids)}
+            for user_id, stats in existing.items():
+                if any(getattr(stats, field) != actual[user_id][field] for field in fields):
+                    for field in fields:
+                        setattr(stats, field, actual[user_id][field])
+                    stats.reconciled_at = now
+                    drifted.append(stats)
+            missing = [
+                UserStats(user_id=user_id, reconciled_at=now, **actual[user_id])
+                for user_id in user_ids if user_id not in existing
+            ]
+
+            UserStats.objects.bulk_update(drifted, fields + ['reconciled_at'])
+            UserStats.objects.bulk_create(missing, ignore_conflicts=True)
+            checked += len(user_ids)
+            fixed += len(drifted)
+            created += len(missing)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {checked} users: fixed {fixed} drifted rows, created {created}"
+        ))
@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
+from django.apps import apps
 from django.db import models
+from django.db.models import F
 import json
 
 class CustomUser(AbstractUser):
@@ -17,6 +19,23 @@ class CustomUser(AbstractUser):
     ], default='dark')
     language_ui = models.CharField(max_length=10, default='en')
     is_synced = models.BooleanField(default=False)
+    # Set by soft_delete_user; the purge_deleted command removes the account and its data
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['is_synced', 'updated_at'], name='user_unsynced_idx'),
+            models.Index(fields=['deleted_at'], condition=models.Q(deleted_at__isnull=False),
+                         name='user_deleted_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        # Changed since the last replication
+        self.is_synced = False
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'is_synced', 'updated_at'}
+        super().save(*args, **kwargs)
     
     def get_taboos(self):
         return getattr(self, '_taboos', [])
@@ -36,4 +55,44 @@ class UserSettings(models.Model):
     cache_cleared_at = models.DateTimeField(null=True, blank=True)
     
     def __str__(self):
-        return f"Settings for {self.user.username}"
\ No newline at end of file
+        return f"Settings for {self.user.username}"
+
+class UserStats(models.Model):
+    """Per-user totals for the dashboard, kept current by users.signals"""
+    # Counter field -> model it counts; each has a `user` foreign key
+    COUNTERS = {
+        'travel_count': 'travels.Travel',
+        'translation_count': 'translate.TranslationHistory',
+        'search_count': 'maps.SearchHistory',
+    }
+    
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='stats')
+    travel_count = models.IntegerField(default=0)
+    translation_count = models.IntegerField(default=0)
+    search_count = models.IntegerField(default=0)
+    reconciled_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Stats for {self.user.username}"
+    
+    @classmethod
+    def actual_counts(cls, user_id):
+        return {
+            field: apps.get_model(label).objects.filter(user_id=user_id).count()
+            for field, label in cls.COUNTERS.items()
+        }
+    
+    @classmethod
+    def add(cls, user_id, field, n):
+        """Move a user's counter by n; also used for writes that send no signals, like bulk_create"""
+        if not cls.objects.filter(user_id=user_id).update(**{field: F(field) + n}):
+            # First row for this user: counted from scratch, the new rows included
+            cls.objects.get_or_create(user_id=user_id, defaults=cls.actual_counts(user_id))
+    
+    @classmethod
+    def for_user(cls, user):
+        """The user's stats row, counted from scratch the first time"""
+        stats = cls.objects.filter(user=user).first()
+        if stats is None:
+            stats, _ = cls.objects.get_or_create(user=user, defaults=cls.actual_counts(user.id))
+        return stats
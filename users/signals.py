@@ -0,0 +1,75 @@
+from django.apps import apps
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from safe_traveller.writebehind import flushed
+from travels.models import QuickDestination, Travel
+from .cache import bump_user_cache_version
+from .models import CustomUser, UserSettings, UserStats
+
+
+def _increment(field):
+    def receiver(sender, instance, created, raw=False, **kwargs):
+        if not created or raw:
+            return
+        UserStats.add(instance.user_id, field, 1)
+        bump_user_cache_version(instance.user_id)
+    return receiver
+
+
+def _add_flushed(field):
+    def receiver(sender, rows, **kwargs):
+        counts = {}
+        for instance in rows:
+            counts[instance.user_id] = counts.get(instance.user_id, 0) + 1
+        for user_id, n in counts.items():
+            UserStats.add(user_id, field, n)
+            bump_user_cache_version(user_id)
+    return receiver
+
+
+def _decrement(field):
+    def receiver(sender, instance, **kwargs):
+        # Only ever update: during a user's own deletion the row may already be gone
+        UserStats.objects.filter(user_id=instance.user_id).update(**{field: F(field) - 1})
+        bump_user_cache_version(instance.user_id)
+    return receiver
+
+
+def connect_counters():
+    """Keep UserStats in step with creates and deletes of the counted models
+
+    Rows inserted by the write-behind buffer count when it flushes them. Other
+    bulk writes (bulk_create, queryset.update/delete without signals) bypass
+    this; reconcile_user_stats repairs the drift.
+    """
+    for field, label in UserStats.COUNTERS.items():
+        model = apps.get_model(label)
+        post_save.connect(_increment(field), sender=model, weak=False,
+                          dispatch_uid=f"user_stats_increment_{field}")
+        post_delete.connect(_decrement(field), sender=model, weak=False,
+                            dispatch_uid=f"user_stats_decrement_{field}")
+        flushed.connect(_add_flushed(field), sender=model, weak=False,
+                        dispatch_uid=f"user_stats_flushed_{field}")
+
+
+def _bump_owner(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if isinstance(instance, CustomUser):
+        user_id = instance.id
+    elif isinstance(instance, QuickDestination):
+        user_id = Travel.objects.filter(id=instance.travel_id).values_list('user_id', flat=True).first()
+    else:
+        user_id = instance.user_id
+    if user_id is not None:
+        bump_user_cache_version(user_id)
+
+
+def connect_cache_versions():
+    """Bump a user's fragment cache version when what their pages show changes
+
+    Counted models bump from their counter receivers above.
+    """
+    for model in (CustomUser, UserSettings, Travel, QuickDestination):
+        post_save.connect(_bump_owner, sender=model, dispatch_uid=f"cache_version_save_{model.__name__}")
+        post_delete.connect(_bump_owner, sender=model, dispatch_uid=f"cache_version_delete_{model.__name__}")
@@ -6,6 +6,7 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 import json
+from .deletion import soft_delete_user
 from .models import CustomUser, UserSettings
 from .forms import CustomUserCreationForm, ProfileForm, SettingsForm
 
@@ -119,7 +120,9 @@ def delete_account(request):
         password = request.POST.get('password')
         user = authenticate(request, username=request.user.username, password=password)
         if user:
-            user.delete()
+            # Lets the request return at once; purge_deleted removes the data
+            soft_delete_user(user)
+            logout(request)
             messages.success(request, 'Account deleted successfully.')
             return redirect('home')
         else: